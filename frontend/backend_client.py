@@ -0,0 +1,175 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import httpx
+
+from metrics import REGISTRY
+
+# /get_note/15 -> /get_note/{id}: метка пути в метриках не должна зависеть от id
+_ID_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
+
+class BackendPoolTimeout(Exception):
+    """Все соединения к backend заняты дольше, чем pool_timeout."""
+
+
+class BackendClient:
+    """
+    Общий для всех запросов frontend клиент к backend с пулом keep-alive соединений.
+    Вместо TCP-соединения на каждый вызов соединения переиспользуются;
+    одновременно открыто не больше max_connections, ожидание свободного учитывается в stats().
+    """
+
+    def __init__(self, base_url, max_connections=20, max_keepalive=10, keepalive_expiry=30.0,
+                 connect_timeout=2.0, timeout=10.0, pool_timeout=5.0):
+        self.base_url = base_url
+        self.max_connections = max_connections
+        self.pool_timeout = pool_timeout
+        self._client = httpx.Client(
+            base_url=base_url,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(timeout, connect=connect_timeout, pool=pool_timeout),
+            # списки заметок backend отдаёт сжатыми; httpx распаковывает их сам
+            headers={"Accept-Encoding": "gzip, deflate"},
+        )
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self._requests = 0
+        self._waits = 0
+        self._errors = 0
+        self._closed = False
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(
+            settings.api_url,
+            max_connections=settings.backend_max_connections,
+            max_keepalive=settings.backend_max_keepalive,
+            keepalive_expiry=settings.backend_keepalive_expiry,
+            connect_timeout=settings.backend_connect_timeout,
+            timeout=settings.backend_timeout,
+            pool_timeout=settings.backend_pool_timeout,
+        )
+
+    def request(self, method, url, **kwargs) -> httpx.Response:
+        """
+        Выполняет запрос к backend; url - путь относительно base_url.
+        kwargs передаются в httpx, в том числе timeout для отдельного вызова.
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._waits += 1
+            if not self._slots.acquire(timeout=self.pool_timeout):
+                raise BackendPoolTimeout(f"Нет свободных соединений к backend за {self.pool_timeout} с")
+        with self._lock:
+            self._in_use += 1
+            self._requests += 1
+        labels = (("method", method), ("path", _ID_SEGMENT.sub("/{id}", url.split("?", 1)[0])))
+        started = time.perf_counter()
+        try:
+            return self._client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            with self._lock:
+                self._errors += 1
+            REGISTRY.inc("frontend_backend_errors_total", labels)
+            raise
+        finally:
+            REGISTRY.observe("frontend_backend_request_duration_seconds", labels, time.perf_counter() - started)
+            with self._lock:
+                self._in_use -= 1
+            self._slots.release()
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request("PUT", url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request("DELETE", url, **kwargs)
+
+    def _pool_connections(self):
+        # httpx не даёт публичного API к пулу, берём его у транспорта httpcore
+        pool = getattr(getattr(self._client, "_transport", None), "_pool", None)
+        return list(getattr(pool, "connections", []))
+
+    def stats(self) -> dict:
+        connections = self._pool_connections()
+        with self._lock:
+            return {
+                "max_connections": self.max_connections,
+                "in_use": self._in_use,
+                "idle": sum(1 for c in connections if c.is_idle()),
+                "open": len(connections),
+                "requests": self._requests,
+                "waits": self._waits,
+                "errors": self._errors,
+            }
+
+    def close(self):
+        """Закрывает все соединения пула; вызывается при остановке сервера."""
+        if not self._closed:
+            self._closed = True
+            self._client.close()
+
+
+class RevalidationCache:
+    """
+    Локальный кэш ответов GET с ETag (не больше max_entries, LRU).
+    Повторный запрос уходит с If-None-Match; если backend ответил 304, тело берётся из кэша,
+    поэтому по сети передаются только заголовки. Данные кэша общие - их нельзя изменять.
+    """
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # url -> (etag, данные)
+        self._lock = threading.Lock()
+        self.not_modified = 0
+        self.modified = 0
+
+    def get_json(self, client, url):
+        """(код ответа, данные JSON или None); 304 от backend превращается в 200 с данными из кэша."""
+        with self._lock:
+            entry = self._entries.get(url)
+        headers = {"If-None-Match": entry[0]} if entry else None
+        response = client.get(url, headers=headers)
+
+        if response.status_code == 304 and entry:
+            with self._lock:
+                self.not_modified += 1
+                if url in self._entries:
+                    self._entries.move_to_end(url)
+            return 200, entry[1]
+
+        data = response.json() if response.status_code == 200 else None
+        etag = response.headers.get("ETag")
+        with self._lock:
+            if entry:
+                self.modified += 1
+            if data is not None and etag and self.max_entries > 0:
+                self._entries[url] = (etag, data)
+                self._entries.move_to_end(url)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            else:
+                self._entries.pop(url, None)
+        return response.status_code, data
+
+    def discard(self, url):
+        with self._lock:
+            self._entries.pop(url, None)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "max_entries": self.max_entries,
+                    "not_modified": self.not_modified, "modified": self.modified}
@@ -0,0 +1,122 @@
+"""
+Сжатие ответов frontend по Accept-Encoding: gzip или deflate (WSGI-middleware).
+
+Ответ-список (так отвечают обработчики router.py) сжимается целиком, если он не меньше
+minimum_size байт. Ответ-генератор сжимается по частям: каждая часть выдаётся сразу (Z_SYNC_FLUSH).
+Устроено так же, как controllers/compression.py в backend.
+"""
+import zlib
+
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/x-ndjson", "application/javascript",
+                      "application/xml")
+
+_WBITS = {"gzip": 16 + zlib.MAX_WBITS, "deflate": zlib.MAX_WBITS}
+
+
+def choose_encoding(accept_encoding):
+    """'gzip' или 'deflate' по заголовку Accept-Encoding (с учётом q=0), None - без сжатия."""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[name.strip().lower()] = q
+    for name in ("gzip", "deflate"):
+        q = weights.get(name, weights.get("*", 0.0))
+        if q > 0:
+            return name
+    return None
+
+
+def compressor(encoding, level):
+    return zlib.compressobj(level, zlib.DEFLATED, _WBITS[encoding])
+
+
+def is_compressible(content_type):
+    return content_type.split(";", 1)[0].strip().lower().startswith(COMPRESSIBLE_TYPES)
+
+
+def _compressed_headers(headers, encoding, content_length):
+    result = []
+    vary = None
+    for name, value in headers:
+        lower = name.lower()
+        if lower == "content-length":
+            continue
+        if lower == "vary":
+            vary = value
+            continue
+        result.append((name, value))
+    result.append(("Content-Encoding", encoding))
+    result.append(("Vary", f"{vary}, Accept-Encoding" if vary else "Accept-Encoding"))
+    if content_length is not None:
+        result.append(("Content-Length", str(content_length)))
+    return result
+
+
+def _no_write(data):
+    # устаревший write() из start_response отдал бы тело в обход сжатия
+    raise RuntimeError("write() не поддерживается CompressionMiddleware, тело нужно возвращать итератором")
+
+
+class CompressionMiddleware:
+    """WSGI-middleware сжатия. level - уровень zlib 1..9 (0 - сжатие выключено)."""
+
+    def __init__(self, app, minimum_size=1024, level=6):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.level = level
+
+    def __call__(self, environ, start_response):
+        encoding = choose_encoding(environ.get("HTTP_ACCEPT_ENCODING")) if self.level > 0 else None
+        if encoding is None:
+            return self.app(environ, start_response)
+
+        captured = []
+
+        def start(status, headers, exc_info=None):
+            captured[:] = [status, headers, exc_info]
+            return _no_write
+
+        # обработчики frontend вызывают start_response до возврата тела, поэтому заголовки уже известны
+        result = self.app(environ, start)
+        status, headers, exc_info = captured
+        header_map = {name.lower(): value for name, value in headers}
+        code = status.split(" ", 1)[0]
+        if ("content-encoding" in header_map or code in ("204", "304")
+                or not is_compressible(header_map.get("content-type", ""))):
+            start_response(status, headers, exc_info)
+            return result
+
+        if isinstance(result, (list, tuple)):
+            body = b"".join(result)
+            if len(body) < self.minimum_size:
+                start_response(status, headers, exc_info)
+                return [body]
+            c = compressor(encoding, self.level)
+            data = c.compress(body) + c.flush()
+            start_response(status, _compressed_headers(headers, encoding, len(data)), exc_info)
+            return [data]
+
+        start_response(status, _compressed_headers(headers, encoding, None), exc_info)
+        return self._stream(result, compressor(encoding, self.level))
+
+    @staticmethod
+    def _stream(result, c):
+        try:
+            for chunk in result:
+                if chunk:
+                    yield c.compress(chunk) + c.flush(zlib.Z_SYNC_FLUSH)
+            yield c.flush()
+        finally:
+            close = getattr(result, "close", None)
+            if close is not None:
+                close()
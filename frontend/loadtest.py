@@ -0,0 +1,83 @@
+"""
+Нагрузочный тест frontend: сколько запросов в секунду выдерживает сервер.
+
+    python loadtest.py --url http://localhost:8000/ --requests 2000 --concurrency 32
+
+Запросы отправляются из concurrency потоков, у каждого своё keep-alive соединение.
+В отчёте - запросы в секунду, задержки (p50/p95/p99) и распределение кодов ответа.
+"""
+import argparse
+import threading
+import time
+from collections import Counter
+
+import httpx
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run(url, total, concurrency, timeout=30.0):
+    latencies = []
+    statuses = Counter()
+    lock = threading.Lock()
+    remaining = [total]
+
+    def worker():
+        with httpx.Client(timeout=timeout) as client:
+            while True:
+                with lock:
+                    if remaining[0] == 0:
+                        return
+                    remaining[0] -= 1
+                started = time.perf_counter()
+                try:
+                    status = client.get(url).status_code
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+                elapsed = time.perf_counter() - started
+                with lock:
+                    latencies.append(elapsed)
+                    statuses[status] += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    seconds = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "concurrency": concurrency,
+        "seconds": round(seconds, 3),
+        "requests_per_second": round(len(latencies) / seconds, 1) if seconds > 0 else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "statuses": {str(k): v for k, v in statuses.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест frontend (запросы в секунду)")
+    parser.add_argument("--url", default="http://localhost:8000/", help="адрес страницы")
+    parser.add_argument("--requests", type=int, default=1000, help="сколько запросов отправить")
+    parser.add_argument("--concurrency", type=int, default=16, help="число одновременных клиентов")
+    args = parser.parse_args()
+
+    report = run(args.url, args.requests, args.concurrency)
+    print(f"✔ {report['requests']} запросов за {report['seconds']} с: "
+          f"{report['requests_per_second']} запросов/с")
+    print(f"  задержка p50={report['p50_ms']} мс, p95={report['p95_ms']} мс, p99={report['p99_ms']} мс")
+    print(f"  коды ответа: {report['statuses']}")
+
+
+if __name__ == "__main__":
+    main()
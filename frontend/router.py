@@ -1,18 +1,67 @@
+import atexit
+import json
 import os
-from urllib.parse import unquote, parse_qs
-from wsgiref.simple_server import make_server
-import jinja2
-import httpx
+from urllib.parse import unquote, parse_qs, urlencode
+from markupsafe import Markup, escape
 
+from backend_client import BackendClient, RevalidationCache
+from compression import CompressionMiddleware
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, REGISTRY, ROUTE_KEY, MetricsMiddleware
+from routing import Router
+from settings import settings
+from templating import LazySequence, create_environment, precompile
+from wsgi_server import serve
 
-API_URL = "http://localhost:8001"
+
+API_URL = settings.api_url
+
+# Один пул keep-alive соединений к backend на весь процесс
+backend = BackendClient.from_settings(settings)
+atexit.register(backend.close)
+# тела заметок: при повторном просмотре backend только подтверждает ETag (304)
+notes_cache = RevalidationCache(settings.note_cache_size)
 
 TEMPLATES_DIR = os.path.join(os.path.dirname(__file__), "templates")
 
-env = jinja2.Environment(
-    loader=jinja2.FileSystemLoader(TEMPLATES_DIR),
-    autoescape=True,
+env = create_environment(
+    TEMPLATES_DIR,
+    production=settings.production,
+    bytecode_cache_dir=settings.template_cache_dir,
+    fragment_cache_size=settings.fragment_cache_size,
+    fragment_cache_ttl=settings.fragment_cache_ttl,
 )
+# кэш отрендеренных фрагментов шаблонов, см. тег {% cache %} в templating.py
+fragments = env.fragment_cache
+
+
+def collect_metrics():
+    pool = backend.stats()
+    cache = fragments.stats()
+    notes = notes_cache.stats()
+    return [
+        ("frontend_backend_connections", (("state", "in_use"),), pool["in_use"]),
+        ("frontend_backend_connections", (("state", "idle"),), pool["idle"]),
+        ("frontend_fragment_cache_lookups_total", (("result", "hit"),), cache["hits"]),
+        ("frontend_fragment_cache_lookups_total", (("result", "miss"),), cache["misses"]),
+        ("frontend_note_cache_revalidations_total", (("result", "not_modified"),), notes["not_modified"]),
+        ("frontend_note_cache_revalidations_total", (("result", "modified"),), notes["modified"]),
+    ]
+REGISTRY.add_collector(collect_metrics)
+
+
+def highlight(snippet):
+    """Экранирует фрагмент из поиска, оставляя только разметку <mark> от backend."""
+    if not snippet:
+        return ""
+    safe = str(escape(snippet))
+    return Markup(safe.replace("&lt;mark&gt;", "<mark>").replace("&lt;/mark&gt;", "</mark>"))
+
+
+env.filters["highlight"] = highlight
+precompile(env)
+
+# Таблица маршрутов: обработчики ниже регистрируются декоратором @routes.route
+routes = Router()
 
 # Простейшее хранилище для текущего пользователя (в реальном приложении использовать cookies/sessions)
 current_user = {"id": None, "username": None, "email": None}
@@ -20,8 +69,9 @@ current_user = {"id": None, "username": None, "email": None}
 def render_template(name: str, **context) -> bytes:
     # Всегда добавляем current_user в контекст
     context['user'] = current_user if current_user["id"] else None
-    template = env.get_template(name)
-    return template.render(**context).encode("utf-8")
+    with REGISTRY.timer("frontend_template_render_seconds", (("template", name),)):
+        template = env.get_template(name)
+        return template.render(**context).encode("utf-8")
 
 def not_found(start_response):
     start_response("404 Not Found", [("Content-Type", "text/plain; charset=utf-8")])
@@ -31,6 +81,31 @@ def redirect(start_response, location):
     start_response("302 Found", [("Location", location)])
     return [b""]
 
+def get_query_params(environ):
+    """Параметры query string: {имя: первое значение}."""
+    params = parse_qs(environ.get("QUERY_STRING", ""))
+    return {k: v[0] for k, v in params.items()}
+
+def page_urls(path, params, next_cursor):
+    """
+    Ссылки пагинации списка: на следующую страницу (по курсору из ответа API)
+    и в начало списка. Параметры фильтра сохраняются.
+    """
+    base = {k: v for k, v in params.items() if v and k != "cursor"}
+    first_url = f"{path}?{urlencode(base)}" if params.get("cursor") else None
+    next_url = f"{path}?{urlencode({**base, 'cursor': next_cursor})}" if next_cursor else None
+    return {"first_url": first_url, "next_url": next_url}
+
+def admin_get(path, params=None):
+    """GET к admin-API backend от имени текущего пользователя: тело JSON или None, если ответ не 200."""
+    r = backend.get(path, params=params, headers={"X-User-Id": str(current_user["id"])})
+    return r.json() if r.status_code == 200 else None
+
+def fetch_note(note_id):
+    """Заметка из backend (dict) или None; неизменённая заметка берётся из notes_cache."""
+    status, note = notes_cache.get_json(backend, f"/get_note/{note_id}")
+    return note if status == 200 else None
+
 def get_post_data(environ):
     """Читает POST данные из WSGI environ"""
     try:
@@ -43,468 +118,535 @@ def get_post_data(environ):
         return parse_qs(body)
     return {}
 
-def application(environ, start_response):
-    path = unquote(environ.get("PATH_INFO", "/")) or "/"
-    method = environ.get("REQUEST_METHOD", "GET").upper()
 
-    # === Главная страница ===
-    if method == "GET" and path in ("/", "/index"):
-        # Получаем заметки пользователей через httpx
-        users = []
+# === Главная страница ===
+@routes.route("GET", "/", "/index")
+def index(environ, start_response):
+    # Сводка пользователей запрашивается у backend, только если таблицы нет в кэше фрагментов
+    def load_users():
         try:
-            with httpx.Client() as client:
-                response = client.get(f"{API_URL}/users/summary")
-                users = response.json() if response.status_code == 200 else []
+            response = backend.get("/users/summary")
+            if response.status_code == 200:
+                return response.json()
         except Exception:
-            users = []
+            pass
+        # пустая таблица из-за ошибки backend не должна оставаться в кэше
+        fragments.invalidate("users")
+        return []
+
+    body = render_template("index.html", title="Главная", users=LazySequence(load_users), user=current_user)
+    start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
+    return [body]
+
+
+# === Регистрация ===
+@routes.route("GET", "/auth/register")
+def auth_register(environ, start_response):
+    body = render_template("auth/register.html")
+    start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
+    return [body]
 
-        body = render_template("index.html", title="Главная", users=users, user=current_user)
-        start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-        return [body]
 
-    # === Регистрация ===
-    if method == "GET" and path == "/auth/register":
-        body = render_template("auth/register.html")
-        start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-        return [body]
+@routes.route("POST", "/auth/register")
+def auth_register_submit(environ, start_response):
+    data = get_post_data(environ)
+    try:
+        response = backend.post("/register", json={
+            "username": data.get("name", [""])[0],
+            "email": data.get("email", [""])[0],
+            "password": data.get("password", [""])[0],
+            "is_admin": False
+        })
+        if response.status_code == 200:
+            fragments.invalidate("users")
+            return redirect(start_response, "/auth/login")
+    except Exception as e:
+        pass
     
-    if method == "POST" and path == "/auth/register":
-        data = get_post_data(environ)
-        try:
-            with httpx.Client() as client:
-                response = client.post(f"{API_URL}/register", json={
-                    "username": data.get("name", [""])[0],
-                    "email": data.get("email", [""])[0],
-                    "password": data.get("password", [""])[0],
-                    "is_admin": False
-                })
-                if response.status_code == 200:
-                    return redirect(start_response, "/auth/login")
-        except Exception as e:
-            pass
-        
-        body = render_template("auth/register.html")
-        start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-        return [body]
-
-    # === Вход ===
-    if method == "GET" and path == "/auth/login":
-        body = render_template("auth/login.html")
-        start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-        return [body]
+    body = render_template("auth/register.html")
+    start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
+    return [body]
+
+
+# === Вход ===
+@routes.route("GET", "/auth/login")
+def auth_login(environ, start_response):
+    body = render_template("auth/login.html")
+    start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
+    return [body]
+
+
+@routes.route("POST", "/auth/login")
+def auth_login_submit(environ, start_response):
+    data = get_post_data(environ)
+    try:
+        response = backend.post("/login", json={
+            "email": data.get("email", [""])[0],
+            "password": data.get("password", [""])[0]
+        })
+        if response.status_code == 200:
+            result = response.json()
+            user_data = result.get("user", {})
+            current_user["id"] = user_data.get("id")
+            current_user["username"] = user_data.get("username")
+            current_user["email"] = user_data.get("email")
+            current_user["is_admin"] = bool(user_data.get("is_admin", 0))
+            return redirect(start_response, "/notes")
+    except Exception as e:
+        pass
     
-    if method == "POST" and path == "/auth/login":
-        data = get_post_data(environ)
-        try:
-            with httpx.Client() as client:
-                response = client.post(f"{API_URL}/login", json={
-                    "email": data.get("email", [""])[0],
-                    "password": data.get("password", [""])[0]
-                })
-                if response.status_code == 200:
-                    result = response.json()
-                    user_data = result.get("user", {})
-                    current_user["id"] = user_data.get("id")
-                    current_user["username"] = user_data.get("username")
-                    current_user["email"] = user_data.get("email")
-                    current_user["is_admin"] = bool(user_data.get("is_admin", 0))
-                    return redirect(start_response, "/notes")
-        except Exception as e:
-            pass
-        
-        body = render_template("auth/login.html")
-        start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-        return [body]
-
-    # === Выход ===
-    if method == "GET" and path == "/auth/logout":
-        current_user["id"] = None
-        current_user["username"] = None
-        current_user["email"] = None
-        current_user["is_admin"] = None
-        return redirect(start_response, "/")
-
-    # === Список заметок ===
-    if method == "GET" and path == "/notes":
-        if not current_user["id"]:
-            return redirect(start_response, "/auth/login")
-        
-        # Получаем параметры поиска из query string
-        query_string = environ.get("QUERY_STRING", "")
-        params = parse_qs(query_string)
-        search_query = params.get("query", [""])[0]
-        search_tag = params.get("tag", [""])[0]
-        
-        try:
-            with httpx.Client() as client:
-                # Используем новый эндпоинт для поиска с параметрами
-                response = client.get(
-                    f"{API_URL}/search_notes/{current_user['id']}",
-                    params={"query": search_query, "tag": search_tag}
-                )
-                notes_data = response.json() if response.status_code == 200 else []
-                
-                notes = []
-                for note in notes_data:
-                    notes.append({
-                        "id": note["id"],
-                        "title": note["title"],
-                        "updated_at": note["date_modified"] or note["date_created"],
-                        "tags": note["tags"]
-                    })
-                
-            body = render_template("notes/list.html", notes=notes, query=search_query, tag=search_tag)
-        except Exception as e:
-            body = render_template("notes/list.html", notes=[], query=search_query, tag=search_tag)
-        
-        start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-        return [body]
-
-    # === Создание заметки ===
-    if method == "GET" and path == "/notes/new":
-        if not current_user["id"]:
-            return redirect(start_response, "/auth/login")
-        
-        body = render_template("notes/form.html", note=None, action="/notes/new")
-        start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-        return [body]
+    body = render_template("auth/login.html")
+    start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
+    return [body]
+
+
+# === Выход ===
+@routes.route("GET", "/auth/logout")
+def auth_logout(environ, start_response):
+    current_user["id"] = None
+    current_user["username"] = None
+    current_user["email"] = None
+    current_user["is_admin"] = None
+    return redirect(start_response, "/")
+
+
+# === Список заметок ===
+@routes.route("GET", "/notes")
+def notes_list(environ, start_response):
+    if not current_user["id"]:
+        return redirect(start_response, "/auth/login")
     
-    if method == "POST" and path == "/notes/new":
-        if not current_user["id"]:
-            return redirect(start_response, "/auth/login")
-        
-        data = get_post_data(environ)
-        try:
-            with httpx.Client() as client:
-                response = client.post(f"{API_URL}/add_note", json={
-                    "title": data.get("title", [""])[0],
-                    "content": data.get("content", [""])[0],
-                    "user_id": current_user["id"],
-                    "tags": data.get("tags", [""])[0]
-                })
-                if response.status_code == 200:
-                    return redirect(start_response, "/notes")
-        except Exception as e:
-            pass
-        
-        return redirect(start_response, "/notes")
+    # Получаем параметры поиска из query string
+    params = get_query_params(environ)
+    search_query = params.get("query", "")
+    search_tag = params.get("tag", "")
+    tag_mode = "any" if params.get("tag_mode") == "any" else "all"
+    cursor = params.get("cursor")
+    pager = page_urls("/notes", params, None)
 
-    # === Просмотр заметки ===
-    if method == "GET" and path.startswith("/notes/") and path.count("/") == 2:
-        if not current_user["id"]:
-            return redirect(start_response, "/auth/login")
-        
-        note_id = path.split("/")[-1]
-        if note_id == "new":
-            return not_found(start_response)
-        
-        try:
-            with httpx.Client() as client:
-                response = client.get(f"{API_URL}/get_note/{note_id}")
-                if response.status_code == 200:
-                    note_data = response.json()
-                    note = {
-                        "id": note_data["id"],
-                        "title": note_data["title"],
-                        "content": note_data["content"],
-                        "created_at": note_data["date_created"],
-                        "updated_at": note_data["date_modified"] or note_data["date_created"],
-                        "tags": note_data["tags"]
-                    }
-                    body = render_template("notes/detail.html", note=note)
-                    start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-                    return [body]
-        except Exception as e:
-            pass
-        
-        return not_found(start_response)
+    try:
+        # Используем новый эндпоинт для поиска с параметрами
+        api_params = {"query": search_query, "tag": search_tag, "tag_mode": tag_mode}
+        if cursor:
+            api_params["cursor"] = cursor
+        response = backend.get(f"/search_notes/{current_user['id']}", params=api_params)
+        notes_data = response.json() if response.status_code == 200 else {"items": [], "next_cursor": None}
+        pager = page_urls("/notes", params, notes_data["next_cursor"])
+
+        notes = []
+        for note in notes_data["items"]:
+            notes.append({
+                "id": note["id"],
+                "title": note["title"],
+                "updated_at": note["date_modified"] or note["date_created"],
+                "tags": note["tags"],
+                "snippet": note.get("snippet")
+            })
+            
+        body = render_template("notes/list.html", notes=notes, query=search_query, tag=search_tag,
+                               tag_mode=tag_mode, **pager)
+    except Exception as e:
+        body = render_template("notes/list.html", notes=[], query=search_query, tag=search_tag,
+                               tag_mode=tag_mode, **pager)
+    
+    start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
+    return [body]
 
-    # === Редактирование заметки ===
-    if method == "GET" and path.startswith("/notes/") and path.endswith("/edit") and path.count("/") == 3:
-        if not current_user["id"]:
-            return redirect(start_response, "/auth/login")
-        
-        note_id = path.split("/")[-2]
-        try:
-            with httpx.Client() as client:
-                response = client.get(f"{API_URL}/get_note/{note_id}")
-                if response.status_code == 200:
-                    note_data = response.json()
-                    note = {
-                        "id": note_data["id"],
-                        "title": note_data["title"],
-                        "content": note_data["content"],
-                        "tags": note_data["tags"]
-                    }
-                    body = render_template("notes/form.html", note=note, action=f"/notes/{note_id}/edit")
-                    start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-                    return [body]
-        except Exception as e:
-            pass
-        
-        return not_found(start_response)
+
+# === Создание заметки ===
+@routes.route("GET", "/notes/new")
+def notes_new(environ, start_response):
+    if not current_user["id"]:
+        return redirect(start_response, "/auth/login")
     
-    if method == "POST" and path.startswith("/notes/") and path.endswith("/edit") and path.count("/") == 3:
-        if not current_user["id"]:
-            return redirect(start_response, "/auth/login")
-        
-        note_id = path.split("/")[-2]
-        data = get_post_data(environ)
-        try:
-            with httpx.Client() as client:
-                response = client.put(f"{API_URL}/update_note", json={
-                    "id": int(note_id),
-                    "title": data.get("title", [""])[0],
-                    "content": data.get("content", [""])[0],
-                    "user_id": current_user["id"],
-                    "tags": data.get("tags", [""])[0]
-                })
-                if response.status_code == 200:
-                    return redirect(start_response, f"/notes/{note_id}")
-        except Exception as e:
-            pass
-        
-        return redirect(start_response, "/notes")
+    body = render_template("notes/form.html", note=None, action="/notes/new")
+    start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
+    return [body]
 
-    # === Удаление заметки ===
-    if method == "POST" and path.startswith("/notes/") and path.endswith("/delete") and path.count("/") == 3:
-        if not current_user["id"]:
-            return redirect(start_response, "/auth/login")
-        
-        note_id = path.split("/")[-2]
-        try:
-            with httpx.Client() as client:
-                response = client.delete(f"{API_URL}/delete_note/{note_id}")
-                if response.status_code == 200:
-                    return redirect(start_response, "/notes")
-        except Exception as e:
-            pass
-        
-        return redirect(start_response, "/notes")
-    # ===Админ===
-    if method == "GET" and path == "/admin/users":
-        if not current_user["id"] or not current_user.get("is_admin"):
-            start_response("302 Found", [("Location", "/auth/login")])
-            return [b""]
-
-        with httpx.Client() as client:
-            r = client.get(f"{API_URL}/admin/users", headers={"X-User-Id": str(current_user["id"])})
-            users = r.json() if r.status_code == 200 else []
-
-        body = render_template("admin_users.html", title="Admin Users", users=users)
-        start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-        return [body]
-    if method == "POST" and path.startswith("/admin/users/") and path.endswith("/delete"):
-        if not current_user["id"] or not current_user.get("is_admin"):
-            start_response("302 Found", [("Location", "/auth/login")])
-            return [b""]
-
-        user_id = int(path.split("/")[3])
-        with httpx.Client() as client:
-            client.delete(f"{API_URL}/admin/users/{user_id}", headers={"X-User-Id": str(current_user["id"])})
-
-        start_response("302 Found", [("Location", "/admin/users")])
+
+@routes.route("POST", "/notes/new")
+def notes_new_submit(environ, start_response):
+    if not current_user["id"]:
+        return redirect(start_response, "/auth/login")
+    
+    data = get_post_data(environ)
+    try:
+        response = backend.post("/add_note", json={
+            "title": data.get("title", [""])[0],
+            "content": data.get("content", [""])[0],
+            "user_id": current_user["id"],
+            "tags": data.get("tags", [""])[0]
+        })
+        if response.status_code == 200:
+            fragments.invalidate("users")
+            return redirect(start_response, "/notes")
+    except Exception as e:
+        pass
+    
+    return redirect(start_response, "/notes")
+
+
+# === Просмотр заметки ===
+@routes.route("GET", "/notes/<int:note_id>")
+def note_detail(environ, start_response, note_id):
+    if not current_user["id"]:
+        return redirect(start_response, "/auth/login")
+    
+    try:
+        note_data = fetch_note(note_id)
+        if note_data is not None:
+            note = {
+                "id": note_data["id"],
+                "title": note_data["title"],
+                "content": note_data["content"],
+                "created_at": note_data["date_created"],
+                "updated_at": note_data["date_modified"] or note_data["date_created"],
+                "tags": note_data["tags"]
+            }
+            body = render_template("notes/detail.html", note=note)
+            start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
+            return [body]
+    except Exception as e:
+        pass
+    
+    return not_found(start_response)
+
+
+# === Редактирование заметки ===
+@routes.route("GET", "/notes/<int:note_id>/edit")
+def note_edit(environ, start_response, note_id):
+    if not current_user["id"]:
+        return redirect(start_response, "/auth/login")
+    
+    try:
+        note_data = fetch_note(note_id)
+        if note_data is not None:
+            note = {
+                "id": note_data["id"],
+                "title": note_data["title"],
+                "content": note_data["content"],
+                "tags": note_data["tags"]
+            }
+            body = render_template("notes/form.html", note=note, action=f"/notes/{note_id}/edit")
+            start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
+            return [body]
+    except Exception as e:
+        pass
+    
+    return not_found(start_response)
+
+
+@routes.route("POST", "/notes/<int:note_id>/edit")
+def note_edit_submit(environ, start_response, note_id):
+    if not current_user["id"]:
+        return redirect(start_response, "/auth/login")
+    
+    data = get_post_data(environ)
+    try:
+        response = backend.put("/update_note", json={
+            "id": int(note_id),
+            "title": data.get("title", [""])[0],
+            "content": data.get("content", [""])[0],
+            "user_id": current_user["id"],
+            "tags": data.get("tags", [""])[0]
+        })
+        if response.status_code == 200:
+            return redirect(start_response, f"/notes/{note_id}")
+    except Exception as e:
+        pass
+    
+    return redirect(start_response, "/notes")
+
+
+# === Удаление заметки ===
+@routes.route("POST", "/notes/<int:note_id>/delete")
+def note_delete(environ, start_response, note_id):
+    if not current_user["id"]:
+        return redirect(start_response, "/auth/login")
+    
+    try:
+        response = backend.delete(f"/delete_note/{note_id}")
+        if response.status_code == 200:
+            notes_cache.discard(f"/get_note/{note_id}")
+            fragments.invalidate("users")
+            return redirect(start_response, "/notes")
+    except Exception as e:
+        pass
+    
+    return redirect(start_response, "/notes")
+
+
+# ===Админ===
+@routes.route("GET", "/admin/users")
+def admin_users(environ, start_response):
+    if not current_user["id"] or not current_user.get("is_admin"):
+        start_response("302 Found", [("Location", "/auth/login")])
         return [b""]
-    if method == "GET" and path == "/admin/notes":
-        if not current_user["id"] or not current_user.get("is_admin"):
-            start_response("302 Found", [("Location", "/auth/login")])
-            return [b""]
 
-        with httpx.Client() as client:
-            r = client.get(f"{API_URL}/admin/notes", headers={"X-User-Id": str(current_user["id"])})
-            notes = r.json() if r.status_code == 200 else []
+    params = get_query_params(environ)
+    api_params = {"cursor": params["cursor"]} if params.get("cursor") else {}
+    r = backend.get("/admin/users", params=api_params, headers={"X-User-Id": str(current_user["id"])})
+    data = r.json() if r.status_code == 200 else {"items": [], "next_cursor": None}
 
-        body = render_template("admin_notes.html", title="Admin Notes", notes=notes)
-        start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-        return [body]
+    body = render_template("admin_users.html", title="Admin Users", users=data["items"],
+                           **page_urls("/admin/users", params, data["next_cursor"]))
+    start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
+    return [body]
 
-    if method == "POST" and path.startswith("/admin/notes/") and path.endswith("/delete"):
-        if not current_user["id"] or not current_user.get("is_admin"):
-            start_response("302 Found", [("Location", "/auth/login")])
-            return [b""]
 
-        note_id = int(path.split("/")[3])
-        with httpx.Client() as client:
-            client.delete(f"{API_URL}/admin/notes/{note_id}", headers={"X-User-Id": str(current_user["id"])})
+@routes.route("POST", "/admin/users/<int:user_id>/delete")
+def admin_user_delete(environ, start_response, user_id):
+    if not current_user["id"] or not current_user.get("is_admin"):
+        start_response("302 Found", [("Location", "/auth/login")])
+        return [b""]
 
-        start_response("302 Found", [("Location", "/admin/notes")])
+    backend.delete(f"/admin/users/{user_id}", headers={"X-User-Id": str(current_user["id"])})
+    fragments.invalidate("users")
+
+    start_response("302 Found", [("Location", "/admin/users")])
+    return [b""]
+
+
+@routes.route("GET", "/admin/notes")
+def admin_notes(environ, start_response):
+    if not current_user["id"] or not current_user.get("is_admin"):
+        start_response("302 Found", [("Location", "/auth/login")])
         return [b""]
-    if method == "GET" and path.startswith("/admin/notes/") and path.endswith("/edit"):
-        if not current_user["id"] or not current_user.get("is_admin"):
-            return redirect(start_response, "/auth/login")
 
-        note_id = int(path.split("/")[3])
-
-        with httpx.Client() as client:
-            r = client.get(f"{API_URL}/get_note/{note_id}")
-            if r.status_code != 200:
-                return not_found(start_response)
-            note_data = r.json()
-
-        body = render_template(
-            "admin_note_form.html",
-            title="Admin Edit Note",
-            note={"id": note_data["id"], "title": note_data["title"], "content": note_data["content"],
-                  "tags": note_data["tags"]},
-            action=f"/admin/notes/{note_id}/edit"
-        )
-        start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-        return [body]
-    if method == "POST" and path.startswith("/admin/notes/") and path.endswith("/edit"):
-        if not current_user["id"] or not current_user.get("is_admin"):
-            return redirect(start_response, "/auth/login")
+    params = get_query_params(environ)
+    api_params = {"cursor": params["cursor"]} if params.get("cursor") else {}
+    r = backend.get("/admin/notes", params=api_params, headers={"X-User-Id": str(current_user["id"])})
+    data = r.json() if r.status_code == 200 else {"items": [], "next_cursor": None}
 
-        note_id = int(path.split("/")[3])
-        data = get_post_data(environ)
-
-        with httpx.Client() as client:
-            client.put(
-                f"{API_URL}/admin/notes/{note_id}",
-                headers={"X-User-Id": str(current_user["id"])},
-                json={
-                    "title": data.get("title", [""])[0],
-                    "content": data.get("content", [""])[0],
-                    "tags": data.get("tags", [""])[0],
-                },
-            )
-
-        return redirect(start_response, "/admin/notes")
-    if method == "GET" and path.startswith("/admin/users/") and path.endswith("/notes"):
-        if not current_user.get("id") or not current_user.get("is_admin"):
-            return redirect(start_response, "/auth/login")
+    body = render_template("admin_notes.html", title="Admin Notes", notes=data["items"],
+                           **page_urls("/admin/notes", params, data["next_cursor"]))
+    start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
+    return [body]
 
-        user_id = int(path.split("/")[3])
-
-        with httpx.Client() as client:
-            # заметки выбранного пользователя
-            r_notes = client.get(f"{API_URL}/get_all_notes/{user_id}")
-            notes = r_notes.json() if r_notes.status_code == 200 else []
-
-            # данные пользователя (берём из админ списка)
-            r_users = client.get(
-                f"{API_URL}/admin/users",
-                headers={"X-User-Id": str(current_user["id"])}
-            )
-            users = r_users.json() if r_users.status_code == 200 else []
-
-        selected = next((u for u in users if int(u.get("id", -1)) == user_id), None)
-        if not selected:
-            return not_found(start_response)
-
-        body = render_template(
-            "admin_user_notes.html",
-            title="Admin User Notes",
-            user=selected,
-            notes=notes,
-            user_nav=current_user
-        )
-        start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-        return [body]
-    if method == "GET" and path.startswith("/admin/users/") and path.endswith("/edit"):
-        if not current_user.get("id") or not current_user.get("is_admin"):
-            return redirect(start_response, "/auth/login")
 
-        user_id = int(path.split("/")[3])
-
-        with httpx.Client() as client:
-            r = client.get(
-                f"{API_URL}/admin/users",
-                headers={"X-User-Id": str(current_user["id"])}
-            )
-            users = r.json() if r.status_code == 200 else []
-
-        u = next((x for x in users if int(x.get("id", -1)) == user_id), None)
-        if not u:
-            return not_found(start_response)
-
-        body = render_template(
-            "admin_user_form.html",
-            title="Admin Edit User",
-            u=u,
-            action=f"/admin/users/{user_id}/edit",
-            user=current_user
-        )
-        start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-        return [body]
-    if method == "POST" and path.startswith("/admin/users/") and path.endswith("/edit"):
-        if not current_user.get("id") or not current_user.get("is_admin"):
-            return redirect(start_response, "/auth/login")
+@routes.route("POST", "/admin/notes/<int:note_id>/delete")
+def admin_note_delete(environ, start_response, note_id):
+    if not current_user["id"] or not current_user.get("is_admin"):
+        start_response("302 Found", [("Location", "/auth/login")])
+        return [b""]
 
-        user_id = int(path.split("/")[3])
-        form = get_post_data(environ)
-
-        payload = {
-            "username": form.get("username", [""])[0],
-            "email": form.get("email", [""])[0],
-            "password": form.get("password", [""])[0],
-            "is_admin": int(form.get("is_admin", ["0"])[0]),
-        }
-
-        with httpx.Client() as client:
-            client.put(
-                f"{API_URL}/admin/users/{user_id}",
-                headers={"X-User-Id": str(current_user["id"])},
-                json=payload
-            )
-
-        return redirect(start_response, "/")
-    if method == "GET" and path == "/me/edit":
-        if not current_user.get("id"):
-            return redirect(start_response, "/auth/login")
+    backend.delete(f"/admin/notes/{note_id}", headers={"X-User-Id": str(current_user["id"])})
+    notes_cache.discard(f"/get_note/{note_id}")
+    fragments.invalidate("users")
 
-        # берём актуальные данные с API
-        with httpx.Client() as client:
-            r = client.get(f"{API_URL}/me", headers={"X-User-Id": str(current_user["id"])})
-            if r.status_code != 200:
-                return not_found(start_response)
-            me = r.json()
-
-        body = render_template("me_form.html", title="Профиль", me=me, user=current_user)
-        start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-        return [body]
-    if method == "POST" and path == "/me/edit":
-        if not current_user.get("id"):
-            return redirect(start_response, "/auth/login")
+    start_response("302 Found", [("Location", "/admin/notes")])
+    return [b""]
+
+
+@routes.route("GET", "/admin/notes/<int:note_id>/edit")
+def admin_note_edit(environ, start_response, note_id):
+    if not current_user["id"] or not current_user.get("is_admin"):
+        return redirect(start_response, "/auth/login")
 
-        form = get_post_data(environ)
-        payload = {
-            "username": form.get("username", [""])[0],
-            "email": form.get("email", [""])[0],
-            "password": form.get("password", [""])[0],
-        }
-
-        with httpx.Client() as client:
-            r = client.put(f"{API_URL}/me", headers={"X-User-Id": str(current_user["id"])}, json=payload)
-            if r.status_code == 200:
-                # обновим current_user
-                u = r.json()["user"]
-                current_user["username"] = u["username"]
-                current_user["email"] = u["email"]
-                current_user["is_admin"] = bool(u.get("is_admin", 0))
-
-        return redirect(start_response, "/")
-    if method == "POST" and path == "/me/delete":
-        if not current_user.get("id"):
-            return redirect(start_response, "/auth/login")
 
-        with httpx.Client() as client:
-            client.delete(f"{API_URL}/me", headers={"X-User-Id": str(current_user["id"])})
+    note_data = fetch_note(note_id)
+    if note_data is None:
+        return not_found(start_response)
+
+    body = render_template(
+        "admin_note_form.html",
+        title="Admin Edit Note",
+        note={"id": note_data["id"], "title": note_data["title"], "content": note_data["content"],
+              "tags": note_data["tags"]},
+        action=f"/admin/notes/{note_id}/edit"
+    )
+    start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
+    return [body]
 
-        # logout локально
-        current_user["id"] = None
-        current_user["username"] = None
-        current_user["email"] = None
-        current_user["is_admin"] = False
 
+@routes.route("POST", "/admin/notes/<int:note_id>/edit")
+def admin_note_edit_submit(environ, start_response, note_id):
+    if not current_user["id"] or not current_user.get("is_admin"):
         return redirect(start_response, "/auth/login")
-    return not_found(start_response)
+
+    data = get_post_data(environ)
+
+    backend.put(
+        f"/admin/notes/{note_id}",
+        headers={"X-User-Id": str(current_user["id"])},
+        json={
+            "title": data.get("title", [""])[0],
+            "content": data.get("content", [""])[0],
+            "tags": data.get("tags", [""])[0],
+        },
+    )
+
+    return redirect(start_response, "/admin/notes")
+
+
+@routes.route("GET", "/admin/users/<int:user_id>/notes")
+def admin_user_notes(environ, start_response, user_id):
+    if not current_user.get("id") or not current_user.get("is_admin"):
+        return redirect(start_response, "/auth/login")
+
+    params = get_query_params(environ)
+    api_params = {"cursor": params["cursor"]} if params.get("cursor") else {}
+
+    # пользователь и страница его заметок одним запросом
+    data = admin_get(f"/pages/admin/user_notes/{user_id}", api_params)
+    if data is None:
+        return not_found(start_response)
+    notes_data = data["notes"]
+
+    body = render_template(
+        "admin_user_notes.html",
+        title="Admin User Notes",
+        user=data["user"],
+        notes=notes_data["items"],
+        user_nav=current_user,
+        **page_urls(f"/admin/users/{user_id}/notes", params, notes_data["next_cursor"])
+    )
+    start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
+    return [body]
+
+
+@routes.route("GET", "/admin/users/<int:user_id>/edit")
+def admin_user_edit(environ, start_response, user_id):
+    if not current_user.get("id") or not current_user.get("is_admin"):
+        return redirect(start_response, "/auth/login")
+
+
+    u = admin_get(f"/admin/users/{user_id}")
+
+    if not u:
+        return not_found(start_response)
+
+    body = render_template(
+        "admin_user_form.html",
+        title="Admin Edit User",
+        u=u,
+        action=f"/admin/users/{user_id}/edit",
+        user=current_user
+    )
+    start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
+    return [body]
+
+
+@routes.route("POST", "/admin/users/<int:user_id>/edit")
+def admin_user_edit_submit(environ, start_response, user_id):
+    if not current_user.get("id") or not current_user.get("is_admin"):
+        return redirect(start_response, "/auth/login")
+
+    form = get_post_data(environ)
+
+    payload = {
+        "username": form.get("username", [""])[0],
+        "email": form.get("email", [""])[0],
+        "password": form.get("password", [""])[0],
+        "is_admin": int(form.get("is_admin", ["0"])[0]),
+    }
+
+    backend.put(
+        f"/admin/users/{user_id}",
+        headers={"X-User-Id": str(current_user["id"])},
+        json=payload
+    )
+    fragments.invalidate("users")
+
+    return redirect(start_response, "/")
+
+
+@routes.route("GET", "/me/edit")
+def me_edit(environ, start_response):
+    if not current_user.get("id"):
+        return redirect(start_response, "/auth/login")
+
+    # берём актуальные данные с API
+    r = backend.get("/me", headers={"X-User-Id": str(current_user["id"])})
+    if r.status_code != 200:
+        return not_found(start_response)
+    me = r.json()
+
+    body = render_template("me_form.html", title="Профиль", me=me, user=current_user)
+    start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
+    return [body]
+
+
+@routes.route("POST", "/me/edit")
+def me_edit_submit(environ, start_response):
+    if not current_user.get("id"):
+        return redirect(start_response, "/auth/login")
+
+    form = get_post_data(environ)
+    payload = {
+        "username": form.get("username", [""])[0],
+        "email": form.get("email", [""])[0],
+        "password": form.get("password", [""])[0],
+    }
+
+    r = backend.put("/me", headers={"X-User-Id": str(current_user["id"])}, json=payload)
+    if r.status_code == 200:
+        fragments.invalidate("users")
+        # обновим current_user
+        u = r.json()["user"]
+        current_user["username"] = u["username"]
+        current_user["email"] = u["email"]
+        current_user["is_admin"] = bool(u.get("is_admin", 0))
+
+    return redirect(start_response, "/")
+
+
+@routes.route("POST", "/me/delete")
+def me_delete(environ, start_response):
+    if not current_user.get("id"):
+        return redirect(start_response, "/auth/login")
+
+    backend.delete("/me", headers={"X-User-Id": str(current_user["id"])})
+    fragments.invalidate("users")
+
+    # logout локально
+    current_user["id"] = None
+    current_user["username"] = None
+    current_user["email"] = None
+    current_user["is_admin"] = False
+
+    return redirect(start_response, "/auth/login")
+
+
+# === Состояние пула соединений к backend ===
+@routes.route("GET", "/stats/backend")
+def stats_backend(environ, start_response):
+    start_response("200 OK", [("Content-Type", "application/json")])
+    return [json.dumps({**backend.stats(), "note_cache": notes_cache.stats()}).encode("utf-8")]
+
+
+# === Состояние кэша фрагментов шаблонов ===
+@routes.route("GET", "/stats/templates")
+def stats_templates(environ, start_response):
+    start_response("200 OK", [("Content-Type", "application/json")])
+    return [json.dumps(fragments.stats()).encode("utf-8")]
+
+
+# === Метрики в формате Prometheus ===
+@routes.route("GET", "/metrics")
+def prometheus_metrics(environ, start_response):
+    start_response("200 OK", [("Content-Type", METRICS_CONTENT_TYPE)])
+    return [REGISTRY.render().encode("utf-8")]
+
+
+def dispatch(environ, start_response):
+    path = unquote(environ.get("PATH_INFO", "/")) or "/"
+    method = environ.get("REQUEST_METHOD", "GET").upper()
+
+    handler, params = routes.match(method, path)
+    if handler is None:
+        return not_found(start_response)
+    environ[ROUTE_KEY] = handler.__name__
+    return handler(environ, start_response, **params)
 
 
+# Ответы сжимаются по Accept-Encoding; время и число запросов (вместе со сжатием) собирает middleware метрик
+application = MetricsMiddleware(CompressionMiddleware(
+    dispatch, minimum_size=settings.compression_min_size, level=settings.compression_level))
 
 
 if __name__ == "__main__":
-    port = 8000
-    with make_server("0.0.0.0", port, application) as server:
-        print(f"Frontend serving on http://0.0.0.0:{port}")
-        print(f"API server should be running on {API_URL}")
-        server.serve_forever()
\ No newline at end of file
+    print(f"API server should be running on {API_URL}")
+    serve(application, settings.host, settings.port, workers=settings.workers or None,
+          request_queue_size=settings.request_queue_size,
+          shutdown_timeout=settings.shutdown_timeout, on_shutdown=backend.close)
\ No newline at end of file
@@ -0,0 +1,120 @@
+"""
+Таблица маршрутов frontend.
+
+Маршрут - метод и шаблон пути, например "/notes/<int:note_id>/edit".
+Статические пути (без параметров) ищутся в словаре за одно обращение,
+пути с параметрами - в дереве по сегментам пути, поэтому время поиска зависит
+только от длины пути, а не от числа зарегистрированных маршрутов.
+"""
+
+def _to_int(segment):
+    if not (segment.isascii() and segment.isdigit()):
+        raise ValueError(segment)
+    return int(segment)
+
+
+# Преобразователи типизированных параметров: имя -> функция, которая
+# возвращает значение или бросает ValueError, если сегмент не подходит.
+CONVERTERS = {
+    "str": str,
+    "int": _to_int,
+}
+
+
+class RouteError(ValueError):
+    """Некорректный шаблон маршрута или повторная регистрация."""
+
+
+class _Node:
+    """Узел дерева маршрутов: один сегмент пути."""
+
+    __slots__ = ("children", "param", "handlers")
+
+    def __init__(self):
+        self.children = {}    # литеральный сегмент -> _Node
+        self.param = None     # (имя, тип, преобразователь, _Node) для сегмента-параметра
+        self.handlers = {}    # метод -> обработчик, если путь заканчивается здесь
+
+
+def _parse_segment(segment):
+    """'<int:note_id>' -> ('note_id', 'int'); литеральный сегмент -> None."""
+    if not (segment.startswith("<") and segment.endswith(">")):
+        return None
+    spec = segment[1:-1]
+    kind, _, name = spec.rpartition(":")
+    kind = kind or "str"
+    if not name.isidentifier() or kind not in CONVERTERS:
+        raise RouteError(f"Некорректный параметр маршрута: {segment}")
+    return name, kind
+
+
+class Router:
+    """Предкомпилированная таблица маршрутов с поиском за O(длины пути)."""
+
+    def __init__(self):
+        self._static = {}     # (метод, путь) -> обработчик
+        self._root = _Node()
+        self.routes = []      # (метод, шаблон) в порядке регистрации
+
+    def add(self, method, pattern, handler):
+        method = method.upper()
+        segments = pattern.strip("/").split("/") if pattern != "/" else []
+        params = [_parse_segment(s) for s in segments]
+        if not any(params):
+            key = (method, pattern)
+            if key in self._static:
+                raise RouteError(f"Маршрут {method} {pattern} уже зарегистрирован")
+            self._static[key] = handler
+        else:
+            node = self._root
+            for segment, param in zip(segments, params):
+                if param is None:
+                    node = node.children.setdefault(segment, _Node())
+                    continue
+                name, kind = param
+                if node.param is None:
+                    node.param = (name, kind, CONVERTERS[kind], _Node())
+                elif node.param[:2] != (name, kind):
+                    raise RouteError(f"Параметр {segment} в {pattern} конфликтует с <{node.param[1]}:{node.param[0]}>")
+                node = node.param[3]
+            if method in node.handlers:
+                raise RouteError(f"Маршрут {method} {pattern} уже зарегистрирован")
+            node.handlers[method] = handler
+        self.routes.append((method, pattern))
+
+    def route(self, method, *patterns):
+        """Декоратор: регистрирует обработчик для одного или нескольких путей."""
+        def decorator(handler):
+            for pattern in patterns:
+                self.add(method, pattern, handler)
+            return handler
+        return decorator
+
+    def match(self, method, path):
+        """
+        Возвращает (обработчик, {параметр: значение}) или (None, None).
+        Литеральный сегмент важнее параметра: /notes/new не попадёт в /notes/<int:note_id>
+        (возврата к параметру после неудачи в литеральной ветке нет).
+        """
+        handler = self._static.get((method, path))
+        if handler is not None:
+            return handler, {}
+        node = self._root
+        values = {}
+        for segment in path.strip("/").split("/"):
+            child = node.children.get(segment)
+            if child is not None:
+                node = child
+                continue
+            if node.param is None:
+                return None, None
+            name, _, convert, child = node.param
+            try:
+                values[name] = convert(segment)
+            except ValueError:
+                return None, None
+            node = child
+        handler = node.handlers.get(method)
+        if handler is None:
+            return None, None
+        return handler, values
@@ -0,0 +1,111 @@
+"""
+Микробенчмарк поиска маршрута: цепочка if (как было в application) против таблицы Router.
+
+    python routing_bench.py
+
+К маршрутам приложения добавляются синтетические (/section<i>/..., как статические,
+так и с параметром), и измеряется время поиска последнего маршрута цепочки -
+худший случай для линейного перебора. У Router время не должно расти с числом маршрутов.
+"""
+import argparse
+import timeit
+
+from routing import Router
+
+# Маршруты приложения frontend (router.py)
+APP_ROUTES = [
+    ("GET", "/"), ("GET", "/index"),
+    ("GET", "/auth/register"), ("POST", "/auth/register"),
+    ("GET", "/auth/login"), ("POST", "/auth/login"), ("GET", "/auth/logout"),
+    ("GET", "/notes"), ("GET", "/notes/new"), ("POST", "/notes/new"),
+    ("GET", "/notes/<int:note_id>"),
+    ("GET", "/notes/<int:note_id>/edit"), ("POST", "/notes/<int:note_id>/edit"),
+    ("POST", "/notes/<int:note_id>/delete"),
+    ("GET", "/admin/users"), ("POST", "/admin/users/<int:user_id>/delete"),
+    ("GET", "/admin/notes"), ("POST", "/admin/notes/<int:note_id>/delete"),
+    ("GET", "/admin/notes/<int:note_id>/edit"), ("POST", "/admin/notes/<int:note_id>/edit"),
+    ("GET", "/admin/users/<int:user_id>/notes"),
+    ("GET", "/admin/users/<int:user_id>/edit"), ("POST", "/admin/users/<int:user_id>/edit"),
+    ("GET", "/me/edit"), ("POST", "/me/edit"), ("POST", "/me/delete"),
+    ("GET", "/stats/backend"),
+]
+
+# Запросы, которые ищутся в бенчмарке: маршруты из конца цепочки
+PROBES = [("POST", "/me/delete"), ("GET", "/admin/users/42/edit"), ("GET", "/stats/backend")]
+PROBE_ROUTES = [("POST", "/me/delete"), ("GET", "/admin/users/<int:user_id>/edit"), ("GET", "/stats/backend")]
+
+
+def synthetic_routes(count):
+    routes = list(APP_ROUTES)
+    for i in range(count):
+        routes.append(("GET", f"/section{i}/items"))
+        routes.append(("GET", f"/section{i}/items/<int:item_id>"))
+    # проверяемые маршруты - в конце, как admin и profile в старой цепочке
+    return [r for r in routes if r not in PROBE_ROUTES] + PROBE_ROUTES
+
+
+def linear_matcher(routes):
+    """Повторяет прежний application: проверки по очереди, параметры - через split."""
+    checks = []
+    for method, pattern in routes:
+        parts = pattern.split("/")
+        if "<" not in pattern:
+            checks.append((method, lambda path, p=pattern: path == p, pattern))
+            continue
+
+        def check(path, parts=parts):
+            segments = path.split("/")
+            if len(segments) != len(parts):
+                return False
+            for segment, part in zip(segments, parts):
+                if part.startswith("<"):
+                    if part.startswith("<int:") and not segment.isdigit():
+                        return False
+                elif segment != part:
+                    return False
+            return True
+        checks.append((method, check, pattern))
+
+    def match(method, path):
+        for m, check, pattern in checks:
+            if m == method and check(path):
+                return pattern
+        return None
+    return match
+
+
+def table_matcher(routes):
+    router = Router()
+    for method, pattern in routes:
+        router.add(method, pattern, pattern)
+    return router.match
+
+
+def measure(match, number):
+    def run():
+        for method, path in PROBES:
+            match(method, path)
+    seconds = min(timeit.repeat(run, number=number, repeat=5))
+    return seconds / (number * len(PROBES)) * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение поиска маршрута: цепочка if и Router")
+    parser.add_argument("--sizes", default="0,50,500,5000",
+                        help="сколько синтетических разделов добавить (по 2 маршрута на раздел)")
+    parser.add_argument("--number", type=int, default=20000, help="повторов на замер")
+    args = parser.parse_args()
+
+    print(f"{'маршрутов':>10} {'цепочка if, нс':>16} {'Router, нс':>12}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        routes = synthetic_routes(size)
+        linear = linear_matcher(routes)
+        table = table_matcher(routes)
+        for method, path in PROBES:
+            assert table(method, path)[0] == linear(method, path), (method, path)
+        number = max(1, args.number // max(1, size // 50))
+        print(f"{len(routes):>10} {measure(linear, number):>16.0f} {measure(table, args.number):>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import os
+from dataclasses import dataclass, fields
+
+
+def _to_bool(raw: str) -> bool:
+    value = raw.strip().lower()
+    if value in ("1", "true", "yes", "on"):
+        return True
+    if value in ("0", "false", "no", "off"):
+        return False
+    raise ValueError(raw)
+
+
+def _env_value(name: str, default, cast):
+    raw = os.environ.get(name)
+    if raw is None or raw == "":
+        return default
+    try:
+        return cast(raw)
+    except ValueError:
+        print(f"⚠ Некорректное значение {name}={raw!r}, используется {default!r}")
+        return default
+
+
+@dataclass(frozen=True)
+class FrontendSettings:
+    """
+    Настройки frontend-сервера.
+    Каждое поле можно переопределить переменной окружения FRONTEND_<ИМЯ_ПОЛЯ>,
+    например FRONTEND_BACKEND_MAX_CONNECTIONS=50.
+    """
+    api_url: str = "http://localhost:8001"
+    # HTTP-сервер frontend
+    host: str = "0.0.0.0"
+    port: int = 8000
+    workers: int = 0              # потоков-обработчиков; 0 - по числу ядер (см. wsgi_server.default_workers)
+    request_queue_size: int = 128  # очередь ещё не принятых соединений (backlog сокета)
+    shutdown_timeout: float = 10.0  # сколько секунд ждать завершения начатых запросов при остановке
+    # сжатие ответов (gzip/deflate): ответы меньше порога не сжимаются; уровень 0 - сжатие выключено
+    compression_min_size: int = 1024
+    compression_level: int = 6
+    # шаблоны
+    production: bool = False       # не перепроверять файлы шаблонов на изменения
+    template_cache_dir: str = ""   # каталог кэша байткода; пусто - временный каталог
+    fragment_cache_size: int = 256
+    fragment_cache_ttl: float = 30.0
+    # пул HTTP-соединений к backend
+    backend_max_connections: int = 20
+    backend_max_keepalive: int = 10
+    backend_keepalive_expiry: float = 30.0
+    backend_connect_timeout: float = 2.0
+    backend_timeout: float = 10.0
+    backend_pool_timeout: float = 5.0
+    # заметки, которые перепроверяются у backend по ETag вместо повторной загрузки; 0 - без кэша
+    note_cache_size: int = 512
+
+    @classmethod
+    def from_env(cls, prefix: str = "FRONTEND_") -> "FrontendSettings":
+        values = {}
+        for f in fields(cls):
+            cast = _to_bool if isinstance(f.default, bool) else type(f.default)
+            values[f.name] = _env_value(prefix + f.name.upper(), f.default, cast)
+        return cls(**values)
+
+
+settings = FrontendSettings.from_env()
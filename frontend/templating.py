@@ -0,0 +1,142 @@
+"""
+Окружение Jinja2 для frontend: кэш байткода на диске, предкомпиляция шаблонов
+при старте и кэширование отрендеренных фрагментов.
+
+Фрагмент кэшируется тегом cache с именем и ключом:
+
+    {% cache "users", user.id, user.is_admin %} ... {% endcache %}
+
+Ключ - всё, от чего зависит фрагмент помимо данных (например, кто смотрит страницу).
+После изменения данных вызывается fragments.invalidate("users"), и все фрагменты
+с этим именем перестают использоваться; ttl ограничивает устаревание, если данные
+поменялись в обход frontend.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+import jinja2
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+
+class FragmentCache:
+    """LRU-кэш отрендеренных фрагментов с ограничением по времени жизни и поколениями имён."""
+
+    def __init__(self, max_entries=256, ttl=30.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()   # (имя, поколение, ключ) -> (срок годности, html)
+        self._generations = {}          # имя -> номер поколения
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_render(self, name, key, render):
+        now = time.monotonic()
+        with self._lock:
+            cache_key = (name, self._generations.get(name, 0), key)
+            entry = self._entries.get(cache_key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(cache_key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        # рендер вне блокировки: фрагмент может ходить в backend
+        html = render()
+        with self._lock:
+            self._entries[cache_key] = (now + self.ttl, html)
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return html
+
+    def invalidate(self, name):
+        """Сбрасывает все фрагменты с именем name (старые записи вытеснит LRU)."""
+        with self._lock:
+            self._generations[name] = self._generations.get(name, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "max_entries": self.max_entries,
+                    "ttl": self.ttl, "hits": self.hits, "misses": self.misses}
+
+
+class FragmentCacheExtension(Extension):
+    """Тег {% cache имя, ключ... %}...{% endcache %} поверх environment.fragment_cache."""
+
+    tags = {"cache"}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        while parser.stream.skip_if("comma"):
+            args.append(parser.parse_expression())
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+        name, key = args[0], nodes.Tuple(args[1:], "load")
+        return nodes.CallBlock(self.call_method("_render", [name, key]), [], [], body).set_lineno(lineno)
+
+    def _render(self, name, key, caller):
+        cache = self.environment.fragment_cache
+        # ключ приводится к строке: в нём бывают dict и Undefined, которые не хэшируются
+        return cache.get_or_render(name, repr(tuple(key)), lambda: Markup(caller()))
+
+
+class LazySequence:
+    """
+    Последовательность, которая загружается при первом обращении.
+    Если фрагмент, в котором она используется, взят из кэша, загрузка не выполняется.
+    """
+
+    def __init__(self, load):
+        self._load = load
+        self._items = None
+
+    @property
+    def items(self):
+        if self._items is None:
+            self._items = self._load()
+        return self._items
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
+
+
+def create_environment(templates_dir, production=False, bytecode_cache_dir="",
+                       fragment_cache_size=256, fragment_cache_ttl=30.0):
+    """
+    Окружение Jinja2. Байткод шаблонов сохраняется на диск (bytecode_cache_dir,
+    пустая строка - временный каталог), поэтому после перезапуска шаблоны не компилируются заново.
+    В production файлы шаблонов не перепроверяются на изменения при каждом рендере.
+    """
+    env = jinja2.Environment(
+        loader=jinja2.FileSystemLoader(templates_dir),
+        autoescape=True,
+        auto_reload=not production,
+        bytecode_cache=jinja2.FileSystemBytecodeCache(bytecode_cache_dir or None),
+        cache_size=-1,
+        extensions=[FragmentCacheExtension],
+    )
+    env.fragment_cache = FragmentCache(fragment_cache_size, fragment_cache_ttl)
+    return env
+
+
+def precompile(env):
+    """Загружает все шаблоны заранее, чтобы первый запрос не ждал компиляции."""
+    started = time.perf_counter()
+    names = env.list_templates(extensions=["html"])
+    for name in names:
+        env.get_template(name)
+    print(f"✔ Шаблоны загружены: {len(names)} за {(time.perf_counter() - started) * 1000:.1f} мс")
+    return names
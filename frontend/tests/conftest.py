@@ -0,0 +1,9 @@
+"""
+Тесты frontend. Запуск из корня репозитория:
+    python -m pytest -q frontend/tests
+"""
+import os
+import sys
+
+# модули frontend импортируются без пакета (как в router.py, запущенном из frontend)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,49 @@
+import zlib
+
+from compression import CompressionMiddleware
+
+
+def call(app, accept_encoding):
+    """Вызывает WSGI-приложение; возвращает (статус, заголовки, тело)."""
+    captured = {}
+
+    def start_response(status, headers, exc_info=None):
+        captured.update(status=status, headers=dict(headers))
+
+    body = b"".join(app({"HTTP_ACCEPT_ENCODING": accept_encoding}, start_response))
+    return captured["status"], captured["headers"], body
+
+
+def html_app(body, status="200 OK", content_type="text/html; charset=utf-8", stream=False):
+    def app(environ, start_response):
+        start_response(status, [("Content-Type", content_type), ("Content-Length", str(len(body)))])
+        return iter([body[:10], body[10:]]) if stream else [body]
+    return app
+
+
+def test_large_page_is_gzipped_and_small_is_not():
+    page = b"<tr><td>note</td></tr>" * 200
+    status, headers, body = call(CompressionMiddleware(html_app(page)), "gzip, deflate")
+    assert headers["Content-Encoding"] == "gzip"
+    assert headers["Content-Length"] == str(len(body))
+    assert zlib.decompress(body, 16 + zlib.MAX_WBITS) == page
+
+    _, headers, body = call(CompressionMiddleware(html_app(b"<p>ok</p>")), "gzip")
+    assert "Content-Encoding" not in headers and body == b"<p>ok</p>"
+
+
+def test_streamed_body_is_deflated_without_content_length():
+    page = b"line\n" * 500
+    _, headers, body = call(CompressionMiddleware(html_app(page, stream=True)), "deflate")
+    assert headers["Content-Encoding"] == "deflate" and "Content-Length" not in headers
+    assert zlib.decompress(body) == page
+
+
+def test_not_compressible_responses_pass_through():
+    page = b"\x89PNG" * 1000
+    _, headers, body = call(CompressionMiddleware(html_app(page, content_type="image/png")), "gzip")
+    assert "Content-Encoding" not in headers and body == page
+    status, headers, _ = call(CompressionMiddleware(html_app(b"", status="304 Not Modified")), "gzip")
+    assert status.startswith("304") and "Content-Encoding" not in headers
+    _, headers, _ = call(CompressionMiddleware(html_app(b"x" * 5000), level=0), "gzip")
+    assert "Content-Encoding" not in headers
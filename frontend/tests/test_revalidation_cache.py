@@ -0,0 +1,43 @@
+import httpx
+
+from backend_client import RevalidationCache
+
+
+class FakeBackend:
+    """Отвечает как /get_note backend: 304, если If-None-Match совпал с текущим ETag."""
+
+    def __init__(self):
+        self.etag = '"1-a"'
+        self.body = {"id": 1, "content": "v1"}
+        self.requests = []
+
+    def get(self, url, headers=None):
+        self.requests.append(headers)
+        if headers and headers.get("If-None-Match") == self.etag:
+            return httpx.Response(304, headers={"ETag": self.etag})
+        return httpx.Response(200, json=self.body, headers={"ETag": self.etag})
+
+
+def test_not_modified_is_served_from_cache():
+    backend, cache = FakeBackend(), RevalidationCache()
+    assert cache.get_json(backend, "/get_note/1") == (200, {"id": 1, "content": "v1"})
+    assert cache.get_json(backend, "/get_note/1") == (200, {"id": 1, "content": "v1"})
+    assert backend.requests == [None, {"If-None-Match": '"1-a"'}]
+
+    backend.etag, backend.body = '"1-b"', {"id": 1, "content": "v2"}
+    assert cache.get_json(backend, "/get_note/1") == (200, {"id": 1, "content": "v2"})
+    assert cache.stats()["not_modified"] == 1 and cache.stats()["modified"] == 1
+
+
+def test_lru_bound_and_errors_are_not_cached():
+    backend, cache = FakeBackend(), RevalidationCache(max_entries=1)
+    cache.get_json(backend, "/get_note/1")
+    cache.get_json(backend, "/get_note/2")
+    assert cache.stats()["entries"] == 1
+    # вытесненная запись запрашивается без If-None-Match
+    cache.get_json(backend, "/get_note/1")
+    assert backend.requests[-1] is None
+
+    backend.get = lambda url, headers=None: httpx.Response(404, json={"detail": "нет"})
+    assert cache.get_json(backend, "/get_note/1") == (404, None)
+    assert cache.stats()["entries"] == 0
@@ -0,0 +1,44 @@
+import socket
+import threading
+import time
+
+from wsgi_server import QuietRequestHandler, ThreadPoolWSGIServer
+
+
+def test_queued_connections_are_closed_when_shutdown_times_out():
+    release = threading.Event()
+
+    def app(environ, start_response):
+        release.wait(5)
+        start_response("200 OK", [("Content-Type", "text/plain")])
+        return [b"ok"]
+
+    server = ThreadPoolWSGIServer(("127.0.0.1", 0), QuietRequestHandler, workers=1, shutdown_timeout=0.2)
+    server.set_app(app)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    port = server.server_address[1]
+
+    clients = []
+    for _ in range(3):
+        client = socket.create_connection(("127.0.0.1", port), timeout=5)
+        client.sendall(b"GET / HTTP/1.0\r\nHost: test\r\n\r\n")
+        clients.append(client)
+    # первый запрос занимает единственный поток, два других ждут в очереди пула
+    deadline = time.monotonic() + 5
+    while server.stats()["pending"] < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    server.shutdown()
+    thread.join(5)
+    server.server_close()
+
+    # соединения из очереди закрыты сразу, а не висят до таймаута клиента
+    for client in clients[1:]:
+        assert client.recv(1024) == b""
+    assert server.stats()["pending"] == 1
+
+    release.set()
+    assert clients[0].recv(1024).startswith(b"HTTP/1.0 200")
+    for client in clients:
+        client.close()
@@ -0,0 +1,125 @@
+import os
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.simple_server import WSGIServer, WSGIRequestHandler
+
+
+def default_workers():
+    """
+    Число потоков по умолчанию. Обработчик почти всё время ждёт ответа backend,
+    поэтому потоков берётся в несколько раз больше, чем ядер.
+    """
+    return min(64, (os.cpu_count() or 1) * 4)
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    """Обработчик без строки в логе на каждый запрос (под нагрузкой лог занимает GIL)."""
+
+    def log_request(self, code="-", size="-"):
+        pass
+
+
+class ThreadPoolWSGIServer(WSGIServer):
+    """
+    WSGI-сервер, который обрабатывает запросы в пуле из workers потоков.
+    Медленный запрос к backend занимает один поток, остальные запросы продолжают обслуживаться.
+    Пул ограничен, поэтому при перегрузке соединения ждут в очереди, а не плодят потоки.
+    """
+
+    def __init__(self, server_address, handler_class=WSGIRequestHandler, workers=None,
+                 request_queue_size=128, shutdown_timeout=10.0):
+        # backlog задаётся до bind/listen в конструкторе TCPServer
+        self.request_queue_size = request_queue_size
+        super().__init__(server_address, handler_class)
+        self.workers = workers or default_workers()
+        self.shutdown_timeout = shutdown_timeout
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="wsgi")
+        self._idle = threading.Condition()
+        self._pending = 0
+        self._handled = 0
+        self._queued = {}  # принятые, но ещё не взятые потоком соединения -> их future
+
+    def process_request(self, request, client_address):
+        with self._idle:
+            self._pending += 1
+            self._queued[request] = self._executor.submit(self._process_request_thread, request, client_address)
+
+    def _process_request_thread(self, request, client_address):
+        with self._idle:
+            self._queued.pop(request, None)
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            with self._idle:
+                self._pending -= 1
+                self._handled += 1
+                self._idle.notify_all()
+
+    def stats(self):
+        with self._idle:
+            return {"workers": self.workers, "pending": self._pending, "handled": self._handled}
+
+    def drain(self, timeout=None):
+        """Ждёт завершения принятых запросов; возвращает True, если все успели завершиться."""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+    def server_close(self):
+        # новые соединения больше не принимаются, начатые запросы дорабатывают
+        super().server_close()
+        if not self.drain(self.shutdown_timeout):
+            cancelled = self._cancel_queued()
+            print(f"⚠ Не дождались завершения {self._pending} запросов за {self.shutdown_timeout} с, "
+                  f"закрыто не начатых соединений: {cancelled}")
+        self._executor.shutdown(wait=False)
+
+    def _cancel_queued(self):
+        """Отменяет соединения, которые ждут свободного потока, и закрывает их сокеты."""
+        with self._idle:
+            queued = list(self._queued.items())
+            self._queued.clear()
+        cancelled = 0
+        for request, future in queued:
+            # поток мог успеть взять соединение - тогда оно дорабатывает само
+            if future.cancel():
+                self.shutdown_request(request)
+                cancelled += 1
+        with self._idle:
+            self._pending -= cancelled
+            self._idle.notify_all()
+        return cancelled
+
+
+def serve(app, host="0.0.0.0", port=8000, workers=None, request_queue_size=128,
+          shutdown_timeout=10.0, on_shutdown=None):
+    """
+    Запускает app в ThreadPoolWSGIServer до SIGINT/SIGTERM.
+    Остановка плавная: приём соединений прекращается, начатые запросы дорабатывают
+    (не дольше shutdown_timeout), затем вызывается on_shutdown.
+    """
+    server = ThreadPoolWSGIServer((host, port), QuietRequestHandler, workers=workers,
+                                  request_queue_size=request_queue_size,
+                                  shutdown_timeout=shutdown_timeout)
+    server.set_app(app)
+
+    def stop(signum, frame):
+        # shutdown() ждёт выхода из serve_forever, поэтому вызывается не из основного потока
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    print(f"Frontend serving on http://{host}:{port} ({server.workers} потоков)")
+    try:
+        server.serve_forever()
+    finally:
+        print("Остановка frontend: ждём завершения начатых запросов...")
+        server.server_close()
+        if on_shutdown:
+            on_shutdown()
+        print(f"✔ Frontend остановлен, обработано запросов: {server.stats()['handled']}")
+    return server
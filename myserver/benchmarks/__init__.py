@@ -0,0 +1,10 @@
+"""
+Бенчмарки backend. Запуск из папки myserver:
+
+    python -m benchmarks.dataset --users 100 --notes-per-user 1000   # синтетическая БД
+    python -m benchmarks.load --users 100 --notes-per-user 1000      # нагрузочный прогон API
+    python -m benchmarks.compare old.json new.json                   # сравнение двух прогонов
+    python -m benchmarks.micro --sizes 1k,100k                       # методы DatabaseController + EXPLAIN
+    python -m benchmarks.json_path --page-sizes 50,500               # списки: Python против JSON из SQLite
+    python -m benchmarks.workers --workers 1,2,4                     # масштабирование по числу воркеров
+"""
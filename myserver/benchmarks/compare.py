@@ -0,0 +1,63 @@
+"""
+Сравнение двух результатов бенчмарка (JSON из benchmarks.load).
+
+    python -m benchmarks.compare benchmarks/results/old.json benchmarks/results/new.json --fail-over 20
+
+Для каждой операции показывает пропускную способность и p95 до и после.
+С --fail-over N код возврата 1, если p95 какой-либо операции вырос больше чем на N процентов.
+"""
+import argparse
+import json
+
+
+def _change(old, new):
+    if not old:
+        return None
+    return (new - old) / old * 100
+
+
+def compare(old, new, metric="p95_ms"):
+    """[(операция, старое, новое, изменение в %)] для операций, которые есть в обоих прогонах."""
+    rows = []
+    for name in sorted(set(old["endpoints"]) & set(new["endpoints"])):
+        a, b = old["endpoints"][name], new["endpoints"][name]
+        rows.append((name, a, b, _change(a[metric], b[metric])))
+    rows.append(("ИТОГО", old["total"], new["total"], _change(old["total"][metric], new["total"][metric])))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Сравнение двух прогонов benchmarks.load")
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--fail-over", type=float, default=None,
+                        help="порог роста p95 в процентах, при превышении код возврата 1")
+    args = parser.parse_args(argv)
+
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+
+    print(f"было: {old['environment'].get('commit')} {old['environment']['timestamp']}, "
+          f"стало: {new['environment'].get('commit')} {new['environment']['timestamp']}")
+    if old.get("dataset") != new.get("dataset"):
+        print("⚠ Прогоны сделаны на разных наборах данных")
+
+    regressions = []
+    print(f"{'операция':<12} {'зап/с было':>11} {'стало':>8} {'p95 было':>9} {'стало':>8} {'изм.':>8}")
+    for name, a, b, change in compare(old, new):
+        change_text = f"{change:+.1f}%" if change is not None else "-"
+        print(f"{name:<12} {a.get('requests_per_second', 0):>11} {b.get('requests_per_second', 0):>8} "
+              f"{a['p95_ms']:>9} {b['p95_ms']:>8} {change_text:>8}")
+        if args.fail_over is not None and change is not None and change > args.fail_over:
+            regressions.append(name)
+
+    if regressions:
+        print(f"✘ p95 вырос больше чем на {args.fail_over}%: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,195 @@
+"""
+Синтетическая база SQLite для бенчмарков.
+
+Схема создаётся обычными миграциями DatabaseController, заметки вставляются
+через import_notes_batch - тем же путём, что и массовый импорт, поэтому
+полнотекстовый индекс, теги и счётчики заполняются как в рабочей базе.
+
+Раскладка id детерминирована: администратор - id 1, пользователи - id 2..users+1,
+заметки пользователя k (с нуля) - id k*notes_per_user+1 .. (k+1)*notes_per_user.
+Рядом с базой сохраняется <база>.json с параметрами; если параметры совпадают,
+готовая база используется повторно.
+"""
+import argparse
+import json
+import os
+import random
+import time
+from dataclasses import asdict, dataclass, fields
+from datetime import datetime, timedelta
+
+from controllers.bulk import Throughput
+from controllers.db_controller import DatabaseController
+from models.admin_user import AdminUser
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+
+# Слова, по которым бенчмарки ищут заметки; встречаются в текстах с заданной частотой
+QUERY_WORDS = ("python", "sqlite", "release", "meeting", "budget", "travel", "recipe", "draft")
+PASSWORD = "bench"
+
+
+@dataclass(frozen=True)
+class DatasetSpec:
+    users: int = 100
+    notes_per_user: int = 100
+    content_length: int = 400       # примерная длина текста заметки, символов
+    tag_vocabulary: int = 50        # сколько разных тегов
+    tags_per_note: int = 3
+    tag_skew: float = 1.1           # показатель распределения Ципфа: tag0 встречается чаще всех
+    seed: int = 42
+
+    @property
+    def notes(self):
+        return self.users * self.notes_per_user
+
+    def file_name(self):
+        return (f"bench_u{self.users}_n{self.notes_per_user}_c{self.content_length}"
+                f"_t{self.tag_vocabulary}x{self.tags_per_note}_s{self.seed}.db")
+
+
+def user_email(index):
+    return f"user{index}@bench.local"
+
+
+def tag_name(index):
+    return f"tag{index}"
+
+
+class _TextGenerator:
+    """Тексты из случайных псевдослов с примесью QUERY_WORDS."""
+
+    def __init__(self, rng):
+        self.rng = rng
+        letters = "abcdefghijklmnopqrstuvwxyz"
+        self.vocabulary = ["".join(rng.choice(letters) for _ in range(rng.randint(3, 9)))
+                           for _ in range(2000)] + list(QUERY_WORDS) * 20
+
+    def words(self, length):
+        out, size = [], 0
+        while size < length:
+            word = self.rng.choice(self.vocabulary)
+            out.append(word)
+            size += len(word) + 1
+        return " ".join(out)
+
+
+def _note_records(spec, first_user_id, rng):
+    """Генератор записей в формате import_notes_batch: (номер, (title, content, user_id, tags, created, modified))."""
+    text = _TextGenerator(rng)
+    tags = [tag_name(i) for i in range(spec.tag_vocabulary)]
+    cum_weights = []
+    total = 0.0
+    for rank in range(1, spec.tag_vocabulary + 1):
+        total += 1 / rank ** spec.tag_skew
+        cum_weights.append(total)
+    now = datetime(2025, 1, 1)
+    line_no = 0
+    for k in range(spec.users):
+        user_id = first_user_id + k
+        for _ in range(spec.notes_per_user):
+            line_no += 1
+            note_tags = sorted(set(rng.choices(tags, cum_weights=cum_weights, k=spec.tags_per_note))) if tags else []
+            created = now - timedelta(seconds=rng.randint(0, 365 * 24 * 3600))
+            modified = created + timedelta(seconds=rng.randint(0, 30 * 24 * 3600))
+            yield line_no, (
+                text.words(40),
+                text.words(spec.content_length),
+                user_id,
+                ", ".join(note_tags),
+                created.strftime("%Y-%m-%d %H:%M:%S"),
+                modified.strftime("%Y-%m-%d %H:%M:%S"),
+            )
+
+
+def load_meta(path):
+    meta_path = path + ".json"
+    if not (os.path.exists(path) and os.path.exists(meta_path)):
+        return None
+    with open(meta_path) as f:
+        return json.load(f)
+
+
+def build_dataset(spec: DatasetSpec, path=None, batch_size=5000, force=False):
+    """
+    Создаёт базу по spec (или берёт готовую с теми же параметрами).
+    :return: метаданные: параметры, путь, id пользователей и заметок, время сборки
+    """
+    path = path or os.path.join(DATA_DIR, spec.file_name())
+    meta = load_meta(path)
+    if meta and meta["spec"] == asdict(spec) and not force:
+        print(f"✔ Используется готовая база {path} ({spec.notes} заметок)")
+        return meta
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    for suffix in ("", "-wal", "-shm", ".json"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    rng = random.Random(spec.seed)
+    db = DatabaseController(path)
+    try:
+        admin = AdminUser()
+        admin_id = db.admin_create_user(admin.username, admin.email, admin.password, 1)
+        with db.connection("build_dataset", write=True) as conn:
+            conn.executemany(
+                "INSERT INTO users (username, email, password, is_admin) VALUES (?, ?, ?, 0)",
+                [(f"user{i}", user_email(i), PASSWORD) for i in range(spec.users)]
+            )
+            first_user_id = conn.execute("SELECT MIN(id) FROM users WHERE is_admin = 0").fetchone()[0]
+
+        stats = Throughput()
+        batch = []
+        for record in _note_records(spec, first_user_id, rng):
+            batch.append(record)
+            if len(batch) >= batch_size:
+                stats.add(db.import_notes_batch(batch))
+                batch = []
+                if stats.rows % (batch_size * 20) == 0:
+                    print(f"  {stats.rows}/{spec.notes} заметок, {stats.rows_per_second} строк/с")
+        stats.add(db.import_notes_batch(batch))
+
+        with db.connection("build_dataset", write=True) as conn:
+            conn.execute("ANALYZE")
+            first_note_id = conn.execute("SELECT COALESCE(MIN(id), 0) FROM notes").fetchone()[0]
+    finally:
+        db.close()
+
+    meta = {
+        "spec": asdict(spec),
+        "path": path,
+        "admin_id": admin_id,
+        "first_user_id": first_user_id,
+        "first_note_id": first_note_id,
+        "password": PASSWORD,
+        "build_seconds": round(stats.seconds, 1),
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    with open(path + ".json", "w") as f:
+        json.dump(meta, f, indent=2)
+    print(f"✔ База {path}: {spec.users} пользователей, {stats.rows} заметок за {stats.seconds:.1f} с")
+    return meta
+
+
+def add_spec_arguments(parser):
+    """Аргументы командной строки для всех полей DatasetSpec (--users, --notes-per-user, ...)."""
+    for f in fields(DatasetSpec):
+        parser.add_argument("--" + f.name.replace("_", "-"), type=type(f.default), default=f.default)
+
+
+def spec_from_args(args):
+    return DatasetSpec(**{f.name: getattr(args, f.name) for f in fields(DatasetSpec)})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Создание синтетической базы для бенчмарков")
+    add_spec_arguments(parser)
+    parser.add_argument("--path", default=None, help=f"файл базы (по умолчанию в {DATA_DIR})")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--force", action="store_true", help="пересоздать базу, даже если она уже есть")
+    args = parser.parse_args(argv)
+    build_dataset(spec_from_args(args), args.path, args.batch_size, args.force)
+
+
+if __name__ == "__main__":
+    main()
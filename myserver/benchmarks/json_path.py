@@ -0,0 +1,122 @@
+"""
+Сравнение двух способов отдавать списки: словари Python + кодирование FastAPI
+(NOTES_SERVER_SQL_JSON=false) и JSON, собранный SQLite через json_group_array (по умолчанию).
+
+    python -m benchmarks.json_path --users 20 --notes-per-user 5000 --page-sizes 50,500 --repeat 30
+
+Запросы идут через TestClient к приложению в процессе, поэтому время включает всю обработку
+запроса в FastAPI, но не сеть. Для каждого списка и размера страницы печатается медиана и p95
+обоих путей и ускорение; проверяется, что оба пути отдают одинаковый JSON.
+"""
+import argparse
+import dataclasses
+import json
+import os
+import random
+import statistics
+import time
+
+from benchmarks.dataset import QUERY_WORDS, add_spec_arguments, build_dataset, spec_from_args, tag_name
+from benchmarks.stats import environment_info, percentile
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def _user_id(meta, rng):
+    return meta["first_user_id"] + rng.randrange(meta["spec"]["users"])
+
+
+# имя -> (url, параметры) для случайного пользователя; page - размер страницы
+ENDPOINTS = {
+    "list": lambda meta, rng, page: (f"/get_all_notes/{_user_id(meta, rng)}", {"limit": page}),
+    "search": lambda meta, rng, page: (f"/search_notes/{_user_id(meta, rng)}",
+                                       {"query": rng.choice(QUERY_WORDS), "limit": page}),
+    "search_tag": lambda meta, rng, page: (f"/search_notes/{_user_id(meta, rng)}",
+                                           {"tag": tag_name(rng.randrange(5)), "limit": page}),
+    "admin_notes": lambda meta, rng, page: ("/admin/notes", {"limit": page}),
+    "admin_users": lambda meta, rng, page: ("/admin/users", {"limit": page}),
+}
+
+
+def measure(client, server, sql_json, requests, headers):
+    """Время каждого запроса (с) в одном режиме; requests - [(url, params)]."""
+    server.server_settings = dataclasses.replace(server.server_settings, sql_json=sql_json)
+    timings = []
+    bodies = []
+    for url, params in requests:
+        started = time.perf_counter()
+        response = client.get(url, params=params, headers=headers)
+        timings.append(time.perf_counter() - started)
+        if response.status_code != 200:
+            raise SystemExit(f"✘ {url} {params}: {response.status_code} {response.text[:200]}")
+        bodies.append(response.content)
+    return timings, bodies
+
+
+def summary(timings):
+    values = sorted(timings)
+    return {"median_ms": round(statistics.median(values) * 1000, 3),
+            "p95_ms": round(percentile(values, 95) * 1000, 3)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Списки: кодирование в Python против JSON из SQLite")
+    add_spec_arguments(parser)
+    parser.add_argument("--page-sizes", default="50,500", help="размеры страниц через запятую")
+    parser.add_argument("--endpoints", default="", help="только эти списки через запятую (по умолчанию все)")
+    parser.add_argument("--repeat", type=int, default=30, help="запросов на каждый случай")
+    parser.add_argument("--output", default=None, help="файл результата JSON (по умолчанию в benchmarks/results)")
+    args = parser.parse_args(argv)
+
+    names = [n.strip() for n in args.endpoints.split(",") if n.strip()] or list(ENDPOINTS)
+    unknown = [n for n in names if n not in ENDPOINTS]
+    if unknown:
+        raise SystemExit(f"Неизвестные списки: {', '.join(unknown)}; доступны: {', '.join(ENDPOINTS)}")
+    page_sizes = [int(p) for p in args.page_sizes.split(",")]
+
+    meta = build_dataset(spec_from_args(args))
+    # server.py создаёт DatabaseController при импорте, путь к базе берётся из окружения;
+    # списки только читаются, поэтому копия базы не нужна
+    os.environ["NOTES_DB_PATH"] = meta["path"]
+    # сжатие ответов не относится к сравнению
+    os.environ["NOTES_SERVER_COMPRESSION_LEVEL"] = "0"
+    import server
+    from fastapi.testclient import TestClient
+
+    client = TestClient(server.app)
+    headers = {"X-User-Id": str(meta["admin_id"])}
+    results = {"benchmark": "json_path", "environment": environment_info(), "dataset": meta["spec"], "cases": {}}
+    print(f"{'список':<12} {'стр.':>5} {'python мс':>10} {'p95':>8} {'sqlite мс':>10} {'p95':>8} {'ускор.':>7}")
+    try:
+        for name in names:
+            for page in page_sizes:
+                rng = random.Random(page)
+                requests = [ENDPOINTS[name](meta, rng, page) for _ in range(args.repeat)]
+                # прогрев обоих путей
+                measure(client, server, False, requests[:3], headers)
+                measure(client, server, True, requests[:3], headers)
+                python_times, python_bodies = measure(client, server, False, requests, headers)
+                sqlite_times, sqlite_bodies = measure(client, server, True, requests, headers)
+                same = all(json.loads(a) == json.loads(b) for a, b in zip(python_bodies, sqlite_bodies))
+                row = {"page_size": page, "python": summary(python_times), "sqlite": summary(sqlite_times),
+                       "same_output": same}
+                row["speedup"] = round(row["python"]["median_ms"] / row["sqlite"]["median_ms"], 2)
+                results["cases"][f"{name}:{page}"] = row
+                print(f"{name:<12} {page:>5} {row['python']['median_ms']:>10} {row['python']['p95_ms']:>8} "
+                      f"{row['sqlite']['median_ms']:>10} {row['sqlite']['p95_ms']:>8} {row['speedup']:>6}x"
+                      + ("" if same else "  ✘ ответы различаются"))
+    finally:
+        client.close()
+        server.db_controller.close()
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"json_path-{results['environment']['commit'] or 'nogit'}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"✔ Результат сохранён в {output}")
+    return 0 if all(row["same_output"] for row in results["cases"].values()) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,314 @@
+"""
+Нагрузочный бенчмарк API backend.
+
+    python -m benchmarks.load --users 100 --notes-per-user 1000 --requests 5000 --concurrency 8
+
+Режимы (--mode):
+    inprocess - запросы к приложению FastAPI внутри процесса (TestClient), без сети;
+    loopback  - приложение запускается в uvicorn на 127.0.0.1, запросы идут по HTTP;
+    url       - уже запущенный сервер (--url), который работает с той же базой (--db).
+
+Перед прогоном база копируется во временный файл: операции update её меняют,
+а повторные прогоны должны стартовать с одинаковых данных.
+Результат - JSON с пропускной способностью и p50/p95/p99 по каждой операции
+(по умолчанию в benchmarks/results/), его можно сравнить с другим прогоном через benchmarks.compare.
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+
+import httpx
+
+from benchmarks.dataset import QUERY_WORDS, add_spec_arguments, build_dataset, load_meta, spec_from_args, tag_name, user_email
+from benchmarks.stats import LatencyRecorder, environment_info
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+class Workload:
+    """Параметры, общие для всех операций: диапазоны id из метаданных базы."""
+
+    def __init__(self, meta, page_size=50):
+        spec = meta["spec"]
+        self.users = spec["users"]
+        self.notes_per_user = spec["notes_per_user"]
+        self.tag_vocabulary = spec["tag_vocabulary"]
+        self.first_user_id = meta["first_user_id"]
+        self.first_note_id = meta["first_note_id"]
+        self.admin_headers = {"X-User-Id": str(meta["admin_id"])}
+        self.password = meta["password"]
+        self.page_size = page_size
+
+    def user(self, rng):
+        """(номер пользователя в наборе, его id)."""
+        index = rng.randrange(self.users)
+        return index, self.first_user_id + index
+
+    def note(self, rng):
+        """(id заметки, id её владельца)."""
+        offset = rng.randrange(self.users * self.notes_per_user)
+        return self.first_note_id + offset, self.first_user_id + offset // self.notes_per_user
+
+    def tag(self, rng):
+        # теги распределены по Ципфу, поэтому берём из первой половины словаря - там они частые
+        return tag_name(rng.randrange(max(1, self.tag_vocabulary // 2)))
+
+
+def op_login(client, w, rng):
+    index, _ = w.user(rng)
+    return client.post("/login", json={"email": user_email(index), "password": w.password})
+
+
+def op_list(client, w, rng):
+    _, user_id = w.user(rng)
+    return client.get(f"/get_all_notes/{user_id}", params={"limit": w.page_size})
+
+
+def op_search(client, w, rng):
+    _, user_id = w.user(rng)
+    return client.get(f"/search_notes/{user_id}", params={"query": rng.choice(QUERY_WORDS), "limit": w.page_size})
+
+
+def op_search_tag(client, w, rng):
+    _, user_id = w.user(rng)
+    return client.get(f"/search_notes/{user_id}", params={"tag": w.tag(rng), "limit": w.page_size})
+
+
+def op_get(client, w, rng):
+    note_id, _ = w.note(rng)
+    return client.get(f"/get_note/{note_id}")
+
+
+def op_update(client, w, rng):
+    note_id, user_id = w.note(rng)
+    return client.put("/update_note", json={
+        "id": note_id, "user_id": user_id, "title": f"updated {rng.random():.6f}",
+        "content": " ".join(rng.choices(QUERY_WORDS, k=30)), "tags": f"{w.tag(rng)}, {w.tag(rng)}",
+    })
+
+
+def op_admin_users(client, w, rng):
+    return client.get("/admin/users", params={"limit": w.page_size}, headers=w.admin_headers)
+
+
+def op_admin_notes(client, w, rng):
+    return client.get("/admin/notes", params={"limit": w.page_size}, headers=w.admin_headers)
+
+
+# имя -> (вес в смеси по умолчанию, операция)
+OPERATIONS = {
+    "login": (10, op_login),
+    "list": (25, op_list),
+    "search": (15, op_search),
+    "search_tag": (10, op_search_tag),
+    "get": (25, op_get),
+    "update": (10, op_update),
+    "admin_users": (3, op_admin_users),
+    "admin_notes": (2, op_admin_notes),
+}
+
+
+def parse_mix(text):
+    """'list=5,get=3' -> {"list": 5, "get": 3}; пустая строка - смесь по умолчанию."""
+    if not text:
+        return {name: weight for name, (weight, _) in OPERATIONS.items()}
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise SystemExit(f"Неизвестная операция {name!r}; доступны: {', '.join(OPERATIONS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def copy_database(source, target):
+    """Копия базы через backup API (учитывает WAL)."""
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(target)
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class _Target:
+    """Откуда берутся HTTP-клиенты: приложение в процессе, uvicorn на loopback или внешний сервер."""
+
+    def __init__(self, mode, db_path, url=None):
+        self.mode = mode
+        self._server = None
+        self._thread = None
+        if mode == "url":
+            self.base_url = url
+            return
+        # server.py создаёт DatabaseController при импорте, путь к базе берётся из окружения
+        os.environ["NOTES_DB_PATH"] = db_path
+        import server
+        self.app = server.app
+        self.db_controller = server.db_controller
+        if mode == "loopback":
+            import uvicorn
+            port = _free_port()
+            self.base_url = f"http://127.0.0.1:{port}"
+            self._server = uvicorn.Server(uvicorn.Config(self.app, host="127.0.0.1", port=port, log_level="warning"))
+            self._thread = threading.Thread(target=self._server.run, daemon=True)
+            self._thread.start()
+            while not self._server.started:
+                time.sleep(0.05)
+
+    def client(self):
+        if self.mode == "inprocess":
+            from fastapi.testclient import TestClient
+            return TestClient(self.app)
+        return httpx.Client(base_url=self.base_url, timeout=30.0)
+
+    def close(self):
+        if self._server is not None:
+            self._server.should_exit = True
+            self._thread.join(timeout=10)
+        if self.mode != "url":
+            self.db_controller.close()
+
+
+def run_load(target, workload, mix, requests=None, duration=None, concurrency=4, warmup=50, seed=1,
+             recorder=None):
+    """
+    Выполняет смесь операций из concurrency потоков: всего requests запросов
+    или в течение duration секунд. Первые warmup запросов не учитываются.
+    Задержки пишутся в recorder (по умолчанию - новый LatencyRecorder).
+    :return: (общая сводка, сводка по операциям, секунды)
+    """
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    recorder = recorder if recorder is not None else LatencyRecorder()
+    lock = threading.Lock()
+    state = {"left": requests, "warmup": warmup, "started": None, "deadline": None}
+
+    def take():
+        """'warmup', 'measure' или None, если запросы закончились."""
+        with lock:
+            if state["warmup"] > 0:
+                state["warmup"] -= 1
+                return "warmup"
+            now = time.perf_counter()
+            if state["started"] is None:
+                # отсчёт времени - с первого измеряемого запроса
+                state["started"] = now
+                state["deadline"] = now + duration if duration else None
+            if state["left"] is not None:
+                if state["left"] <= 0:
+                    return None
+                state["left"] -= 1
+            if state["deadline"] is not None and now >= state["deadline"]:
+                return None
+            return "measure"
+
+    def worker(index):
+        rng = random.Random(seed * 1000 + index)
+        # TestClient не открывается через with: иначе его lifespan вызовет shutdown приложения
+        # и закроет пул соединений, пока другие потоки ещё работают
+        client = target.client()
+        try:
+            while True:
+                phase = take()
+                if phase is None:
+                    return
+                name = rng.choices(names, weights)[0]
+                operation = OPERATIONS[name][1]
+                t0 = time.perf_counter()
+                try:
+                    ok = operation(client, workload, rng).status_code < 400
+                except httpx.HTTPError:
+                    ok = False
+                if phase == "measure":
+                    recorder.record(name, time.perf_counter() - t0, ok)
+        finally:
+            client.close()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    seconds = time.perf_counter() - (state["started"] or time.perf_counter())
+    total, endpoints = recorder.summary(seconds)
+    return total, endpoints, seconds
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Нагрузочный бенчмарк API backend")
+    add_spec_arguments(parser)
+    parser.add_argument("--db", default=None, help="готовая база benchmarks.dataset (иначе создаётся по параметрам)")
+    parser.add_argument("--mode", choices=("inprocess", "loopback", "url"), default="inprocess")
+    parser.add_argument("--url", default="http://127.0.0.1:8001", help="адрес сервера для --mode url")
+    parser.add_argument("--mix", default="", help="веса операций, например list=5,get=3 (по умолчанию - все)")
+    parser.add_argument("--requests", type=int, default=2000, help="сколько запросов выполнить")
+    parser.add_argument("--duration", type=float, default=None, help="или сколько секунд нагружать")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--warmup", type=int, default=50, help="запросов прогрева, не входящих в результат")
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--output", default=None, help="файл результата JSON (по умолчанию в benchmarks/results)")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        meta = load_meta(args.db)
+        if meta is None:
+            raise SystemExit(f"Нет базы или метаданных {args.db}.json - создайте её через benchmarks.dataset")
+    else:
+        meta = build_dataset(spec_from_args(args))
+
+    mix = parse_mix(args.mix)
+    workload = Workload(meta, args.page_size)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = meta["path"]
+        if args.mode != "url":
+            db_path = os.path.join(tmp, "bench.db")
+            copy_database(meta["path"], db_path)
+        target = _Target(args.mode, db_path, args.url)
+        try:
+            total, endpoints, seconds = run_load(
+                target, workload, mix, None if args.duration else args.requests, args.duration,
+                args.concurrency, args.warmup)
+        finally:
+            target.close()
+
+    result = {
+        "benchmark": "load",
+        "environment": environment_info(),
+        "dataset": meta["spec"],
+        "config": {"mode": args.mode, "concurrency": args.concurrency, "mix": mix,
+                   "requests": args.requests, "duration": args.duration, "page_size": args.page_size},
+        "seconds": round(seconds, 3),
+        "total": total,
+        "endpoints": endpoints,
+    }
+
+    print(f"{'операция':<12} {'запросов':>8} {'ошибок':>6} {'зап/с':>8} {'p50 мс':>8} {'p95 мс':>8} {'p99 мс':>8}")
+    for name, row in list(endpoints.items()) + [("ИТОГО", total)]:
+        print(f"{name:<12} {row['requests']:>8} {row['errors']:>6} {row.get('requests_per_second', 0):>8} "
+              f"{row['p50_ms']:>8} {row['p95_ms']:>8} {row['p99_ms']:>8}")
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"load-{result['environment']['commit'] or 'nogit'}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    print(f"✔ Результат сохранён в {output}")
+
+
+if __name__ == "__main__":
+    main()
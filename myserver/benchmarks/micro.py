@@ -0,0 +1,240 @@
+"""
+Микробенчмарки методов DatabaseController на базах разного размера.
+
+    python -m benchmarks.micro --sizes 1k,100k,1m --repeat 20
+    python -m benchmarks.micro --sizes 1k,100k --baseline benchmarks/results/micro-OLD.json --threshold 25
+
+Для каждого размера базы (число заметок; 1k..10m) каждый метод выполняется repeat раз,
+в результат пишутся медиана, p95 и минимум времени. SQL, который метод выполнил, перехватывается
+через trace callback соединения, и для каждого запроса сохраняется EXPLAIN QUERY PLAN.
+
+Прогон завершается с кодом 1, если:
+  - в плане появился полный просмотр таблицы (SCAN без индекса), которого нет в --baseline
+    (без --baseline - любой такой просмотр);
+  - медиана метода выросла относительно --baseline больше чем на --threshold процентов.
+
+Изменяющие методы работают с заметками и пользователями, созданными в подготовке,
+поэтому общая база набора почти не меняется.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import re
+import statistics
+import time
+
+from benchmarks.dataset import QUERY_WORDS, DatasetSpec, build_dataset, tag_name
+from benchmarks.stats import environment_info, percentile
+from controllers.db_controller import DatabaseController
+from models.note import Note
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+class TracingController(DatabaseController):
+    """DatabaseController, который запоминает выполненный SQL, пока включён tracing."""
+
+    def __init__(self, *args, **kwargs):
+        self.tracing = False
+        self.statements = []
+        super().__init__(*args, **kwargs)
+
+    def _open(self, database, uri=False):
+        # и соединение записи, и соединения read_pool
+        conn = super()._open(database, uri)
+        conn.set_trace_callback(self._trace)
+        return conn
+
+    def _trace(self, sql):
+        if self.tracing:
+            self.statements.append(sql)
+
+
+# --- Подготовка и выполнение случаев. setup(db, ctx, rng) -> аргумент, run(db, аргумент) ---
+
+def _random_user(db, ctx, rng):
+    return ctx["first_user_id"] + rng.randrange(ctx["users"])
+
+
+def _new_note(db, ctx, rng):
+    user_id = _random_user(db, ctx, rng)
+    with contextlib.redirect_stdout(io.StringIO()):
+        db.insert_note(Note(title="micro", content="micro benchmark", user_id=user_id, tags="micro"))
+    with db.connection("micro_setup") as conn:
+        return conn.execute("SELECT MAX(id) FROM notes").fetchone()[0]
+
+
+def _new_user_with_notes(db, ctx, rng, notes=20):
+    user_id = db.admin_create_user("micro", f"micro{rng.random()}@bench.local", "x", 0)
+    db.import_notes_batch([(i, ("micro", "micro", user_id, "micro", None, None)) for i in range(1, notes + 1)])
+    return user_id
+
+
+def _query_word(user_id):
+    return QUERY_WORDS[user_id % len(QUERY_WORDS)]
+
+
+CASES = {
+    "search_notes:query": (
+        _random_user, lambda db, uid: db.search_notes(uid, _query_word(uid), "", "all", 50, None)),
+    "search_notes:tag": (
+        _random_user, lambda db, uid: db.search_notes(uid, "", tag_name(uid % 5), "all", 50, None)),
+    "search_notes:query+tag": (
+        _random_user, lambda db, uid: db.search_notes(uid, _query_word(uid), tag_name(uid % 5), "all", 50, None)),
+    "search_notes:none": (
+        _random_user, lambda db, uid: db.search_notes(uid, "", "", "all", 50, None)),
+    "read_notes_by_user": (
+        _random_user, lambda db, uid: db.read_notes_by_user(uid, 50, None)),
+    "get_users_summary": (
+        lambda db, ctx, rng: None, lambda db, _: db.get_users_summary()),
+    "admin_list_notes": (
+        lambda db, ctx, rng: None, lambda db, _: db.admin_list_notes(50, None)),
+    "insert_note": (
+        lambda db, ctx, rng: Note(title="micro", content="micro benchmark", user_id=_random_user(db, ctx, rng),
+                                  tags="micro, bench"),
+        lambda db, note: db.insert_note(note)),
+    "delete_note": (_new_note, lambda db, note_id: db.delete_note(note_id)),
+    "admin_delete_note": (_new_note, lambda db, note_id: db.admin_delete_note(note_id)),
+    "delete_user_cascade": (_new_user_with_notes, lambda db, user_id: db.delete_user_cascade(user_id)),
+}
+
+
+def parse_size(text):
+    """'10k' -> 10000, '1m' -> 1000000."""
+    match = re.fullmatch(r"\s*(\d+)\s*([km]?)\s*", text.lower())
+    if not match:
+        raise argparse.ArgumentTypeError(f"Некорректный размер: {text}")
+    return int(match.group(1)) * {"": 1, "k": 1000, "m": 1000000}[match.group(2)]
+
+
+def full_scans(plan_rows):
+    """Строки плана с полным просмотром обычной таблицы (без индекса)."""
+    return [detail for detail in plan_rows
+            if detail.startswith("SCAN ") and "USING" not in detail and "VIRTUAL TABLE" not in detail]
+
+
+def explain(db, statements):
+    """[{"sql": ..., "plan": [...]}] для перехваченных запросов приложения (без BEGIN/COMMIT/PRAGMA)."""
+    plans = []
+    seen = set()
+    with db.connection("explain") as conn:
+        for sql in statements:
+            head = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else ""
+            if head not in ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH") or sql in seen:
+                continue
+            # служебные запросы FTS5 к своим теневым таблицам ('main'.'notes_fts_config' и т.п.)
+            if "'main'.'" in sql:
+                continue
+            seen.add(sql)
+            rows = conn.execute("EXPLAIN QUERY PLAN " + sql).fetchall()
+            plans.append({"sql": " ".join(sql.split()), "plan": [row[3] for row in rows]})
+    return plans
+
+
+def run_case(db, ctx, name, repeat, rng):
+    setup, run = CASES[name]
+    timings = []
+    for i in range(repeat):
+        arg = setup(db, ctx, rng)
+        if i == 0:
+            db.statements = []
+            db.tracing = True
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = run(db, arg)
+            # генераторы дочитываются, чтобы время включало весь запрос
+            if hasattr(result, "__next__"):
+                list(result)
+        timings.append(time.perf_counter() - started)
+        db.tracing = False
+    plans = explain(db, db.statements)
+    timings.sort()
+    return {
+        "median_ms": round(statistics.median(timings) * 1000, 3),
+        "p95_ms": round(percentile(timings, 95) * 1000, 3),
+        "min_ms": round(timings[0] * 1000, 3),
+        "repeat": repeat,
+        "queries": plans,
+        "full_scans": sorted({scan for p in plans for scan in full_scans(p["plan"])}),
+    }
+
+
+def check(results, baseline, threshold):
+    """Список нарушений: новые полные просмотры и рост медианы больше threshold процентов."""
+    problems = []
+    old_sizes = baseline["sizes"] if baseline else {}
+    for size, cases in results["sizes"].items():
+        for name, row in cases.items():
+            old = old_sizes.get(size, {}).get(name)
+            new_scans = set(row["full_scans"]) - set(old["full_scans"] if old else [])
+            if new_scans:
+                problems.append(f"{size} {name}: полный просмотр {', '.join(sorted(new_scans))}")
+            if old and threshold is not None and old["median_ms"] > 0:
+                change = (row["median_ms"] - old["median_ms"]) / old["median_ms"] * 100
+                if change > threshold:
+                    problems.append(f"{size} {name}: медиана {old['median_ms']} -> {row['median_ms']} мс "
+                                    f"(+{change:.0f}%)")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Микробенчмарки DatabaseController")
+    parser.add_argument("--sizes", default="1k,100k", help="размеры баз в заметках через запятую (1k..10m)")
+    parser.add_argument("--notes-per-user", type=int, default=1000)
+    parser.add_argument("--cases", default="", help="только эти случаи через запятую (по умолчанию все)")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--baseline", default=None, help="предыдущий результат для сравнения")
+    parser.add_argument("--threshold", type=float, default=25.0, help="допустимый рост медианы, %%")
+    parser.add_argument("--output", default=None, help="файл результата JSON (по умолчанию в benchmarks/results)")
+    args = parser.parse_args(argv)
+
+    names = [n.strip() for n in args.cases.split(",") if n.strip()] or list(CASES)
+    unknown = [n for n in names if n not in CASES]
+    if unknown:
+        raise SystemExit(f"Неизвестные случаи: {', '.join(unknown)}; доступны: {', '.join(CASES)}")
+
+    results = {"benchmark": "micro", "environment": environment_info(), "sizes": {}}
+    for size in (parse_size(s) for s in args.sizes.split(",")):
+        users = max(1, size // args.notes_per_user)
+        spec = DatasetSpec(users=users, notes_per_user=size // users)
+        meta = build_dataset(spec)
+        ctx = {"users": users, "first_user_id": meta["first_user_id"]}
+        db = TracingController(meta["path"])
+        rng = random.Random(7)
+        label = f"{spec.notes}"
+        results["sizes"][label] = {}
+        print(f"\n{spec.notes} заметок, {users} пользователей")
+        print(f"{'метод':<26} {'медиана мс':>11} {'p95 мс':>9} {'min мс':>9}  полные просмотры")
+        try:
+            for name in names:
+                row = run_case(db, ctx, name, args.repeat, rng)
+                results["sizes"][label][name] = row
+                print(f"{name:<26} {row['median_ms']:>11} {row['p95_ms']:>9} {row['min_ms']:>9}  "
+                      f"{'; '.join(row['full_scans']) or '-'}")
+        finally:
+            db.close()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    problems = check(results, baseline, args.threshold if baseline else None)
+    results["problems"] = problems
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"micro-{results['environment']['commit'] or 'nogit'}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"\n✔ Результат сохранён в {output}")
+
+    for problem in problems:
+        print(f"✘ {problem}")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,91 @@
+import os
+import platform
+import sqlite3
+import subprocess
+import threading
+import time
+
+
+def percentile(sorted_values, p):
+    """Перцентиль p (0..100) отсортированного списка с линейной интерполяцией."""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * p / 100
+    low = int(position)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (position - low)
+
+
+def summarize(latencies, errors=0, seconds=None):
+    """Сводка по списку задержек (в секундах): число запросов, пропускная способность и перцентили в мс."""
+    values = sorted(latencies)
+    count = len(values)
+    result = {
+        "requests": count,
+        "errors": errors,
+        "mean_ms": round(sum(values) / count * 1000, 3) if count else 0.0,
+        "p50_ms": round(percentile(values, 50) * 1000, 3),
+        "p95_ms": round(percentile(values, 95) * 1000, 3),
+        "p99_ms": round(percentile(values, 99) * 1000, 3),
+        "max_ms": round(values[-1] * 1000, 3) if count else 0.0,
+    }
+    if seconds:
+        result["requests_per_second"] = round(count / seconds, 1)
+    return result
+
+
+class LatencyRecorder:
+    """Задержки по именам операций; безопасен для записи из нескольких потоков."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latencies = {}
+        self._errors = {}
+
+    def record(self, name, seconds, ok=True):
+        with self._lock:
+            self._latencies.setdefault(name, []).append(seconds)
+            if not ok:
+                self._errors[name] = self._errors.get(name, 0) + 1
+
+    def export(self):
+        """Сырые задержки и ошибки (для передачи из другого процесса в merge)."""
+        with self._lock:
+            return {"latencies": {name: list(values) for name, values in self._latencies.items()},
+                    "errors": dict(self._errors)}
+
+    def merge(self, data):
+        with self._lock:
+            for name, values in data["latencies"].items():
+                self._latencies.setdefault(name, []).extend(values)
+            for name, count in data["errors"].items():
+                self._errors[name] = self._errors.get(name, 0) + count
+
+    def summary(self, seconds):
+        with self._lock:
+            names = sorted(self._latencies)
+            endpoints = {name: summarize(self._latencies[name], self._errors.get(name, 0), seconds)
+                         for name in names}
+            everything = [v for values in self._latencies.values() for v in values]
+            total = summarize(everything, sum(self._errors.values()), seconds)
+        return total, endpoints
+
+
+def git_commit():
+    """Короткий хэш текущего коммита (или None вне git), чтобы результаты можно было сравнивать."""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(__file__), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def environment_info():
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
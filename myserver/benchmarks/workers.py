@@ -0,0 +1,149 @@
+"""
+Масштабирование backend по числу процессов uvicorn (NOTES_SERVER_WORKERS).
+
+    python -m benchmarks.workers --users 100 --notes-per-user 1000 --workers 1,2,4 --duration 20
+
+Для каждого числа воркеров server.py запускается отдельным процессом на свежей копии базы,
+а смесь операций benchmarks.load (--mix) подаётся по HTTP из --client-processes процессов,
+чтобы в GIL не упирался сам клиент. Печатается пропускная способность, p50/p95/p99 и ускорение
+относительно первого прогона. Рост ограничен числом ядер машины (cpus в результате): клиенты
+и сервер делят одни и те же ядра.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import httpx
+
+from benchmarks.dataset import add_spec_arguments, build_dataset, load_meta, spec_from_args
+from benchmarks.load import Workload, _Target, _free_port, copy_database, parse_mix, run_load
+from benchmarks.stats import LatencyRecorder, environment_info
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def start_server(db_path, port, workers, log):
+    env = dict(os.environ, NOTES_DB_PATH=db_path, NOTES_SERVER_HOST="127.0.0.1",
+               NOTES_SERVER_PORT=str(port), NOTES_SERVER_WORKERS=str(workers))
+    return subprocess.Popen([sys.executable, "server.py"], cwd=SERVER_DIR, env=env,
+                            stdout=log, stderr=subprocess.STDOUT)
+
+
+def wait_ready(process, url, timeout=60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"✘ server.py завершился с кодом {process.returncode}")
+        try:
+            if httpx.get(url + "/users/summary", timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise SystemExit(f"✘ Сервер не ответил за {timeout} с")
+
+
+def stop_server(process):
+    # SIGTERM мастеру uvicorn: он останавливает воркеры и ждёт их
+    process.terminate()
+    try:
+        process.wait(timeout=20)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def _client(url, meta, mix, duration, concurrency, warmup, seed, page_size):
+    """Один процесс-клиент: нагрузка в течение duration секунд, сырые задержки для LatencyRecorder.merge."""
+    recorder = LatencyRecorder()
+    _, _, seconds = run_load(_Target("url", None, url), Workload(meta, page_size), mix, None, duration,
+                             concurrency, warmup, seed, recorder=recorder)
+    return recorder.export(), seconds
+
+
+def measure(url, meta, mix, args):
+    recorder = LatencyRecorder()
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(args.client_processes, mp_context=context) as pool:
+        futures = [pool.submit(_client, url, meta, mix, args.duration, args.concurrency, args.warmup,
+                               index + 1, args.page_size)
+                   for index in range(args.client_processes)]
+        seconds = 0.0
+        for future in futures:
+            data, client_seconds = future.result()
+            recorder.merge(data)
+            seconds = max(seconds, client_seconds)
+    return recorder.summary(seconds)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пропускная способность backend в зависимости от числа воркеров")
+    add_spec_arguments(parser)
+    parser.add_argument("--db", default=None, help="готовая база benchmarks.dataset (иначе создаётся по параметрам)")
+    parser.add_argument("--workers", default="1,2,4", help="числа воркеров через запятую")
+    parser.add_argument("--mix", default="", help="веса операций, как в benchmarks.load")
+    parser.add_argument("--duration", type=float, default=20.0, help="секунд нагрузки на каждый прогон")
+    parser.add_argument("--client-processes", type=int, default=max(1, min(4, os.cpu_count() or 1)),
+                        help="процессов-клиентов")
+    parser.add_argument("--concurrency", type=int, default=8, help="потоков в каждом процессе-клиенте")
+    parser.add_argument("--warmup", type=int, default=50, help="запросов прогрева на процесс-клиент")
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--output", default=None, help="файл результата JSON (по умолчанию в benchmarks/results)")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        meta = load_meta(args.db)
+        if meta is None:
+            raise SystemExit(f"Нет базы или метаданных {args.db}.json - создайте её через benchmarks.dataset")
+    else:
+        meta = build_dataset(spec_from_args(args))
+    mix = parse_mix(args.mix)
+    worker_counts = [int(w) for w in args.workers.split(",")]
+
+    results = {
+        "benchmark": "workers",
+        "environment": environment_info(),
+        "dataset": meta["spec"],
+        "config": {"mix": mix, "duration": args.duration, "client_processes": args.client_processes,
+                   "concurrency": args.concurrency, "page_size": args.page_size},
+        "runs": {},
+    }
+    print(f"{'воркеров':>8} {'зап/с':>9} {'ошибок':>7} {'p50 мс':>8} {'p95 мс':>8} {'p99 мс':>8} {'ускор.':>7}")
+    base_rps = None
+    with tempfile.TemporaryDirectory() as tmp:
+        for workers in worker_counts:
+            db_path = os.path.join(tmp, f"workers{workers}.db")
+            copy_database(meta["path"], db_path)
+            port = _free_port()
+            url = f"http://127.0.0.1:{port}"
+            with open(os.path.join(tmp, f"server{workers}.log"), "wb") as log:
+                process = start_server(db_path, port, workers, log)
+                try:
+                    wait_ready(process, url)
+                    total, endpoints = measure(url, meta, mix, args)
+                finally:
+                    stop_server(process)
+            rps = total.get("requests_per_second", 0.0)
+            base_rps = base_rps or rps
+            speedup = round(rps / base_rps, 2) if base_rps else 0.0
+            results["runs"][str(workers)] = {"total": total, "endpoints": endpoints, "speedup": speedup}
+            print(f"{workers:>8} {rps:>9} {total['errors']:>7} {total['p50_ms']:>8} {total['p95_ms']:>8} "
+                  f"{total['p99_ms']:>8} {speedup:>6}x")
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"workers-{results['environment']['commit'] or 'nogit'}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"✔ Результат сохранён в {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Разбор NDJSON для массового импорта заметок.
+
+Каждая строка - JSON-объект заметки:
+    {"user_id": 1, "title": "...", "content": "...", "tags": "a, b",
+     "date_created": "2024-01-01 10:00:00", "date_modified": "2024-01-02 10:00:00"}
+Обязательны только user_id и title; поле id (например, из экспорта) игнорируется.
+Строки нумеруются с 1; пустые строки пропускаются, но учитываются в нумерации,
+поэтому checkpoint (число обработанных строк) можно передать как skip при повторном запуске.
+"""
+import json
+import time
+
+NOTE_IMPORT_FIELDS = ("title", "content", "user_id", "tags", "date_created", "date_modified")
+NOTE_EXPORT_FIELDS = ("id", "user_id", "title", "content", "tags", "date_created", "date_modified")
+
+
+class BulkImportError(ValueError):
+    """Ошибка в строке line_no входного файла."""
+
+    def __init__(self, line_no, message):
+        super().__init__(f"Строка {line_no}: {message}")
+        self.line_no = line_no
+
+
+def parse_note_record(line_no, line):
+    """Разбирает одну строку NDJSON в кортеж значений NOTE_IMPORT_FIELDS."""
+    try:
+        data = json.loads(line)
+    except ValueError as e:
+        raise BulkImportError(line_no, f"некорректный JSON ({e})")
+    if not isinstance(data, dict):
+        raise BulkImportError(line_no, "ожидается JSON-объект")
+    title = data.get("title")
+    if not isinstance(title, str) or not title:
+        raise BulkImportError(line_no, "поле title обязательно")
+    user_id = data.get("user_id")
+    if not isinstance(user_id, int) or isinstance(user_id, bool):
+        raise BulkImportError(line_no, "поле user_id должно быть целым числом")
+    record = (title, data.get("content"), user_id, data.get("tags"),
+              data.get("date_created"), data.get("date_modified"))
+    for name, value in zip(NOTE_IMPORT_FIELDS, record):
+        if value is not None and not isinstance(value, (str, int)):
+            raise BulkImportError(line_no, f"поле {name} должно быть строкой")
+    return record
+
+
+class NdjsonBatcher:
+    """
+    Собирает входной поток (куски байт произвольной длины) в пачки записей.
+    batch - список пар (номер строки, запись); пачка отдаётся, как только
+    набирается batch_size записей, остаток - вызовом finish().
+    """
+
+    def __init__(self, batch_size=5000, skip=0):
+        self.batch_size = batch_size
+        self.skip = skip
+        self.line_no = 0
+        self._tail = b""
+        self._batch = []
+
+    def feed(self, chunk: bytes):
+        """Принимает очередной кусок данных и возвращает список готовых пачек."""
+        data = self._tail + chunk
+        lines = data.split(b"\n")
+        self._tail = lines.pop()
+        ready = []
+        for line in lines:
+            batch = self._add_line(line)
+            if batch:
+                ready.append(batch)
+        return ready
+
+    def finish(self):
+        """Обрабатывает последнюю строку без перевода строки и возвращает неполную пачку."""
+        if self._tail:
+            self._add_line(self._tail)
+            self._tail = b""
+        batch, self._batch = self._batch, []
+        return batch
+
+    def _add_line(self, line):
+        self.line_no += 1
+        if self.line_no <= self.skip:
+            return None
+        line = line.strip()
+        if not line:
+            return None
+        self._batch.append((self.line_no, parse_note_record(self.line_no, line)))
+        if len(self._batch) >= self.batch_size:
+            batch, self._batch = self._batch, []
+            return batch
+        return None
+
+
+def encode_ndjson(rows, fields=NOTE_EXPORT_FIELDS) -> str:
+    """Кодирует пачку строк-кортежей в NDJSON (по строке на запись)."""
+    return "".join(json.dumps(dict(zip(fields, row)), ensure_ascii=False) + "\n" for row in rows)
+
+
+class Throughput:
+    """Счётчик строк и скорости для отчётов импорта/экспорта."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.rows = 0
+
+    def add(self, rows):
+        self.rows += rows
+
+    @property
+    def seconds(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def rows_per_second(self):
+        seconds = self.seconds
+        return round(self.rows / seconds, 1) if seconds > 0 else 0.0
+
+    def report(self, **extra):
+        return {"rows": self.rows, "seconds": round(self.seconds, 3),
+                "rows_per_second": self.rows_per_second, **extra}
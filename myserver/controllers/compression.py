@@ -0,0 +1,151 @@
+"""
+Сжатие ответов backend по Accept-Encoding: gzip или deflate.
+
+Ответ из одной части сжимается целиком, если он не меньше minimum_size байт.
+Потоковый ответ (несколько частей, как у StreamingResponse) сжимается по частям:
+каждая часть выдаётся сразу (Z_SYNC_FLUSH), чтобы клиент получал NDJSON без задержек.
+"""
+import zlib
+
+# форматы, которые имеет смысл сжимать; остальные (картинки, архивы) уже сжаты
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/x-ndjson", "application/javascript",
+                      "application/xml")
+
+# wbits для zlib: gzip - с заголовком gzip, deflate в HTTP - поток в формате zlib
+_WBITS = {"gzip": 16 + zlib.MAX_WBITS, "deflate": zlib.MAX_WBITS}
+
+
+def choose_encoding(accept_encoding):
+    """'gzip' или 'deflate' по заголовку Accept-Encoding (с учётом q=0), None - без сжатия."""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[name.strip().lower()] = q
+    for name in ("gzip", "deflate"):
+        q = weights.get(name, weights.get("*", 0.0))
+        if q > 0:
+            return name
+    return None
+
+
+def compressor(encoding, level):
+    return zlib.compressobj(level, zlib.DEFLATED, _WBITS[encoding])
+
+
+def is_compressible(content_type):
+    return content_type.split(";", 1)[0].strip().lower().startswith(COMPRESSIBLE_TYPES)
+
+
+class CompressionMiddleware:
+    """ASGI-middleware сжатия. level - уровень zlib 1..9 (0 - сжатие выключено)."""
+
+    def __init__(self, app, minimum_size=1024, level=6):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.level = level
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.level <= 0:
+            await self.app(scope, receive, send)
+            return
+        accept = None
+        for key, value in scope["headers"]:
+            if key == b"accept-encoding":
+                accept = value.decode("latin-1")
+                break
+        encoding = choose_encoding(accept)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await _CompressingResponder(self, encoding, send).run(scope, receive)
+
+
+class _CompressingResponder:
+    def __init__(self, middleware, encoding, send):
+        self.app = middleware.app
+        self.minimum_size = middleware.minimum_size
+        self.level = middleware.level
+        self.encoding = encoding
+        self.send = send
+        self.start = None       # отложенное http.response.start
+        self.passthrough = False
+        self.stream = None      # compressobj для потокового ответа
+
+    async def run(self, scope, receive):
+        await self.app(scope, receive, self.on_message)
+
+    async def on_message(self, message):
+        if self.passthrough:
+            await self.send(message)
+            return
+
+        if message["type"] == "http.response.start":
+            headers = {key.lower(): value for key, value in message.get("headers", [])}
+            content_type = headers.get(b"content-type", b"").decode("latin-1")
+            if (b"content-encoding" in headers or message["status"] in (204, 304)
+                    or not is_compressible(content_type)):
+                self.passthrough = True
+                await self.send(message)
+            else:
+                self.start = message
+            return
+
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.stream is None:
+            if not more_body:
+                # ответ из одной части: маленький отдаём как есть
+                if len(body) < self.minimum_size:
+                    self.passthrough = True
+                    await self.send(self.start)
+                    await self.send(message)
+                    return
+                c = compressor(self.encoding, self.level)
+                data = c.compress(body) + c.flush()
+                await self.send(self._start_message(len(data)))
+                await self.send({"type": "http.response.body", "body": data})
+                return
+            self.stream = compressor(self.encoding, self.level)
+            await self.send(self._start_message(None))
+
+        data = self.stream.compress(body)
+        if more_body:
+            data += self.stream.flush(zlib.Z_SYNC_FLUSH)
+        else:
+            data += self.stream.flush()
+        await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+    def _start_message(self, content_length):
+        headers = []
+        vary = None
+        for key, value in self.start.get("headers", []):
+            lower = key.lower()
+            if lower == b"content-length":
+                continue
+            if lower == b"etag" and value.startswith(b'"'):
+                # сжатое тело отличается побайтно, поэтому сильный ETag становится слабым
+                value = b"W/" + value
+            if lower == b"vary":
+                vary = value
+                continue
+            headers.append((key, value))
+        headers.append((b"content-encoding", self.encoding.encode("latin-1")))
+        headers.append((b"vary", vary + b", Accept-Encoding" if vary else b"Accept-Encoding"))
+        if content_length is not None:
+            headers.append((b"content-length", str(content_length).encode("latin-1")))
+        return {**self.start, "headers": headers}
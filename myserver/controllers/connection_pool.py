@@ -0,0 +1,152 @@
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+
+class PoolTimeoutError(Exception):
+    """Не удалось получить соединение из пула за отведённое время."""
+
+
+class _PooledConnection:
+    __slots__ = ("conn", "created_at", "last_used")
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+
+class ConnectionPool:
+    """
+    Ограниченный пул долгоживущих соединений SQLite.
+
+    Соединение выдаётся на время одного обращения к базе и возвращается обратно.
+    Перед выдачей давно простаивавшие соединения проверяются (SELECT 1),
+    а слишком старые или сломанные закрываются и создаются заново.
+    """
+
+    def __init__(self, factory, size=8, timeout=5.0, max_age=600.0, health_check_interval=30.0):
+        if size < 1:
+            raise ValueError("size должен быть >= 1")
+        self._factory = factory
+        self.size = size
+        self.timeout = timeout
+        self.max_age = max_age
+        self.health_check_interval = health_check_interval
+
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._closed = False
+        self._in_use = 0
+        self._created = 0
+        self._recycled = 0
+        self._waits = 0
+        self._timeouts = 0
+
+    @contextmanager
+    def connection(self):
+        """Выдаёт соединение из пула и возвращает его после выхода из блока with."""
+        item = self._acquire()
+        broken = False
+        try:
+            yield item.conn
+        except sqlite3.DatabaseError as e:
+            broken = not isinstance(e, (sqlite3.IntegrityError, sqlite3.OperationalError))
+            raise
+        finally:
+            self._release(item, broken)
+
+    def _acquire(self):
+        if self._closed:
+            raise PoolTimeoutError("Пул соединений закрыт")
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._waits += 1
+            if not self._slots.acquire(timeout=self.timeout):
+                with self._lock:
+                    self._timeouts += 1
+                raise PoolTimeoutError(f"Нет свободных соединений за {self.timeout} с")
+        try:
+            item = self._take_idle()
+            if item is None:
+                item = _PooledConnection(self._factory())
+                with self._lock:
+                    self._created += 1
+        except BaseException:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._in_use += 1
+        return item
+
+    def _take_idle(self):
+        while True:
+            try:
+                item = self._idle.get_nowait()
+            except queue.Empty:
+                return None
+            now = time.monotonic()
+            if now - item.created_at > self.max_age:
+                self._discard(item)
+                continue
+            if now - item.last_used > self.health_check_interval and not self._is_healthy(item.conn):
+                self._discard(item)
+                continue
+            return item
+
+    @staticmethod
+    def _is_healthy(conn) -> bool:
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _discard(self, item):
+        try:
+            item.conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._recycled += 1
+
+    def _release(self, item, broken=False):
+        with self._lock:
+            self._in_use -= 1
+        try:
+            if not broken and item.conn.in_transaction:
+                item.conn.rollback()
+        except sqlite3.Error:
+            broken = True
+
+        if broken or self._closed:
+            self._discard(item)
+        else:
+            item.last_used = time.monotonic()
+            self._idle.put(item)
+        self._slots.release()
+
+    def close(self):
+        """Закрывает все простаивающие соединения; выданные закроются при возврате."""
+        self._closed = True
+        while True:
+            try:
+                item = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(item)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": self.size,
+                "in_use": self._in_use,
+                "idle": self._idle.qsize(),
+                "created": self._created,
+                "recycled": self._recycled,
+                "waits": self._waits,
+                "timeouts": self._timeouts,
+            }
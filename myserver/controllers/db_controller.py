@@ -1,42 +1,218 @@
+import json
+import pathlib
 import sqlite3
+import time
+from contextlib import contextmanager
+
+from controllers import migrations
+from controllers.bulk import BulkImportError
+from controllers.connection_pool import ConnectionPool
+from controllers.file_lock import file_lock
+from controllers.metrics import REGISTRY
+from controllers.pagination import PageStream, decode_cursor, encode_cursor, split_page
+from controllers.search import build_fts_query, parse_tags
+from controllers.sql_trace import SlowQueryLog, TracingConnection
+from controllers.user_cache import UserCache
+from controllers.write_queue import WriteQueue
+from settings import DatabaseSettings
+
+# поля заметки в ответах списков: (ключ JSON, колонка строки страницы p) для _json_page
+NOTE_JSON_FIELDS = (("id", "p.id"), ("title", "p.title"), ("content", "p.content"),
+                    ("date_created", "p.date_created"), ("date_modified", "p.date_modified"),
+                    ("tags", "p.tags"))
+
 
 class DatabaseController:
-    def __init__(self, db_path="database.db"):
-        self.db_path = db_path
-        self.create_tables()
+    def __init__(self, db_path=None, settings: DatabaseSettings = None):
+        self.settings = settings or DatabaseSettings.from_env()
+        self.db_path = db_path or self.settings.path
+        # одно соединение на запись: писатели выстраиваются в очередь пула, а не ждут блокировку SQLite
+        self.pool = ConnectionPool(
+            self.connect,
+            size=1,
+            timeout=self.settings.pool_timeout,
+            max_age=self.settings.max_connection_age,
+            health_check_interval=self.settings.health_check_interval,
+        )
+        # соединения только для чтения: в WAL они не ждут писателя и не мешают ему
+        self.read_pool = ConnectionPool(
+            self.connect_reader,
+            size=self.settings.pool_size,
+            timeout=self.settings.pool_timeout,
+            max_age=self.settings.max_connection_age,
+            health_check_interval=self.settings.health_check_interval,
+        )
+        self.user_cache = UserCache(self.settings.user_cache_size, self.settings.user_cache_ttl)
+        self.slow_log = None
+        if self.settings.slow_query_ms > 0:
+            self.slow_log = SlowQueryLog(self.settings.slow_query_log, self.settings.slow_query_log_max_bytes,
+                                         self.settings.slow_query_log_backups)
+        # при нескольких воркерах первое соединение (смена режима журнала) и миграции
+        # выполняются процессами по очереди
+        with file_lock(self.db_path + ".lock"):
+            self.migrate()
+        self.write_queue = None
+        if self.settings.write_queue:
+            self.write_queue = WriteQueue(
+                self.pool,
+                max_batch=self.settings.write_batch_size,
+                flush_interval=self.settings.write_batch_interval_ms / 1000,
+                max_depth=self.settings.write_queue_depth,
+                put_timeout=self.settings.pool_timeout,
+            )
 
     def connect(self):
-        """Создает и возвращает соединение с базой данных SQLite."""
-        return sqlite3.connect(self.db_path)
-
-    def create_tables(self):
-        conn = self.connect()
-        cur = conn.cursor()
-
-        cur.execute("""
-                    CREATE TABLE IF NOT EXISTS users (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        username TEXT NOT NULL,
-                        email TEXT NOT NULL UNIQUE,
-                        password TEXT NOT NULL,
-                        is_admin BOOLEAN NOT NULL
-                    );
-                    """)
-
-        cur.execute("""
-                        CREATE TABLE IF NOT EXISTS notes (
-                            id INTEGER PRIMARY KEY AUTOINCREMENT,
-                            title TEXT NOT NULL,
-                            content TEXT,
-                            user_id INTEGER NOT NULL,
-                            date_created TEXT DEFAULT CURRENT_TIMESTAMP,
-                            date_modified TEXT DEFAULT CURRENT_TIMESTAMP,
-                            tags TEXT                                
-                        );
-                        """)
-        conn.commit()
-        conn.close()
-        print("✔ Таблицы созданы")
+        """Создает и возвращает новое соединение с базой данных SQLite с настроенными PRAGMA (для записи)."""
+        s = self.settings
+        conn = self._open(self.db_path)
+        conn.execute(f"PRAGMA journal_mode={s.journal_mode}")
+        conn.execute(f"PRAGMA synchronous={s.synchronous}")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    def connect_reader(self):
+        """Соединение только для чтения (mode=ro и PRAGMA query_only) для read_pool."""
+        uri = pathlib.Path(self.db_path).absolute().as_uri() + "?mode=ro"
+        conn = self._open(uri, uri=True)
+        conn.execute("PRAGMA query_only=ON")
+        return conn
+
+    def _open(self, database, uri=False):
+        s = self.settings
+        if self.slow_log is not None:
+            conn = sqlite3.connect(database, timeout=s.busy_timeout_ms / 1000, check_same_thread=False,
+                                   uri=uri, factory=TracingConnection)
+            conn.enable_slow_log(self.slow_log, s.slow_query_ms / 1000, explain=s.dev_mode)
+        else:
+            conn = sqlite3.connect(database, timeout=s.busy_timeout_ms / 1000, check_same_thread=False, uri=uri)
+        conn.execute(f"PRAGMA cache_size=-{int(s.cache_size_kib)}")
+        conn.execute(f"PRAGMA mmap_size={int(s.mmap_size)}")
+        conn.execute(f"PRAGMA busy_timeout={int(s.busy_timeout_ms)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    @contextmanager
+    def connection(self, method, write=False):
+        """
+        Берёт соединение на время блока with: по умолчанию из read_pool, с write=True - соединение записи.
+        Блок чтения идёт в одной транзакции (BEGIN), то есть видит один снимок базы,
+        сколько бы запросов в нём ни было.
+        При успешном выходе фиксирует транзакцию, при исключении откатывает.
+        Время блока (вместе с ожиданием пула и фиксацией) пишется в метрики с меткой method -
+        именем публичного метода, от которого пришёл запрос; то же имя попадает в журнал медленных запросов.
+        """
+        labels = (("method", method),)
+        started = time.perf_counter()
+        try:
+            with (self.pool if write else self.read_pool).connection() as conn:
+                if self.slow_log is not None:
+                    conn.context = method
+                if not write:
+                    conn.execute("BEGIN")
+                try:
+                    yield conn
+                except BaseException:
+                    conn.rollback()
+                    raise
+                else:
+                    conn.commit()
+                finally:
+                    if self.slow_log is not None:
+                        conn.context = None
+        except Exception:
+            REGISTRY.inc("db_method_errors_total", labels)
+            raise
+        finally:
+            REGISTRY.observe("db_method_duration_seconds", labels, time.perf_counter() - started)
+
+    def _write(self, method, op):
+        """
+        Выполняет запись op(conn) и возвращает её результат после фиксации.
+        С NOTES_DB_WRITE_QUEUE=true операция уходит в очередь group commit (controllers/write_queue.py)
+        и фиксируется вместе с другими, иначе - своей транзакцией, как в connection().
+        """
+        if self.write_queue is None:
+            with self.connection(method, write=True) as conn:
+                return op(conn)
+        labels = (("method", method),)
+        started = time.perf_counter()
+        try:
+            return self.write_queue.submit(op, method)
+        except Exception:
+            REGISTRY.inc("db_method_errors_total", labels)
+            raise
+        finally:
+            # время вместе с ожиданием в очереди и фиксацией пачки
+            REGISTRY.observe("db_method_duration_seconds", labels, time.perf_counter() - started)
+
+    def close(self):
+        """Дописывает очередь записи и закрывает все соединения обоих пулов."""
+        if self.write_queue is not None:
+            self.write_queue.close()
+        self.pool.close()
+        self.read_pool.close()
+        if self.slow_log is not None:
+            self.slow_log.close()
+
+    def migrate(self):
+        """Приводит схему БД к последней версии (см. controllers/migrations.py)."""
+        with self.pool.connection() as conn:
+            applied = migrations.migrate(conn)
+        for number, description in applied:
+            print(f"✔ Миграция {number}: {description}")
+        return applied
+
+    @staticmethod
+    def _sync_note_tags(cur, note_id, tags):
+        """Пересобирает строки note_tags одной заметки по её строке тегов."""
+        cur.execute("DELETE FROM note_tags WHERE note_id=?", (note_id,))
+        cur.executemany(
+            "INSERT INTO note_tags (note_id, user_id, tag) SELECT id, user_id, ? FROM notes WHERE id=?",
+            [(tag, note_id) for tag in parse_tags(tags)]
+        )
+
+    def rebuild_tag_index(self):
+        """Заполняет note_tags заново по колонке notes.tags."""
+        with self.connection("rebuild_tag_index", write=True) as conn:
+            cur = conn.cursor()
+            migrations.fill_tag_index(cur)
+            count = cur.execute("SELECT COUNT(*) FROM note_tags").fetchone()[0]
+        print(f"✔ Индекс тегов перестроен ({count} записей)")
+        return count
+
+    def rebuild_search_index(self):
+        """Полностью перестраивает полнотекстовый индекс по текущему содержимому notes."""
+        with self.connection("rebuild_search_index", write=True) as conn:
+            conn.execute("INSERT INTO notes_fts(notes_fts) VALUES('rebuild')")
+            conn.execute("INSERT INTO notes_fts(notes_fts) VALUES('optimize')")
+            count = conn.execute("SELECT COUNT(*) FROM notes").fetchone()[0]
+        print(f"✔ Поисковый индекс перестроен ({count} заметок)")
+        return count
+
+    def rebuild_note_counts(self):
+        """Пересчитывает users.notes_count по таблице notes."""
+        with self.connection("rebuild_note_counts", write=True) as conn:
+            cur = conn.cursor()
+            migrations.fill_note_counts(cur)
+            count = cur.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+        print(f"✔ Счётчики заметок пересчитаны ({count} пользователей)")
+        return count
+
+    def check_note_counts(self):
+        """
+        Сверяет users.notes_count с фактическим числом заметок.
+        :return: список расхождений [(user_id, notes_count, фактически), ...]
+        """
+        with self.connection("check_note_counts") as conn:
+            return conn.execute("""
+                SELECT id, notes_count, actual FROM (
+                    SELECT u.id, u.notes_count,
+                           (SELECT COUNT(*) FROM notes n WHERE n.user_id = u.id) AS actual
+                    FROM users u
+                )
+                WHERE notes_count != actual
+                ORDER BY id
+            """).fetchall()
 
     def insert_users(self, users_data):
         """
@@ -44,35 +220,29 @@ class DatabaseController:
         на вход:
         [тип User]
         """
-        conn = self.connect()
-        cur = conn.cursor()
-
-        for u in users_data:
-            cur.execute(
+        def write(conn):
+            conn.executemany(
                 "INSERT INTO users (username, email, password, is_admin) VALUES (?, ?, ?, ?)",
-                (u.username, u.email, u.password, u.is_admin)
+                [(u.username, u.email, u.password, u.is_admin) for u in users_data]
             )
-
-        conn.commit()
-        conn.close()
+        self._write("insert_users", write)
         print("✔ Пользователи добавлены")
+
     def update_user_self(self, user_id: int, username: str, email: str, password: str):
-        conn = self.connect()
-        cur = conn.cursor()
-        cur.execute(
-            "UPDATE users SET username=?, email=?, password=? WHERE id=?",
-            (username, email, password, user_id)
-        )
-        conn.commit()
-        conn.close()
+        def write(conn):
+            conn.execute(
+                "UPDATE users SET username=?, email=?, password=? WHERE id=?",
+                (username, email, password, user_id)
+            )
+        self._write("update_user_self", write)
+        self.user_cache.invalidate(user_id)
 
     def delete_user_cascade(self, user_id: int):
-        conn = self.connect()
-        cur = conn.cursor()
-        cur.execute("DELETE FROM notes WHERE id=?", (user_id,))
-        cur.execute("DELETE FROM users WHERE id=?", (user_id,))
-        conn.commit()
-        conn.close()
+        def write(conn):
+            # заметки и их теги удаляются каскадно по внешним ключам
+            conn.execute("DELETE FROM users WHERE id=?", (user_id,))
+        self._write("delete_user_cascade", write)
+        self.user_cache.invalidate(user_id)
 
     def insert_note(self, note):
         """
@@ -81,228 +251,504 @@ class DatabaseController:
         на вход:
         объект типа Note
         """
-        conn = self.connect()
-        cur = conn.cursor()
+        def write(conn):
+            cur = conn.cursor()
+            cur.execute("INSERT INTO notes (title, content, user_id, tags)VALUES (?, ?, ?, ?)", (
+                note.title,
+                note.content,
+                note.user_id,
+                note.tags
+            ))
+            self._sync_note_tags(cur, cur.lastrowid, note.tags)
+        self._write("insert_note", write)
+        print("✔ Заметка добавлена")
 
-        cur.execute("INSERT INTO notes (title, content, user_id, tags)VALUES (?, ?, ?, ?)", (
-            note.title,
-            note.content,
-            note.user_id,
-            note.tags
-        ))
+    @staticmethod
+    def _recent_cursor(row, date_index, id_index=0):
+        return encode_cursor("recent", row[date_index], row[id_index])
 
-        conn.commit()
-        conn.close()
-        print("✔ Заметка добавлена")
+    @staticmethod
+    def _after_recent(cursor, alias="n"):
+        """Условие keyset-пагинации для порядка (date_modified DESC, id DESC)."""
+        if not cursor:
+            return "", []
+        date_modified, note_id = decode_cursor(cursor, "recent", 2)
+        return f" AND ({alias}.date_modified, {alias}.id) < (?, ?)", [date_modified, note_id]
 
-    def read_notes_by_user(self, user_id):
+    def _json_page(self, conn, sql, params, limit, fields, cursor_kind, cursor_columns, field_params=()):
         """
-        Находит все заметки по user_id
-        :param user_id:
-        :return [..., (id, title, content, user_id, date_created, date_modified, tags), ...]:
+        Страница списка одним запросом, JSON которого собирает SQLite (json_group_array/json_object),
+        без создания объектов Python на каждую строку.
+        sql - запрос строк с ORDER BY (без LIMIT); строки берутся с LIMIT limit + 1 в материализованный
+        CTE page, в массив попадают первые limit, а по лишней строке видно, что есть следующая страница.
+        :param fields: [(ключ JSON, выражение над строкой p)]
+        :param cursor_columns: колонки ключа курсора; значения берутся из последней строки страницы
+                               как есть, без JSON, чтобы BM25-оценка не теряла точность
+        :param field_params: параметры выражений fields (например, MATCH для snippet)
+        :return: (текст JSON-массива, next_cursor)
         """
-        conn = self.connect()
-        cur = conn.cursor()
-
-        cur.execute("SELECT id, title, content, date_created, date_modified, tags FROM notes WHERE user_id=?",
-                    (user_id,))
-        rows = cur.fetchall()
-        conn.close()
-        return rows
-
-
-    def read_note_by_id(self,id):
-
-        conn = self.connect()
-        cur = conn.cursor()
-        cur.execute("SELECT id, title, content, date_created, date_modified, tags FROM notes WHERE id=?",
-                    (id,))
-        row = cur.fetchone()
-        conn.close()
-        return row
+        limit_sql, limit_params = self._limit_clause(limit)
+        item = "json_object(" + ", ".join(f"'{key}', {expr}" for key, expr in fields) + ")"
+        last_row = "".join(f", (SELECT {column} FROM page LIMIT 1 OFFSET ?)" for column in cursor_columns)
+        page_size = -1 if limit is None else limit  # LIMIT -1 в SQLite - без ограничения
+        rows = conn.execute(
+            f"WITH page AS MATERIALIZED ({sql}{limit_sql}) "
+            f"SELECT (SELECT json_group_array({item}) FROM (SELECT * FROM page LIMIT ?) AS p), "
+            f"(SELECT COUNT(*) FROM page){last_row}",
+            [*params, *limit_params, *field_params, page_size, *[max(page_size - 1, 0)] * len(cursor_columns)]
+        ).fetchone()
+        items, count, key = rows[0], rows[1], rows[2:]
+        if limit is None or count <= limit:
+            return items, None
+        return items, encode_cursor(cursor_kind, *key)
+
+    def supports_json(self) -> bool:
+        """Есть ли в сборке SQLite функции JSON (встроены с 3.38, раньше - расширение JSON1)."""
+        with self.connection("supports_json") as conn:
+            try:
+                conn.execute("SELECT json_group_array(json_object('a', 1))").fetchone()
+            except sqlite3.OperationalError:
+                return False
+        return True
+
+    @staticmethod
+    def _limit_clause(limit):
+        """LIMIT на одну строку больше страницы, чтобы узнать, есть ли продолжение."""
+        if limit is None:
+            return "", []
+        return " LIMIT ?", [limit + 1]
+
+    def import_notes_batch(self, batch):
+        """
+        Вставляет пачку заметок одной транзакцией (executemany) и заполняет для них note_tags.
+        :param batch: [(номер строки, (title, content, user_id, tags, date_created, date_modified)), ...]
+                      - пачка из controllers.bulk.NdjsonBatcher
+        :return: число вставленных заметок
+        """
+        if not batch:
+            return 0
+        records = [record for _, record in batch]
+        with self.connection("import_notes_batch", write=True) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            user_ids = json.dumps(sorted({r[2] for r in records}))
+            known = {row[0] for row in conn.execute(
+                "SELECT id FROM users WHERE id IN (SELECT value FROM json_each(?))", (user_ids,))}
+            for line_no, record in batch:
+                if record[2] not in known:
+                    raise BulkImportError(line_no, f"пользователь {record[2]} не найден")
+
+            last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM notes").fetchone()[0]
+            conn.executemany(
+                "INSERT INTO notes (title, content, user_id, tags, date_created, date_modified) "
+                "VALUES (?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP), COALESCE(?, CURRENT_TIMESTAMP))",
+                records
+            )
+            # новые id больше last_id: в транзакции BEGIN IMMEDIATE других писателей нет
+            tagged = conn.execute(
+                "SELECT id, user_id, tags FROM notes WHERE id > ? AND tags IS NOT NULL AND tags != ''",
+                (last_id,)).fetchall()
+            conn.executemany(
+                "INSERT INTO note_tags (note_id, user_id, tag) VALUES (?, ?, ?)",
+                [(note_id, user_id, tag) for note_id, user_id, tags in tagged for tag in parse_tags(tags)]
+            )
+        return len(records)
 
+    def export_notes(self, after_id=0, user_id=None, batch_size=1000):
+        """
+        Генератор для потоковой выгрузки: отдаёт заметки пачками (списками кортежей
+        в порядке controllers.bulk.NOTE_EXPORT_FIELDS) по возрастанию id, читая курсор
+        через fetchmany - в памяти одновременно только одна пачка.
+        Для продолжения прерванной выгрузки передайте after_id последней полученной заметки.
+        """
+        sql = ("SELECT id, user_id, title, content, tags, date_created, date_modified "
+               "FROM notes WHERE id > ?")
+        params = [after_id]
+        if user_id is not None:
+            sql += " AND user_id = ?"
+            params.append(user_id)
+        with self.connection("export_notes") as conn:
+            cur = conn.execute(sql + " ORDER BY id", params)
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+
+    def read_notes_by_user(self, user_id, limit=None, cursor=None):
+        """
+        Находит заметки по user_id, от последних изменённых к старым.
+        :param user_id:
+        :param limit: размер страницы (None - все заметки)
+        :param cursor: курсор из предыдущей страницы
+        :return ([..., (id, title, content, date_created, date_modified, tags), ...], next_cursor):
+        """
+        sql, params = self._user_notes_query(user_id, cursor)
+        limit_sql, limit_params = self._limit_clause(limit)
+        with self.connection("read_notes_by_user") as conn:
+            rows = conn.execute(sql + limit_sql, params + limit_params).fetchall()
+        return split_page(rows, limit, lambda r: self._recent_cursor(r, 4))
+
+    def read_notes_by_user_json(self, user_id, limit=None, cursor=None):
+        """Как read_notes_by_user, но страница - готовый JSON-массив из SQLite: (текст JSON, next_cursor)."""
+        sql, params = self._user_notes_query(user_id, cursor)
+        with self.connection("read_notes_by_user_json") as conn:
+            return self._json_page(conn, sql, params, limit, NOTE_JSON_FIELDS, "recent", ("date_modified", "id"))
+
+    def _user_notes_query(self, user_id, cursor):
+        after_sql, after_params = self._after_recent(cursor)
+        return ("SELECT n.id, n.title, n.content, n.date_created, n.date_modified, n.tags FROM notes n "
+                "WHERE n.user_id=?" + after_sql + " ORDER BY n.date_modified DESC, n.id DESC",
+                [user_id, *after_params])
+
+    def read_note_by_id(self, id):
+        with self.connection("read_note_by_id") as conn:
+            cur = conn.execute(
+                "SELECT id, title, content, date_created, date_modified, tags FROM notes WHERE id=?",
+                (id,))
+            return cur.fetchone()
+
+    def read_notes_by_ids(self, ids):
+        """
+        Несколько заметок одним запросом (WHERE id IN ...), в порядке ids.
+        Несуществующие id пропускаются, повторы отдаются один раз.
+        """
+        ids = list(dict.fromkeys(ids))
+        if not ids:
+            return []
+        placeholders = ",".join("?" * len(ids))
+        with self.connection("read_notes_by_ids") as conn:
+            rows = conn.execute(
+                "SELECT id, title, content, date_created, date_modified, tags FROM notes "
+                f"WHERE id IN ({placeholders})", ids).fetchall()
+        by_id = {row[0]: row for row in rows}
+        return [by_id[note_id] for note_id in ids if note_id in by_id]
 
     def login_user(self, email, password):
         """ Возвращает 0 если пользователя нет / если есть - row """
-        conn = self.connect()
-        cur = conn.cursor()
-        sql = "SELECT * FROM users WHERE email=? AND password = ?"
-        cur.execute(sql, (email,password))
-        row = cur.fetchone()
+        with self.connection("login_user") as conn:
+            sql = "SELECT * FROM users WHERE email=? AND password = ?"
+            row = conn.execute(sql, (email, password)).fetchone()
         if row is None:
             return 0
         else:
             return row
 
-
     def update_note(self, id, title, new_content, tags):
         """Обновляет note и возвращает 1"""
-        conn = self.connect()
-        cur = conn.cursor()
-
-        cur.execute("UPDATE notes SET title=?, content=?, tags=?, date_modified=CURRENT_TIMESTAMP WHERE id=?",
-                    (title, new_content, tags, id))
-
-        conn.commit()
-        conn.close()
-
+        def write(conn):
+            cur = conn.cursor()
+            cur.execute("UPDATE notes SET title=?, content=?, tags=?, date_modified=CURRENT_TIMESTAMP WHERE id=?",
+                        (title, new_content, tags, id))
+            self._sync_note_tags(cur, id, tags)
+        self._write("update_note", write)
         return 1
 
-
     def delete_note(self, id):
         """Удаляет note по его id и возвращает 1"""
-        conn = self.connect()
-        cur = conn.cursor()
-        cur.execute("DELETE FROM notes WHERE id=?", (id,))
-        conn.commit()
-        conn.close()
+        self._write("delete_note", lambda conn: conn.execute("DELETE FROM notes WHERE id=?", (id,)))
         return 1
 
-    def search_notes(self, user_id, query="", tag=""):
+    def search_notes(self, user_id, query="", tag="", tag_mode="all", limit=None, cursor=None):
         """
-        Ищет заметки по user_id с фильтрацией по query (в заголовке или содержимом)
-        и по тегу
+        Ищет заметки по user_id с фильтрацией по query (в заголовке, содержимом или тегах)
+        и по тегам.
+        Поиск по query идёт через FTS5: слова ищутся по префиксу, результаты
+        упорядочены по BM25 (совпадения в заголовке весят больше), для каждой заметки
+        строится фрагмент текста с найденными словами, обёрнутыми в <mark>...</mark>.
+        Без query заметки идут от последних изменённых к старым.
+        Теги сравниваются точно (без учёта регистра) по индексу note_tags.
         :param user_id: ID пользователя
-        :param query: строка поиска в заголовке или содержимом
-        :param tag: тег для фильтрации
-        :return: список кортежей (id, title, content, date_created, date_modified, tags)
-        """
-        conn = self.connect()
-        cur = conn.cursor()
-        
-        sql = "SELECT id, title, content, date_created, date_modified, tags FROM notes WHERE user_id=?"
-        params = [user_id]
-        
-        if query:
-            sql += " AND (title LIKE ? OR content LIKE ?)"
-            query_param = f"%{query}%"
-            params.extend([query_param, query_param])
-        
-        if tag:
-            sql += " AND tags LIKE ?"
-            params.append(f"%{tag}%")
-        
-        cur.execute(sql, params)
-        rows = cur.fetchall()
-        conn.close()
-        return rows
+        :param query: строка поиска
+        :param tag: один или несколько тегов через запятую
+        :param tag_mode: "all" - заметка должна иметь все теги, "any" - хотя бы один
+        :param limit: размер страницы (None - все результаты)
+        :param cursor: курсор из предыдущей страницы
+        :return: (список кортежей (id, title, content, date_created, date_modified, tags, snippet), next_cursor);
+                 snippet равен None, если query пустой
+        """
+        sql, params, fts_query = self._search_query(user_id, query, tag, tag_mode, cursor)
+        if fts_query:
+            make_cursor = lambda r: encode_cursor("rank", r[6], r[0])
+        else:
+            make_cursor = lambda r: self._recent_cursor(r, 4)
+        limit_sql, limit_params = self._limit_clause(limit)
+        sql += limit_sql
+        params.extend(limit_params)
+
+        with self.connection("search_notes") as conn:
+            rows = conn.execute(sql, params).fetchall()
+            rows, next_cursor = split_page(rows, limit, make_cursor)
+            if not fts_query or not rows:
+                return rows, next_cursor
+            # фрагменты строим только для строк текущей страницы
+            ids = [r[0] for r in rows]
+            placeholders = ", ".join("?" for _ in ids)
+            snippets = dict(conn.execute(
+                f"SELECT rowid, snippet(notes_fts, -1, '<mark>', '</mark>', '…', 16) FROM notes_fts "
+                f"WHERE notes_fts MATCH ? AND rowid IN ({placeholders})",
+                [fts_query, *ids]).fetchall())
+        return [(*r[:6], snippets.get(r[0])) for r in rows], next_cursor
+
+    def search_notes_json(self, user_id, query="", tag="", tag_mode="all", limit=None, cursor=None):
+        """
+        Как search_notes, но страница - готовый JSON-массив из SQLite: (текст JSON, next_cursor).
+        Фрагмент с <mark> строится только для строк страницы, как и в search_notes.
+        """
+        sql, params, fts_query = self._search_query(user_id, query, tag, tag_mode, cursor)
+        if fts_query:
+            snippet = ("(SELECT snippet(notes_fts, -1, '<mark>', '</mark>', '…', 16) FROM notes_fts "
+                       "WHERE notes_fts MATCH ? AND rowid = p.id)")
+            fields = NOTE_JSON_FIELDS + (("snippet", snippet),)
+            field_params = [fts_query]
+            cursor_kind, cursor_columns = "rank", ("score", "id")
+        else:
+            fields = NOTE_JSON_FIELDS + (("snippet", "NULL"),)
+            field_params = []
+            cursor_kind, cursor_columns = "recent", ("date_modified", "id")
+        with self.connection("search_notes_json") as conn:
+            return self._json_page(conn, sql, params, limit, fields, cursor_kind, cursor_columns, field_params)
+
+    def _search_query(self, user_id, query, tag, tag_mode, cursor):
+        """(SQL страницы с ORDER BY, без LIMIT; параметры; запрос FTS или пустая строка) для search_notes."""
+        fts_query = build_fts_query(query)
+        if fts_query:
+            sql = """
+                SELECT n.id, n.title, n.content, n.date_created, n.date_modified, n.tags,
+                       bm25(notes_fts, 10.0, 1.0, 5.0) AS score
+                FROM notes_fts
+                JOIN notes n ON n.id = notes_fts.rowid
+                WHERE notes_fts MATCH ? AND n.user_id = ?
+            """
+            params = [fts_query, user_id]
+        else:
+            sql = """
+                SELECT n.id, n.title, n.content, n.date_created, n.date_modified, n.tags, NULL AS score
+                FROM notes n
+                WHERE n.user_id = ?
+            """
+            params = [user_id]
+
+        tags = parse_tags(tag)
+        if tags:
+            placeholders = ", ".join("?" for _ in tags)
+            sql += f" AND n.id IN (SELECT note_id FROM note_tags WHERE user_id = ? AND tag IN ({placeholders})"
+            params.append(user_id)
+            params.extend(tags)
+            if tag_mode == "any":
+                sql += ")"
+            else:
+                sql += " GROUP BY note_id HAVING COUNT(*) = ?)"
+                params.append(len(tags))
+
+        if fts_query:
+            # порядок по (score, id) по возрастанию: у BM25 в SQLite лучшие совпадения отрицательнее
+            sql = f"SELECT * FROM ({sql}) WHERE 1"
+            if cursor:
+                score, note_id = decode_cursor(cursor, "rank", 2)
+                sql += " AND (score, id) > (?, ?)"
+                params.extend([score, note_id])
+            sql += " ORDER BY score, id"
+        else:
+            after_sql, after_params = self._after_recent(cursor)
+            sql += after_sql + " ORDER BY n.date_modified DESC, n.id DESC"
+            params.extend(after_params)
+        return sql, params, fts_query
+
+    def get_tag_counts(self, user_id):
+        """
+        Возвращает теги пользователя с количеством заметок по каждому.
+        Запрос читает только индекс idx_note_tags_user_tag.
+        :return: [{"tag": ..., "count": ...}, ...] в алфавитном порядке
+        """
+        with self.connection("get_tag_counts") as conn:
+            rows = conn.execute(
+                "SELECT tag, COUNT(*) FROM note_tags WHERE user_id=? GROUP BY tag ORDER BY tag",
+                (user_id,)
+            ).fetchall()
+        return [{"tag": r[0], "count": r[1]} for r in rows]
 
     def get_users_summary(self):
-        conn = self.connect()
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT
-                u.id,
-                u.username,
-                u.email,
-                u.is_admin,
-                COUNT(n.id) AS notes_count
-            FROM users u
-            LEFT JOIN notes n ON n.user_id = u.id
-            GROUP BY u.id, u.username, u.email
-            ORDER BY u.username
-             """)
-        rows = cur.fetchall()
-        conn.close()
+        with self.connection("get_users_summary") as conn:
+            # notes_count поддерживается триггерами (миграция 6), агрегат по notes не нужен
+            rows = conn.execute("""
+                SELECT id, username, email, is_admin, notes_count
+                FROM users
+                ORDER BY username
+                 """).fetchall()
 
         return [
             {"id": r[0], "name": r[1], "email": r[2], "is_admin": r[3], "notes_count": r[4]}
             for r in rows
         ]
+
     def get_user_by_id(self, user_id: int):
-        conn = self.connect()
-        cur = conn.cursor()
-        cur.execute("SELECT id, username, email, password, is_admin FROM users WHERE id=?", (user_id,))
-        row = cur.fetchone()
-        conn.close()
+        """Пользователь по id; запись берётся из user_cache, если она там есть и не устарела."""
+        user, generation = self.user_cache.get(user_id)
+        if user is not None:
+            return dict(user)
+        with self.connection("get_user_by_id") as conn:
+            row = conn.execute(
+                "SELECT id, username, email, password, is_admin FROM users WHERE id=?", (user_id,)
+            ).fetchone()
         if not row:
             return None
-        return {"id": row[0], "username": row[1], "email": row[2], "password": row[3], "is_admin": row[4]}
-    def admin_list_users(self):
-        conn = self.connect()
-        cur = conn.cursor()
-        cur.execute("SELECT id, username, email, password, is_admin FROM users ORDER BY id")
-        rows = cur.fetchall()
-        conn.close()
-        return [{"id": r[0], "username": r[1], "email": r[2], "is_admin": r[4]} for r in rows]
+        user = {"id": row[0], "username": row[1], "email": row[2], "password": row[3], "is_admin": row[4]}
+        self.user_cache.put(user_id, user, generation)
+        return dict(user)
+
+    def admin_get_user(self, user_id: int):
+        """Пользователь для админки без пароля: {"id", "username", "email", "is_admin"} или None."""
+        user = self.get_user_by_id(user_id)
+        if user is None:
+            return None
+        return {"id": user["id"], "username": user["username"], "email": user["email"],
+                "is_admin": user["is_admin"]}
+
+    def admin_list_users(self, limit=None, cursor=None):
+        """
+        Список пользователей по возрастанию id.
+        :return: ([{"id", "username", "email", "is_admin"}, ...], next_cursor)
+        """
+        page = self.stream_admin_users(limit, cursor)
+        return page.items(), page.next_cursor
+
+    def stream_admin_users(self, limit=None, cursor=None, batch_size=500):
+        """Потоковый вариант admin_list_users: PageStream с пачками по batch_size строк."""
+        sql, params = self._admin_users_query(cursor)
+        limit_sql, limit_params = self._limit_clause(limit)
+        batches = self._iter_batches("stream_admin_users", sql + limit_sql, params + limit_params, batch_size,
+                                     lambda r: {"id": r[0], "username": r[1], "email": r[2], "is_admin": r[3]})
+        return PageStream(batches, limit, lambda item: encode_cursor("id", item["id"]))
+
+    def admin_list_users_json(self, limit=None, cursor=None):
+        """Как admin_list_users, но страница - готовый JSON-массив из SQLite: (текст JSON, next_cursor)."""
+        sql, params = self._admin_users_query(cursor)
+        fields = (("id", "p.id"), ("username", "p.username"), ("email", "p.email"), ("is_admin", "p.is_admin"))
+        with self.connection("admin_list_users_json") as conn:
+            return self._json_page(conn, sql, params, limit, fields, "id", ("id",))
+
+    @staticmethod
+    def _admin_users_query(cursor):
+        sql = "SELECT id, username, email, is_admin FROM users"
+        params = []
+        if cursor:
+            (after_id,) = decode_cursor(cursor, "id", 1)
+            sql += " WHERE id > ?"
+            params.append(after_id)
+        return sql + " ORDER BY id", params
+
+    def _iter_batches(self, method, sql, params, batch_size, to_item):
+        """
+        Выполняет запрос и отдаёт результат пачками через fetchmany, не читая его целиком.
+        Соединение из пула занято, пока генератор не исчерпан или не закрыт.
+        """
+        with self.connection(method) as conn:
+            cur = conn.execute(sql, params)
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield [to_item(r) for r in rows]
 
     def admin_create_user(self, username: str, email: str, password: str, is_admin: int=0):
-        conn = self.connect()
-        cur = conn.cursor()
-        cur.execute(
-            "INSERT INTO users (username, email, password, is_admin) VALUES (?, ?, ?, ?)",
-            (username, email, password, is_admin),
-        )
-        conn.commit()
-        new_id = cur.lastrowid
-        conn.close()
-        return new_id
+        def write(conn):
+            cur = conn.execute(
+                "INSERT INTO users (username, email, password, is_admin) VALUES (?, ?, ?, ?)",
+                (username, email, password, is_admin),
+            )
+            return cur.lastrowid
+        return self._write("admin_create_user", write)
+
+    def ensure_admin(self, username: str, email: str, password: str) -> bool:
+        """
+        Создаёт администратора, если пользователя с таким email ещё нет; True - если создан.
+        Проверка и вставка - один оператор под блокировкой записи, поэтому одновременный старт
+        нескольких процессов не даёт ни дубля, ни ошибки UNIQUE. NOT EXISTS, а не ON CONFLICT:
+        неудавшаяся вставка с ON CONFLICT расходует значение AUTOINCREMENT.
+        """
+        def write(conn):
+            cur = conn.execute(
+                "INSERT INTO users (username, email, password, is_admin) SELECT ?, ?, ?, 1 "
+                "WHERE NOT EXISTS (SELECT 1 FROM users WHERE email = ?)",
+                (username, email, password, email),
+            )
+            return cur.rowcount == 1
+        return self._write("ensure_admin", write)
+
     def admin_exists(self)->bool:
-        conn = self.connect()
-        cur = conn.cursor()
-        cur.execute("SELECT 1 FROM users WHERE is_admin=1 LIMIT 1")
-        row = cur.fetchone()
-        conn.close()
+        with self.connection("admin_exists") as conn:
+            row = conn.execute("SELECT 1 FROM users WHERE is_admin=1 LIMIT 1").fetchone()
         return row is not None
 
     def admin_update_user(self, user_id: int, username: str, email: str, password: str, is_admin: int):
-        conn = self.connect()
-        cur = conn.cursor()
-        cur.execute(
-            "UPDATE users SET username=?, email=?, password=?, is_admin=? WHERE id=?",
-            (username, email, password, is_admin, user_id),
-        )
-        conn.commit()
-        conn.close()
+        def write(conn):
+            conn.execute(
+                "UPDATE users SET username=?, email=?, password=?, is_admin=? WHERE id=?",
+                (username, email, password, is_admin, user_id),
+            )
+        self._write("admin_update_user", write)
+        self.user_cache.invalidate(user_id)
 
     def admin_delete_user(self, user_id: int):
-        conn = self.connect()
-        cur = conn.cursor()
-        cur.execute("DELETE FROM notes WHERE user_id = ?", (user_id,))
-        cur.execute("DELETE FROM users WHERE id = ?", (user_id,))
-        conn.commit()
-        conn.close()
-
-    def admin_list_notes(self):
-        conn = self.connect()
-        cur = conn.cursor()
-        cur.execute("""
+        self._write("admin_delete_user", lambda conn: conn.execute("DELETE FROM users WHERE id = ?", (user_id,)))
+        self.user_cache.invalidate(user_id)
+
+    def admin_list_notes(self, limit=None, cursor=None):
+        """
+        Все заметки всех пользователей, от последних изменённых к старым.
+        :return: ([{...заметка..., "user_id", "username"}, ...], next_cursor)
+        """
+        page = self.stream_admin_notes(limit, cursor)
+        return page.items(), page.next_cursor
+
+    def stream_admin_notes(self, limit=None, cursor=None, batch_size=500):
+        """Потоковый вариант admin_list_notes: PageStream с пачками по batch_size строк."""
+        sql, params = self._admin_notes_query(cursor)
+        limit_sql, limit_params = self._limit_clause(limit)
+        batches = self._iter_batches("stream_admin_notes", sql + limit_sql, params + limit_params, batch_size,
+                                     lambda r: {
+                                         "id": r[0], "title": r[1], "content": r[2], "tags": r[3],
+                                         "date_created": r[4], "date_modified": r[5],
+                                         "user_id": r[6], "username": r[7]
+                                     })
+        return PageStream(batches, limit,
+                          lambda item: encode_cursor("recent", item["date_modified"], item["id"]))
+
+    def admin_list_notes_json(self, limit=None, cursor=None):
+        """Как admin_list_notes, но страница - готовый JSON-массив из SQLite: (текст JSON, next_cursor)."""
+        sql, params = self._admin_notes_query(cursor)
+        fields = (("id", "p.id"), ("title", "p.title"), ("content", "p.content"), ("tags", "p.tags"),
+                  ("date_created", "p.date_created"), ("date_modified", "p.date_modified"),
+                  ("user_id", "p.user_id"), ("username", "p.username"))
+        with self.connection("admin_list_notes_json") as conn:
+            return self._json_page(conn, sql, params, limit, fields, "recent", ("date_modified", "id"))
+
+    def _admin_notes_query(self, cursor):
+        after_sql, after_params = self._after_recent(cursor)
+        sql = """
             SELECT n.id, n.title, n.content, n.tags, n.date_created, n.date_modified, n.user_id, u.username
             FROM notes n
             JOIN users u ON u.id = n.user_id
-            ORDER BY n.date_modified DESC
-        """)
-        rows = cur.fetchall()
-        conn.close()
-        return [
-            {
-                "id":r[0], "title": r[1], "content": r[2], "tags": r[3],
-                "date_created": r[4], "date_modified": r[5],
-                "user_id": r[6], "username": r[7]
-            }
-            for r in rows
-        ]
+            WHERE 1""" + after_sql + """
+            ORDER BY n.date_modified DESC, n.id DESC
+        """
+        return sql, after_params
+
     def admin_update_note(self, note_id: int, title: str, content: str, tags:str):
-        conn = self.connect()
-        cur = conn.cursor()
-        cur.execute("""
-            UPDATE notes
-            SET title=?, content=?, tags=?, date_modified=CURRENT_TIMESTAMP
-            WHERE id = ?
-        """, (title, content, tags, note_id))
-        conn.commit()
-        conn.close()
+        def write(conn):
+            cur = conn.cursor()
+            cur.execute("""
+                UPDATE notes
+                SET title=?, content=?, tags=?, date_modified=CURRENT_TIMESTAMP
+                WHERE id = ?
+            """, (title, content, tags, note_id))
+            self._sync_note_tags(cur, note_id, tags)
+        self._write("admin_update_note", write)
 
     def admin_delete_note(self, note_id: int):
-        conn = self.connect()
-        cur = conn.cursor()
-        cur.execute("DELETE FROM notes WHERE id = ?", (note_id,))
-        conn.commit()
-        conn.close()
+        self._write("admin_delete_note", lambda conn: conn.execute("DELETE FROM notes WHERE id = ?", (note_id,)))
+
     def user_exists_by_email(self, email: str) -> bool:
-        conn = self.connect()
-        cur = conn.cursor()
-        cur.execute("SELECT 1 FROM users WHERE email=? LIMIT 1", (email,))
-        row = cur.fetchone()
-        conn.close()
-        return row is not None
\ No newline at end of file
+        with self.connection("user_exists_by_email") as conn:
+            row = conn.execute("SELECT 1 FROM users WHERE email=? LIMIT 1", (email,)).fetchone()
+        return row is not None
@@ -0,0 +1,55 @@
+"""
+Межпроцессная блокировка на файле: при нескольких воркерах uvicorn подготовка базы
+(режим журнала, миграции, начальные данные) выполняется процессами по очереди.
+Блокировка снимается и при аварийном завершении процесса - её держит открытый файл.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class FileLockTimeoutError(Exception):
+    """Блокировку не удалось получить за отведённое время."""
+
+
+def _try_lock(fd):
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+def _unlock(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def file_lock(path, timeout=60.0, poll_interval=0.05):
+    """Исключительная блокировка path на время блока with; ждёт не дольше timeout секунд."""
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        deadline = time.monotonic() + timeout
+        while not _try_lock(fd):
+            if time.monotonic() >= deadline:
+                raise FileLockTimeoutError(f"Не удалось получить блокировку {path} за {timeout} с")
+            time.sleep(poll_interval)
+        try:
+            yield
+        finally:
+            _unlock(fd)
+    finally:
+        os.close(fd)
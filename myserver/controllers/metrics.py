@@ -0,0 +1,227 @@
+"""
+Метрики backend в текстовом формате Prometheus: счётчики, gauge и гистограммы задержек.
+
+Запись не берёт общих блокировок: каждый поток пишет в свой шард (словари в threading.local),
+а при чтении /metrics шарды всех потоков складываются. Общая блокировка нужна только
+при первом обращении нового потока и при сборе. Шарды завершившихся потоков при сборе
+сворачиваются в один, чтобы их число не росло вместе с числом когда-либо живших потоков.
+"""
+import bisect
+import threading
+import time
+
+# границы корзин гистограмм в секундах (le - включительно, как в Prometheus)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class _Shard:
+    __slots__ = ("values", "histograms")
+
+    def __init__(self):
+        self.values = {}      # (имя, метки) -> число (counter и gauge)
+        self.histograms = {}  # (имя, метки) -> [счётчики корзин..., +Inf, сумма]
+
+
+class MetricsRegistry:
+    """
+    Набор метрик процесса. Метки передаются кортежем пар: (("route", "/notes"), ("status", "200")).
+    Перед записью метрику нужно описать через describe(), иначе она не попадёт в вывод.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._meta = {}        # имя -> (тип, описание)
+        self._collectors = []  # функции () -> [(имя, метки, значение)], вызываются при сборе
+        self._local = threading.local()
+        self._shards = []      # [(поток, шард)]
+        self._retired = _Shard()
+        self._lock = threading.Lock()
+
+    def describe(self, name, kind, help_text):
+        """kind: "counter", "gauge" или "histogram"."""
+        self._meta[name] = (kind, help_text)
+
+    def add_collector(self, collect):
+        """Значения, которые вычисляются в момент сбора (размер пула, размер кэша и т.п.)."""
+        self._collectors.append(collect)
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            with self._lock:
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def inc(self, name, labels=(), value=1):
+        values = self._shard().values
+        key = (name, labels)
+        values[key] = values.get(key, 0) + value
+
+    def dec(self, name, labels=(), value=1):
+        self.inc(name, labels, -value)
+
+    def observe(self, name, labels, seconds):
+        histograms = self._shard().histograms
+        key = (name, labels)
+        counts = histograms.get(key)
+        if counts is None:
+            counts = histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        counts[-1] += seconds
+
+    def timer(self, name, labels=()):
+        return _Timer(self, name, labels)
+
+    # --- сбор ---
+
+    @staticmethod
+    def _merge(target, shard):
+        for key, value in dict(shard.values).items():
+            target.values[key] = target.values.get(key, 0) + value
+        for key, counts in dict(shard.histograms).items():
+            total = target.histograms.get(key)
+            if total is None:
+                target.histograms[key] = list(counts)
+            else:
+                for i, count in enumerate(list(counts)):
+                    total[i] += count
+
+    def collect(self):
+        """Сумма шардов всех потоков: _Shard со значениями на момент вызова."""
+        merged = _Shard()
+        with self._lock:
+            alive = []
+            for thread, shard in self._shards:
+                if thread.is_alive():
+                    alive.append((thread, shard))
+                else:
+                    self._merge(self._retired, shard)
+            self._shards = alive
+            self._merge(merged, self._retired)
+            for _, shard in alive:
+                self._merge(merged, shard)
+        for collect in self._collectors:
+            for name, labels, value in collect():
+                merged.values[(name, labels)] = value
+        return merged
+
+    def render(self):
+        """Текст для GET /metrics."""
+        merged = self.collect()
+        by_name = {}
+        for (name, labels), value in merged.values.items():
+            by_name.setdefault(name, []).append((labels, value))
+        for (name, labels), counts in merged.histograms.items():
+            by_name.setdefault(name, []).append((labels, counts))
+
+        lines = []
+        for name, (kind, help_text) in self._meta.items():
+            samples = by_name.get(name)
+            if not samples:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in sorted(samples, key=lambda s: s[0]):
+                if kind == "histogram":
+                    lines.extend(self._histogram_lines(name, labels, value))
+                else:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def _histogram_lines(self, name, labels, counts):
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            yield f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}"
+        yield f"{name}_sum{_format_labels(labels)} {_format_value(counts[-1])}"
+        yield f"{name}_count{_format_labels(labels)} {cumulative}"
+
+
+class _Timer:
+    __slots__ = ("registry", "name", "labels", "started")
+
+    def __init__(self, registry, name, labels):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.observe(self.name, self.labels, time.perf_counter() - self.started)
+        return False
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
+
+
+REGISTRY = MetricsRegistry()
+REGISTRY.describe("http_requests_total", "counter", "Число обработанных запросов по маршруту, методу и статусу")
+REGISTRY.describe("http_requests_in_flight", "gauge", "Запросы, которые обрабатываются сейчас")
+REGISTRY.describe("http_request_duration_seconds", "histogram", "Время обработки запроса по маршруту")
+REGISTRY.describe("db_method_duration_seconds", "histogram",
+                  "Время работы метода DatabaseController с соединением из пула")
+REGISTRY.describe("db_method_errors_total", "counter", "Исключения в методах DatabaseController")
+REGISTRY.describe("db_slow_queries_total", "counter", "Запросы дольше NOTES_DB_SLOW_QUERY_MS по методам")
+REGISTRY.describe("db_pool_connections", "gauge", "Соединения пулов чтения и записи по состоянию (с меткой shard - пулы шардов)")
+REGISTRY.describe("user_cache_entries", "gauge", "Записей в кэше пользователей")
+
+
+class MetricsMiddleware:
+    """
+    ASGI-middleware: счётчик и гистограмма времени по шаблону маршрута (/get_note/{note_id}),
+    а не по фактическому пути, чтобы число рядов не зависело от id.
+    Время считается до отправки последней части тела, поэтому включает потоковые ответы.
+    """
+
+    def __init__(self, app, registry=REGISTRY):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        registry = self.registry
+        method = scope["method"]
+        in_flight = (("method", method),)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        registry.inc("http_requests_in_flight", in_flight)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            registry.dec("http_requests_in_flight", in_flight)
+            route = scope.get("route")
+            # маршрут ставит роутер Starlette; без него (404) путь в метку не попадает
+            path = getattr(route, "path", None) or "unmatched"
+            registry.inc("http_requests_total", (("method", method), ("route", path), ("status", str(status))))
+            registry.observe("http_request_duration_seconds", (("method", method), ("route", path)),
+                             time.perf_counter() - started)
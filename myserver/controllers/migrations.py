@@ -0,0 +1,303 @@
+"""
+Версионные миграции схемы БД.
+
+Номер применённой миграции хранится в PRAGMA user_version. При запуске
+применяются только миграции с номером больше текущего, все вместе в одной
+транзакции; если схема уже актуальна, migrate() ничего не делает.
+Каждая миграция идемпотентна: базы, созданные до появления миграций
+(user_version = 0), приводятся к той же схеме, что и новые.
+Новые миграции добавляются только в конец списка MIGRATIONS.
+"""
+import logging
+
+from controllers.search import parse_tags
+
+logger = logging.getLogger(__name__)
+
+
+class MigrationError(Exception):
+    """Схему БД не удалось привести к текущей версии."""
+
+
+NOTES_FTS_TRIGGERS = (
+    """
+    CREATE TRIGGER IF NOT EXISTS notes_fts_ai AFTER INSERT ON notes BEGIN
+        INSERT INTO notes_fts(rowid, title, content, tags)
+        VALUES (new.id, new.title, new.content, new.tags);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS notes_fts_ad AFTER DELETE ON notes BEGIN
+        INSERT INTO notes_fts(notes_fts, rowid, title, content, tags)
+        VALUES ('delete', old.id, old.title, old.content, old.tags);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS notes_fts_au AFTER UPDATE OF title, content, tags ON notes BEGIN
+        INSERT INTO notes_fts(notes_fts, rowid, title, content, tags)
+        VALUES ('delete', old.id, old.title, old.content, old.tags);
+        INSERT INTO notes_fts(rowid, title, content, tags)
+        VALUES (new.id, new.title, new.content, new.tags);
+    END
+    """,
+)
+
+NOTES_INDEXES = (
+    # выборки заметок пользователя и keyset-пагинация по (date_modified, id)
+    "CREATE INDEX IF NOT EXISTS idx_notes_user_modified ON notes(user_id, date_modified, id)",
+    # общий список заметок в админке
+    "CREATE INDEX IF NOT EXISTS idx_notes_modified ON notes(date_modified, id)",
+)
+
+NOTES_COUNT_TRIGGERS = (
+    # users.notes_count - число заметок пользователя, хранится вместо COUNT(*) по notes
+    """
+    CREATE TRIGGER IF NOT EXISTS notes_count_ai AFTER INSERT ON notes BEGIN
+        UPDATE users SET notes_count = notes_count + 1 WHERE id = new.user_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS notes_count_ad AFTER DELETE ON notes BEGIN
+        UPDATE users SET notes_count = notes_count - 1 WHERE id = old.user_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS notes_count_au AFTER UPDATE OF user_id ON notes
+    WHEN old.user_id IS NOT new.user_id BEGIN
+        UPDATE users SET notes_count = notes_count - 1 WHERE id = old.user_id;
+        UPDATE users SET notes_count = notes_count + 1 WHERE id = new.user_id;
+    END
+    """,
+)
+
+
+def fill_note_counts(cur):
+    """Пересчитывает users.notes_count по таблице notes."""
+    cur.execute("""
+        UPDATE users SET notes_count = (SELECT COUNT(*) FROM notes WHERE notes.user_id = users.id)
+    """)
+
+
+def fill_tag_index(cur):
+    """Заполняет note_tags заново по колонке notes.tags."""
+    cur.execute("DELETE FROM note_tags")
+    rows = cur.execute("SELECT id, user_id, tags FROM notes WHERE tags IS NOT NULL AND tags != ''").fetchall()
+    cur.executemany(
+        "INSERT INTO note_tags (note_id, user_id, tag) VALUES (?, ?, ?)",
+        [(note_id, user_id, tag) for note_id, user_id, tags in rows for tag in parse_tags(tags)]
+    )
+
+
+def _create_base_tables(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL,
+            email TEXT NOT NULL UNIQUE,
+            password TEXT NOT NULL,
+            is_admin BOOLEAN NOT NULL
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS notes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            content TEXT,
+            user_id INTEGER NOT NULL,
+            date_created TEXT DEFAULT CURRENT_TIMESTAMP,
+            date_modified TEXT DEFAULT CURRENT_TIMESTAMP,
+            tags TEXT
+        )
+    """)
+
+
+def _create_search_index(cur):
+    """
+    Полнотекстовый индекс FTS5 по title/content/tags.
+    Индекс хранит только токены (content='notes'), сами тексты читаются из notes;
+    триггеры держат его в актуальном состоянии при любых изменениях заметок.
+    """
+    cur.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+            title, content, tags,
+            content='notes', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+    """)
+    for sql in NOTES_FTS_TRIGGERS:
+        cur.execute(sql)
+    cur.execute("INSERT INTO notes_fts(notes_fts) VALUES('rebuild')")
+
+
+def _create_tag_index(cur):
+    """
+    Нормализованная таблица тегов: одна строка на пару (заметка, тег).
+    user_id продублирован, чтобы фильтры и подсчёт тегов пользователя
+    читались только из индекса (user_id, tag, note_id).
+    """
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS note_tags (
+            note_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            tag TEXT NOT NULL,
+            PRIMARY KEY (note_id, tag)
+        ) WITHOUT ROWID
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_note_tags_user_tag ON note_tags(user_id, tag, note_id)")
+    fill_tag_index(cur)
+
+
+def _create_notes_indexes(cur):
+    for sql in NOTES_INDEXES:
+        cur.execute(sql)
+
+
+def _add_foreign_keys(cur):
+    """
+    Пересоздаёт notes и note_tags с внешними ключами ON DELETE CASCADE:
+    удаление пользователя удаляет его заметки, удаление заметки - её теги.
+    SQLite не умеет добавлять ограничения в существующую таблицу,
+    поэтому таблицы копируются в новые и подменяются. Заметки удалённых
+    пользователей, оставшиеся от прежней логики удаления, внешний ключ не допускает:
+    они переносятся в таблицу orphaned_notes, откуда их можно вернуть, назначив владельца.
+    """
+    seq = cur.execute("SELECT seq FROM sqlite_sequence WHERE name='notes'").fetchone()
+    orphans, orphan_users = cur.execute("""
+        SELECT COUNT(*), COUNT(DISTINCT user_id) FROM notes
+        WHERE user_id IS NULL OR user_id NOT IN (SELECT id FROM users)
+    """).fetchone()
+    if orphans:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS orphaned_notes (
+                id INTEGER PRIMARY KEY,
+                title TEXT,
+                content TEXT,
+                user_id INTEGER,
+                date_created TEXT,
+                date_modified TEXT,
+                tags TEXT,
+                orphaned_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cur.execute("""
+            INSERT OR IGNORE INTO orphaned_notes (id, title, content, user_id, date_created, date_modified, tags)
+            SELECT id, title, content, user_id, date_created, date_modified, tags
+            FROM notes
+            WHERE user_id IS NULL OR user_id NOT IN (SELECT id FROM users)
+        """)
+        logger.warning("Миграция 5: %d заметок удалённых пользователей (%d) перенесены в таблицу orphaned_notes",
+                       orphans, orphan_users)
+
+    cur.execute("""
+        CREATE TABLE notes_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            content TEXT,
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            date_created TEXT DEFAULT CURRENT_TIMESTAMP,
+            date_modified TEXT DEFAULT CURRENT_TIMESTAMP,
+            tags TEXT
+        )
+    """)
+    cur.execute("""
+        INSERT INTO notes_new (id, title, content, user_id, date_created, date_modified, tags)
+        SELECT id, title, content, user_id, date_created, date_modified, tags
+        FROM notes
+        WHERE user_id IN (SELECT id FROM users)
+    """)
+    cur.execute("DROP TABLE notes")
+    cur.execute("ALTER TABLE notes_new RENAME TO notes")
+    if seq:
+        cur.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name='notes'", (seq[0],))
+    _create_notes_indexes(cur)
+    for sql in NOTES_FTS_TRIGGERS:
+        cur.execute(sql)
+    cur.execute("INSERT INTO notes_fts(notes_fts) VALUES('rebuild')")
+
+    cur.execute("""
+        CREATE TABLE note_tags_new (
+            note_id INTEGER NOT NULL REFERENCES notes(id) ON DELETE CASCADE,
+            user_id INTEGER NOT NULL,
+            tag TEXT NOT NULL,
+            PRIMARY KEY (note_id, tag)
+        ) WITHOUT ROWID
+    """)
+    cur.execute("""
+        INSERT INTO note_tags_new (note_id, user_id, tag)
+        SELECT note_id, user_id, tag FROM note_tags
+        WHERE note_id IN (SELECT id FROM notes)
+    """)
+    cur.execute("DROP TABLE note_tags")
+    cur.execute("ALTER TABLE note_tags_new RENAME TO note_tags")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_note_tags_user_tag ON note_tags(user_id, tag, note_id)")
+
+
+def _add_notes_count(cur):
+    """
+    Счётчик заметок в users.notes_count, который поддерживают триггеры на notes:
+    сводка пользователей читает его вместо агрегата LEFT JOIN notes ... GROUP BY.
+    """
+    columns = [row[1] for row in cur.execute("PRAGMA table_info(users)")]
+    if "notes_count" not in columns:
+        cur.execute("ALTER TABLE users ADD COLUMN notes_count INTEGER NOT NULL DEFAULT 0")
+    for sql in NOTES_COUNT_TRIGGERS:
+        cur.execute(sql)
+    fill_note_counts(cur)
+    # сводка сортируется по имени
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_users_username ON users(username)")
+
+
+# (версия, описание, функция) - строго по возрастанию версии
+MIGRATIONS = [
+    (1, "таблицы users и notes", _create_base_tables),
+    (2, "полнотекстовый индекс notes_fts", _create_search_index),
+    (3, "таблица тегов note_tags", _create_tag_index),
+    (4, "индексы notes по user_id и date_modified", _create_notes_indexes),
+    (5, "внешние ключи notes.user_id и note_tags.note_id с ON DELETE CASCADE", _add_foreign_keys),
+    (6, "счётчик заметок users.notes_count с триггерами", _add_notes_count),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(conn) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn) -> list:
+    """
+    Применяет недостающие миграции к соединению conn.
+    :return: список применённых миграций [(версия, описание), ...]; пустой, если схема актуальна
+    """
+    version = schema_version(conn)
+    if version == LATEST_VERSION:
+        return []
+    if version > LATEST_VERSION:
+        raise MigrationError(f"Версия схемы БД {version} новее, чем знает приложение ({LATEST_VERSION})")
+
+    # пересоздание таблиц требует выключенных внешних ключей; PRAGMA не действует внутри транзакции
+    conn.execute("PRAGMA foreign_keys=OFF")
+    applied = []
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # другой процесс мог обновить схему, пока мы ждали блокировку
+            version = schema_version(conn)
+            cur = conn.cursor()
+            for number, description, apply in MIGRATIONS:
+                if number <= version:
+                    continue
+                apply(cur)
+                cur.execute(f"PRAGMA user_version={number}")
+                applied.append((number, description))
+            violations = cur.execute("PRAGMA foreign_key_check").fetchall()
+            if violations:
+                raise MigrationError(f"Нарушены внешние ключи после миграции: {violations[:5]}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+    finally:
+        conn.execute("PRAGMA foreign_keys=ON")
+    return applied
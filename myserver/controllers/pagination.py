@@ -0,0 +1,98 @@
+import base64
+import binascii
+import json
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+class InvalidCursorError(ValueError):
+    """Курсор страницы повреждён или относится к другому списку."""
+
+
+def encode_cursor(kind: str, *key) -> str:
+    """
+    Упаковывает ключ последней строки страницы в непрозрачную строку.
+    kind отличает курсоры разных списков, чтобы их нельзя было перепутать.
+    """
+    raw = json.dumps([kind, *key], ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, kind: str, size: int) -> list:
+    """Распаковывает курсор, проверяя его тип, длину и типы значений ключа; возвращает ключ."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, binascii.Error, UnicodeError):
+        raise InvalidCursorError("Некорректный курсор")
+    if not isinstance(data, list) or len(data) != size + 1 or data[0] != kind:
+        raise InvalidCursorError("Курсор не подходит для этого списка")
+    key = data[1:]
+    # значения ключа уходят в SQL параметрами: объекты и списки sqlite3 не примет
+    if not all(isinstance(value, (int, float, str)) for value in key):
+        raise InvalidCursorError("Некорректный курсор")
+    return key
+
+
+def split_page(rows, limit, make_cursor):
+    """
+    rows выбраны с LIMIT limit + 1: лишняя строка означает, что есть следующая страница.
+    Возвращает (строки страницы, курсор следующей страницы или None).
+    """
+    if limit is None or len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, make_cursor(rows[-1])
+
+
+class PageStream:
+    """
+    Страница списка, которая читается потоком.
+    batches - генератор пачек строк (выбранных с LIMIT limit + 1); при итерации
+    отдаются пачки, в сумме не больше limit строк. После окончания итерации
+    next_cursor содержит курсор следующей страницы или None.
+    """
+
+    def __init__(self, batches, limit, make_cursor):
+        self._batches = batches
+        self.limit = limit
+        self._make_cursor = make_cursor
+        self.next_cursor = None
+
+    def __iter__(self):
+        emitted = 0
+        last = None
+        try:
+            for batch in self._batches:
+                if self.limit is not None and emitted + len(batch) > self.limit:
+                    batch = batch[:self.limit - emitted]
+                    if batch:
+                        last = batch[-1]
+                        yield batch
+                    # строки сверх limit есть - значит, есть и следующая страница
+                    if last is not None:
+                        self.next_cursor = self._make_cursor(last)
+                    return
+                emitted += len(batch)
+                last = batch[-1]
+                yield batch
+        finally:
+            self._batches.close()
+
+    def items(self) -> list:
+        """Читает страницу целиком."""
+        return [item for batch in self for item in batch]
+
+
+def encode_page_stream(page: PageStream):
+    """
+    Кодирует страницу в JSON {"items": [...], "next_cursor": ...} по частям:
+    начало ответа отдаётся сразу, затем по куску на каждую пачку строк.
+    """
+    yield '{"items":['
+    separator = ""
+    for batch in page:
+        yield separator + ",".join(json.dumps(item, ensure_ascii=False) for item in batch)
+        separator = ","
+    yield '],"next_cursor":' + json.dumps(page.next_cursor) + "}"
@@ -0,0 +1,24 @@
+import re
+
+_SEARCH_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_TAG_SPLIT_RE = re.compile(r"[,;]")
+
+
+def build_fts_query(text: str) -> str:
+    """
+    Превращает пользовательскую строку поиска в безопасный запрос FTS5:
+    каждое слово берётся в кавычки и ищется по префиксу, слова объединяются через AND.
+    "прив мир" -> '"прив"* "мир"*'
+    """
+    tokens = _SEARCH_TOKEN_RE.findall(text or "")
+    return " ".join(f'"{t}"*' for t in tokens)
+
+
+def parse_tags(tags) -> list:
+    """
+    Разбирает строку тегов заметки в список уникальных нормализованных тегов.
+    "Uni, urgent;uni" -> ["uni", "urgent"]
+    """
+    if not tags:
+        return []
+    return sorted({t.strip().lower() for t in _TAG_SPLIT_RE.split(tags) if t.strip()})
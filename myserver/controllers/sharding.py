@@ -0,0 +1,530 @@
+"""
+Шардирование заметок по пользователям (NOTES_DB_SHARDS=N).
+
+Пользователи, вход и админка пользователей остаются в основной базе (каталоге, NOTES_DB_PATH),
+а заметки каждого пользователя целиком лежат в одном из N файлов-шардов рядом с ней:
+database.db -> database.shard0.db ... database.shard{N-1}.db. Шард выбирается хешем user_id,
+поэтому все запросы одного пользователя (список, поиск, теги) идут в один файл, а записи
+разных пользователей - в разные файлы и не ждут общей блокировки записи SQLite.
+
+Каталог хранит ещё две таблицы:
+    note_locations - id заметки -> user_id: выдаёт сквозные id заметок и по id находит шард;
+    shard_config   - число шардов, с которым разложены данные.
+В шарде таблица users содержит только строки-заглушки (id) для внешних ключей и notes_count.
+
+Списки по всем пользователям (admin_list_notes, export_notes, get_users_summary) читаются
+из шардов параллельно и сливаются в общем порядке. Сменить число шардов или перейти
+на шарды с обычной базы - python manage.py rebalance-shards --shards N (при остановленном сервере).
+"""
+import dataclasses
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+from controllers.bulk import BulkImportError
+from controllers.db_controller import DatabaseController
+from controllers.file_lock import file_lock
+from controllers.pagination import PageStream, encode_cursor, split_page
+from controllers.search import parse_tags
+from settings import DatabaseSettings
+
+DIRECTORY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS note_locations (
+    note_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_note_locations_user ON note_locations(user_id);
+CREATE TABLE IF NOT EXISTS shard_config (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+class ShardingError(RuntimeError):
+    """Число шардов в настройках не совпадает с тем, как разложены данные."""
+
+
+def shard_index(user_id: int, shards: int) -> int:
+    """Номер шарда пользователя; хеш стабилен между процессами и запусками (в отличие от hash())."""
+    digest = hashlib.blake2b(str(user_id).encode("ascii"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % shards
+
+
+def shard_path(db_path: str, index: int) -> str:
+    """database.db -> database.shard{index}.db"""
+    root, ext = os.path.splitext(db_path)
+    return f"{root}.shard{index}{ext or '.db'}"
+
+
+def open_shard(settings: DatabaseSettings, db_path: str, index: int) -> DatabaseController:
+    """Обычный DatabaseController на файле шарда: свои пулы, очередь записи и журнал медленных запросов."""
+    log_root, log_ext = os.path.splitext(settings.slow_query_log)
+    return DatabaseController(settings=dataclasses.replace(
+        settings,
+        path=shard_path(db_path, index),
+        shards=0,
+        # пользователи в шарде - заглушки, кэшировать нечего
+        user_cache_size=0,
+        slow_query_log=f"{log_root}.shard{index}{log_ext}",
+    ))
+
+
+def ensure_directory(db: DatabaseController):
+    """Создаёт в основной базе таблицы каталога шардов."""
+    with db.connection("ensure_directory", write=True) as conn:
+        conn.executescript(DIRECTORY_SCHEMA)
+
+
+def stored_shard_count(db: DatabaseController):
+    """Число шардов, с которым разложены данные, или None, если база ещё не шардирована."""
+    with db.connection("stored_shard_count") as conn:
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='shard_config'").fetchone()
+        if not exists:
+            return None
+        row = conn.execute("SELECT value FROM shard_config WHERE key='shards'").fetchone()
+    return row[0] if row else None
+
+
+def store_shard_count(db: DatabaseController, shards: int):
+    with db.connection("store_shard_count", write=True) as conn:
+        conn.execute("INSERT OR REPLACE INTO shard_config (key, value) VALUES ('shards', ?)", (shards,))
+
+
+def link_user(conn, user_id: int):
+    """Строка-заглушка пользователя в шарде: имя и email хранятся в каталоге."""
+    conn.execute("INSERT OR IGNORE INTO users (id, username, email, password, is_admin) VALUES (?, '', ?, '', 0)",
+                 (user_id, f"#{user_id}"))
+
+
+def _recent_key(item):
+    return item["date_modified"] or "", item["id"]
+
+
+def _items(batches):
+    for batch in batches:
+        yield from batch
+
+
+def _rebatch(items, batch_size):
+    while True:
+        batch = list(itertools.islice(items, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def _note_counts(shard: DatabaseController):
+    with shard.connection("get_users_summary") as conn:
+        return conn.execute("SELECT id, notes_count FROM users WHERE notes_count > 0").fetchall()
+
+
+class ShardedDatabaseController(DatabaseController):
+    """
+    DatabaseController, у которого заметки разложены по шардам (см. описание модуля).
+    Методы пользователей наследуются без изменений и работают с каталогом.
+    """
+
+    def __init__(self, db_path=None, settings: DatabaseSettings = None):
+        super().__init__(db_path, settings)
+        count = self.settings.shards
+        try:
+            with file_lock(self.db_path + ".lock"):
+                ensure_directory(self)
+                stored = stored_shard_count(self)
+                if stored is None:
+                    with self.connection("open_database") as conn:
+                        has_notes = conn.execute("SELECT 1 FROM notes LIMIT 1").fetchone() is not None
+                    if has_notes:
+                        raise ShardingError(
+                            f"В {self.db_path} есть заметки без шардов. "
+                            f"Разложите их: python manage.py rebalance-shards --shards {count}")
+                    store_shard_count(self, count)
+                elif stored != count:
+                    raise ShardingError(
+                        f"Данные разложены по {stored} шардам, а NOTES_DB_SHARDS={count}. "
+                        f"Переразложите их: python manage.py rebalance-shards --shards {count}")
+        except Exception:
+            DatabaseController.close(self)
+            raise
+        self.shards = [open_shard(self.settings, self.db_path, index) for index in range(count)]
+        self.executor = ThreadPoolExecutor(max_workers=count, thread_name_prefix="db-shard")
+
+    def close(self):
+        self.executor.shutdown()
+        for shard in self.shards:
+            shard.close()
+        super().close()
+
+    def shard_for(self, user_id: int) -> DatabaseController:
+        return self.shards[shard_index(user_id, len(self.shards))]
+
+    def _fan_out(self, fn):
+        """fn(shard) на всех шардах параллельно; результаты в порядке шардов."""
+        return list(self.executor.map(fn, self.shards))
+
+    def _locate(self, method, note_id):
+        """user_id владельца заметки по каталогу или None."""
+        with self.connection(method) as conn:
+            row = conn.execute("SELECT user_id FROM note_locations WHERE note_id=?", (note_id,)).fetchone()
+        return row[0] if row else None
+
+    def _unlink_note(self, method, note_id):
+        self._write(method, lambda conn: conn.execute("DELETE FROM note_locations WHERE note_id=?", (note_id,)))
+
+    def _unlink_user(self, method, user_id):
+        """Удаляет заметки пользователя из его шарда (каскадом от строки-заглушки) и из каталога."""
+        self.shard_for(user_id)._write(method, lambda conn: conn.execute("DELETE FROM users WHERE id=?", (user_id,)))
+        self._write(method, lambda conn: conn.execute("DELETE FROM note_locations WHERE user_id=?", (user_id,)))
+
+    def _fill_usernames(self, method, items):
+        user_ids = json.dumps(sorted({item["user_id"] for item in items}))
+        with self.connection(method) as conn:
+            names = dict(conn.execute(
+                "SELECT id, username FROM users WHERE id IN (SELECT value FROM json_each(?))", (user_ids,)))
+        for item in items:
+            item["username"] = names.get(item["user_id"])
+        return items
+
+    # --- пользователи: данные в каталоге, заметки в шарде ---
+
+    def delete_user_cascade(self, user_id: int):
+        self._unlink_user("delete_user_cascade", user_id)
+        super().delete_user_cascade(user_id)
+
+    def admin_delete_user(self, user_id: int):
+        self._unlink_user("admin_delete_user", user_id)
+        super().admin_delete_user(user_id)
+
+    def get_users_summary(self):
+        users = super().get_users_summary()
+        counts = dict(row for rows in self._fan_out(_note_counts) for row in rows)
+        for user in users:
+            user["notes_count"] = counts.get(user["id"], 0)
+        return users
+
+    # --- заметки одного пользователя: запрос целиком уходит в его шард ---
+
+    def insert_note(self, note):
+        if self.get_user_by_id(note.user_id) is None:
+            # то же, что дал бы внешний ключ notes.user_id в обычной базе
+            raise sqlite3.IntegrityError("FOREIGN KEY constraint failed")
+        note_id = self._write("insert_note", lambda conn: conn.execute(
+            "INSERT INTO note_locations (user_id) VALUES (?)", (note.user_id,)).lastrowid)
+
+        def write(conn):
+            link_user(conn, note.user_id)
+            cur = conn.cursor()
+            cur.execute("INSERT INTO notes (id, title, content, user_id, tags) VALUES (?, ?, ?, ?, ?)",
+                        (note_id, note.title, note.content, note.user_id, note.tags))
+            self._sync_note_tags(cur, note_id, note.tags)
+        try:
+            self.shard_for(note.user_id)._write("insert_note", write)
+        except Exception:
+            self._unlink_note("insert_note", note_id)
+            raise
+        print("✔ Заметка добавлена")
+
+    def read_notes_by_user(self, user_id, limit=None, cursor=None):
+        return self.shard_for(user_id).read_notes_by_user(user_id, limit, cursor)
+
+    def read_notes_by_user_json(self, user_id, limit=None, cursor=None):
+        return self.shard_for(user_id).read_notes_by_user_json(user_id, limit, cursor)
+
+    def search_notes(self, user_id, query="", tag="", tag_mode="all", limit=None, cursor=None):
+        return self.shard_for(user_id).search_notes(user_id, query, tag, tag_mode, limit, cursor)
+
+    def search_notes_json(self, user_id, query="", tag="", tag_mode="all", limit=None, cursor=None):
+        return self.shard_for(user_id).search_notes_json(user_id, query, tag, tag_mode, limit, cursor)
+
+    def get_tag_counts(self, user_id):
+        return self.shard_for(user_id).get_tag_counts(user_id)
+
+    # --- заметки по id: шард находится по каталогу ---
+
+    def read_note_by_id(self, id):
+        user_id = self._locate("read_note_by_id", id)
+        return None if user_id is None else self.shard_for(user_id).read_note_by_id(id)
+
+    def read_notes_by_ids(self, ids):
+        ids = list(dict.fromkeys(ids))
+        if not ids:
+            return []
+        placeholders = ",".join("?" * len(ids))
+        with self.connection("read_notes_by_ids") as conn:
+            locations = conn.execute(
+                f"SELECT note_id, user_id FROM note_locations WHERE note_id IN ({placeholders})", ids).fetchall()
+        groups = {}
+        for note_id, user_id in locations:
+            groups.setdefault(shard_index(user_id, len(self.shards)), []).append(note_id)
+        results = self.executor.map(lambda group: self.shards[group[0]].read_notes_by_ids(group[1]),
+                                    groups.items())
+        by_id = {row[0]: row for rows in results for row in rows}
+        return [by_id[note_id] for note_id in ids if note_id in by_id]
+
+    def update_note(self, id, title, new_content, tags):
+        user_id = self._locate("update_note", id)
+        if user_id is not None:
+            self.shard_for(user_id).update_note(id, title, new_content, tags)
+        return 1
+
+    def delete_note(self, id):
+        user_id = self._locate("delete_note", id)
+        if user_id is not None:
+            self.shard_for(user_id).delete_note(id)
+            self._unlink_note("delete_note", id)
+        return 1
+
+    def admin_update_note(self, note_id: int, title: str, content: str, tags: str):
+        user_id = self._locate("admin_update_note", note_id)
+        if user_id is not None:
+            self.shard_for(user_id).admin_update_note(note_id, title, content, tags)
+
+    def admin_delete_note(self, note_id: int):
+        user_id = self._locate("admin_delete_note", note_id)
+        if user_id is not None:
+            self.shard_for(user_id).admin_delete_note(note_id)
+            self._unlink_note("admin_delete_note", note_id)
+
+    # --- все заметки: параллельное чтение шардов и слияние ---
+
+    def admin_list_notes(self, limit=None, cursor=None):
+        # каждый шард отдаёт не больше limit + 1 строк - этого хватает и для страницы, и для признака продолжения
+        inner = None if limit is None else limit + 1
+        pages = self._fan_out(lambda shard: shard.admin_list_notes(inner, cursor)[0])
+        items = list(heapq.merge(*pages, key=_recent_key, reverse=True))
+        items, next_cursor = split_page(items, limit,
+                                        lambda item: encode_cursor("recent", item["date_modified"], item["id"]))
+        return self._fill_usernames("admin_list_notes", items), next_cursor
+
+    def stream_admin_notes(self, limit=None, cursor=None, batch_size=500):
+        inner = None if limit is None else limit + 1
+        streams = [shard.stream_admin_notes(inner, cursor, batch_size) for shard in self.shards]
+        return PageStream(self._merged_admin_batches(streams, batch_size), limit,
+                          lambda item: encode_cursor("recent", item["date_modified"], item["id"]))
+
+    def _merged_admin_batches(self, streams, batch_size):
+        iterators = [iter(stream) for stream in streams]
+        try:
+            merged = heapq.merge(*(_items(it) for it in iterators), key=_recent_key, reverse=True)
+            for batch in _rebatch(merged, batch_size):
+                yield self._fill_usernames("stream_admin_notes", batch)
+        finally:
+            for it in iterators:
+                it.close()
+
+    def admin_list_notes_json(self, limit=None, cursor=None):
+        # страницы шардов сливаются в Python, поэтому JSON собирается здесь, а не в SQLite
+        items, next_cursor = self.admin_list_notes(limit, cursor)
+        return json.dumps(items, ensure_ascii=False, separators=(",", ":")), next_cursor
+
+    def export_notes(self, after_id=0, user_id=None, batch_size=1000):
+        if user_id is not None:
+            yield from self.shard_for(user_id).export_notes(after_id, user_id, batch_size)
+            return
+        generators = [shard.export_notes(after_id, None, batch_size) for shard in self.shards]
+        try:
+            merged = heapq.merge(*(_items(g) for g in generators), key=lambda row: row[0])
+            yield from _rebatch(merged, batch_size)
+        finally:
+            for g in generators:
+                g.close()
+
+    def import_notes_batch(self, batch):
+        """
+        Как DatabaseController.import_notes_batch: id выдаёт каталог, затем пачка делится по шардам,
+        и каждая часть вставляется одной транзакцией своего шарда (шарды - параллельно).
+        """
+        if not batch:
+            return 0
+        records = [record for _, record in batch]
+        with self.connection("import_notes_batch") as conn:
+            user_ids = json.dumps(sorted({r[2] for r in records}))
+            known = {row[0] for row in conn.execute(
+                "SELECT id FROM users WHERE id IN (SELECT value FROM json_each(?))", (user_ids,))}
+        for line_no, record in batch:
+            if record[2] not in known:
+                raise BulkImportError(line_no, f"пользователь {record[2]} не найден")
+
+        def allocate(conn):
+            return [conn.execute("INSERT INTO note_locations (user_id) VALUES (?)", (r[2],)).lastrowid
+                    for r in records]
+        note_ids = self._write("import_notes_batch", allocate)
+        groups = {}
+        for note_id, record in zip(note_ids, records):
+            groups.setdefault(shard_index(record[2], len(self.shards)), []).append((note_id, *record))
+        errors = list(self.executor.map(lambda group: self._import_into_shard(self.shards[group[0]], group[1]),
+                                        groups.items()))
+        failed = [error for error in errors if error is not None]
+        if failed:
+            # пачка - одна транзакция и в режиме шардов: части, уже вставленные в другие шарды,
+            # удаляются, а выданные каталогом id освобождаются, чтобы повтор с той же контрольной
+            # точки не дал дублей, а каталог не указывал на несуществующие заметки
+            for (index, rows), error in zip(groups.items(), errors):
+                if error is None:
+                    ids = json.dumps([row[0] for row in rows])
+                    self.shards[index]._write("import_notes_batch", lambda conn, ids=ids: conn.execute(
+                        "DELETE FROM notes WHERE id IN (SELECT value FROM json_each(?))", (ids,)))
+            ids = json.dumps(note_ids)
+            self._write("import_notes_batch", lambda conn: conn.execute(
+                "DELETE FROM note_locations WHERE note_id IN (SELECT value FROM json_each(?))", (ids,)))
+            raise failed[0]
+        return len(records)
+
+    @staticmethod
+    def _import_into_shard(shard, rows):
+        """
+        rows: [(id, title, content, user_id, tags, date_created, date_modified), ...]
+        Возвращает исключение, если вставка не удалась (None - удалась), чтобы дождаться всех шардов.
+        """
+        def write(conn):
+            for user_id in {row[3] for row in rows}:
+                link_user(conn, user_id)
+            conn.executemany(
+                "INSERT INTO notes (id, title, content, user_id, tags, date_created, date_modified) "
+                "VALUES (?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP), COALESCE(?, CURRENT_TIMESTAMP))",
+                rows
+            )
+            conn.executemany(
+                "INSERT INTO note_tags (note_id, user_id, tag) VALUES (?, ?, ?)",
+                [(row[0], row[3], tag) for row in rows for tag in parse_tags(row[4])]
+            )
+        try:
+            shard._write("import_notes_batch", write)
+        except Exception as error:
+            return error
+        return None
+
+    # --- обслуживание: по каждому шарду ---
+
+    def rebuild_tag_index(self):
+        return sum(shard.rebuild_tag_index() for shard in self.shards)
+
+    def rebuild_search_index(self):
+        return sum(shard.rebuild_search_index() for shard in self.shards)
+
+    def rebuild_note_counts(self):
+        return sum(shard.rebuild_note_counts() for shard in self.shards)
+
+    def check_note_counts(self):
+        return sorted(row for rows in self._fan_out(lambda shard: shard.check_note_counts()) for row in rows)
+
+
+def open_database(db_path=None, settings: DatabaseSettings = None) -> DatabaseController:
+    """
+    DatabaseController по настройкам: с NOTES_DB_SHARDS > 0 - ShardedDatabaseController.
+    Обычный режим на уже шардированной базе не открывается: заметок в ней нет.
+    """
+    settings = settings or DatabaseSettings.from_env()
+    if settings.shards > 0:
+        return ShardedDatabaseController(db_path, settings)
+    db = DatabaseController(db_path, settings)
+    stored = stored_shard_count(db)
+    if stored:
+        db.close()
+        raise ShardingError(f"Заметки {db.db_path} разложены по {stored} шардам: задайте NOTES_DB_SHARDS={stored} "
+                            f"или соберите их обратно: python manage.py rebalance-shards --shards 0")
+    return db
+
+
+def _move_user(source, target, user_id, directory=None):
+    """
+    Переносит заметки пользователя из source в шард target и удаляет их из source.
+    directory передаётся, если source - сам каталог (переход с обычной базы на шарды).
+    """
+    with source.connection("rebalance") as conn:
+        rows = conn.execute(
+            "SELECT id, title, content, user_id, tags, date_created, date_modified FROM notes "
+            "WHERE user_id=? ORDER BY id", (user_id,)).fetchall()
+    with target.connection("rebalance", write=True) as conn:
+        link_user(conn, user_id)
+        cur = conn.cursor()
+        # OR IGNORE: после прерванного переноса часть заметок уже может быть в target
+        cur.executemany("INSERT OR IGNORE INTO notes (id, title, content, user_id, tags, date_created, date_modified) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        for row in rows:
+            DatabaseController._sync_note_tags(cur, row[0], row[4])
+    if directory is not None:
+        with directory.connection("rebalance", write=True) as conn:
+            conn.executemany("INSERT OR IGNORE INTO note_locations (note_id, user_id) VALUES (?, ?)",
+                             [(row[0], user_id) for row in rows])
+            conn.execute("DELETE FROM notes WHERE user_id=?", (user_id,))
+    else:
+        with source.connection("rebalance", write=True) as conn:
+            conn.execute("DELETE FROM users WHERE id=?", (user_id,))
+    return len(rows)
+
+
+def _move_back(shard, directory, user_id):
+    """Возвращает заметки пользователя из шарда в каталог (rebalance-shards --shards 0)."""
+    with shard.connection("rebalance") as conn:
+        rows = conn.execute(
+            "SELECT id, title, content, user_id, tags, date_created, date_modified FROM notes "
+            "WHERE user_id=? ORDER BY id", (user_id,)).fetchall()
+    with directory.connection("rebalance", write=True) as conn:
+        cur = conn.cursor()
+        cur.executemany("INSERT OR IGNORE INTO notes (id, title, content, user_id, tags, date_created, date_modified) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        for row in rows:
+            DatabaseController._sync_note_tags(cur, row[0], row[4])
+        cur.execute("DELETE FROM note_locations WHERE user_id=?", (user_id,))
+    with shard.connection("rebalance", write=True) as conn:
+        conn.execute("DELETE FROM users WHERE id=?", (user_id,))
+    return len(rows)
+
+
+def rebalance(db_path=None, shards=0, settings: DatabaseSettings = None):
+    """
+    Раскладывает заметки по shards шардам: с обычной базы, с другого числа шардов
+    или обратно в одну базу (shards=0). Переносятся только пользователи, чей шард изменился;
+    каждый пользователь - отдельными транзакциями, так что прерванный запуск можно повторить.
+    Сервер на время переноса должен быть остановлен.
+    :return: (перенесено пользователей, перенесено заметок)
+    """
+    if shards < 0:
+        raise ValueError("число шардов не может быть отрицательным")
+    settings = dataclasses.replace(settings or DatabaseSettings.from_env(), shards=0, write_queue=False)
+    directory = DatabaseController(db_path, settings)
+    opened = []
+    try:
+        ensure_directory(directory)
+        stored = stored_shard_count(directory) or 0
+        opened = [open_shard(settings, directory.db_path, index) for index in range(max(shards, stored))]
+        moved_users = moved_notes = 0
+        if stored == 0:
+            with directory.connection("rebalance") as conn:
+                user_ids = [row[0] for row in conn.execute("SELECT DISTINCT user_id FROM notes ORDER BY user_id")]
+            if shards > 0:
+                for user_id in user_ids:
+                    moved_notes += _move_user(directory, opened[shard_index(user_id, shards)], user_id, directory)
+                    moved_users += 1
+        else:
+            for index, source in enumerate(opened[:stored]):
+                with source.connection("rebalance") as conn:
+                    user_ids = [row[0] for row in conn.execute("SELECT id FROM users ORDER BY id")]
+                for user_id in user_ids:
+                    if shards == 0:
+                        moved_notes += _move_back(source, directory, user_id)
+                    elif shard_index(user_id, shards) != index:
+                        moved_notes += _move_user(source, opened[shard_index(user_id, shards)], user_id)
+                    else:
+                        continue
+                    moved_users += 1
+        if shards > 0:
+            store_shard_count(directory, shards)
+        else:
+            with directory.connection("rebalance", write=True) as conn:
+                conn.execute("DELETE FROM shard_config WHERE key='shards'")
+        print(f"✔ Шардов: {shards}; перенесено пользователей: {moved_users}, заметок: {moved_notes}")
+        for shard in opened[shards:]:
+            print(f"⚠ {shard.db_path} больше не используется и пуст - файл можно удалить")
+        return moved_users, moved_notes
+    finally:
+        for shard in opened:
+            shard.close()
+        directory.close()
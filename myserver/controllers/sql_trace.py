@@ -0,0 +1,265 @@
+"""
+Журнал медленных SQL-запросов (включается NOTES_DB_SLOW_QUERY_MS > 0).
+
+В модуле sqlite3 нет profile-callback со временем выполнения, поэтому соединения создаются
+с фабрикой TracingConnection, а курсор TracingCursor замеряет время execute и всех fetch
+(SELECT выполняется по мере чтения строк). Callback-и SQLite дают остальное:
+  - trace callback - сколько вложенных операторов (триггеры, служебные запросы FTS5) выполнил запрос;
+  - progress handler - примерное число шагов виртуальной машины SQLite, т.е. объём работы.
+
+Запрос дольше порога пишется одной JSON-строкой в ротируемый файл: метод DatabaseController,
+время, число строк, SQL и параметры, в которых строки и байты заменены на тип и длину.
+В режиме разработки (NOTES_DB_DEV_MODE) к записи добавляется EXPLAIN QUERY PLAN.
+"""
+import json
+import logging
+import sqlite3
+import time
+from logging.handlers import RotatingFileHandler
+
+from controllers.metrics import REGISTRY
+
+# через сколько инструкций VM SQLite вызывается progress handler
+PROGRESS_STEP = 1000
+
+_EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "REPLACE")
+
+
+def redact(value):
+    """Параметры запроса без содержимого: строки и байты заменяются на '<str:длина>'."""
+    if isinstance(value, (list, tuple)):
+        return [redact(v) for v in value]
+    if isinstance(value, dict):
+        return {k: redact(v) for k, v in value.items()}
+    if isinstance(value, str):
+        return f"<str:{len(value)}>"
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return f"<bytes:{len(value)}>"
+    return value
+
+
+class SlowQueryLog:
+    """JSON-строки в файле с ротацией по размеру (path, path.1, ... path.N)."""
+
+    def __init__(self, path, max_bytes=10 * 1024 * 1024, backups=5):
+        self.path = path
+        self._handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+        self._handler.setFormatter(logging.Formatter("%(message)s"))
+        # отдельный логгер вне logging.getLogger, чтобы не делить обработчики между контроллерами
+        self._logger = logging.Logger("notes.slow_queries", logging.INFO)
+        self._logger.addHandler(self._handler)
+
+    def write(self, entry):
+        self._logger.info(json.dumps(entry, ensure_ascii=False, default=str))
+
+    def close(self):
+        self._handler.close()
+
+
+class _Statement:
+    __slots__ = ("sql", "params", "many", "seconds", "rows", "steps", "nested", "error", "context")
+
+    def __init__(self, sql, params, many=False):
+        self.context = None
+        self.sql = sql
+        self.params = params
+        self.many = many
+        self.seconds = 0.0
+        self.rows = 0
+        self.steps = 0
+        self.nested = -1  # trace callback вызывается и для самого запроса
+        self.error = None
+
+
+class TracingCursor(sqlite3.Cursor):
+    """Курсор, который считает время и строки текущего запроса и сообщает о нём соединению."""
+
+    def __init__(self, connection):
+        super().__init__(connection)
+        self._statement = None
+
+    def _run(self, statement, call, *args):
+        self._finish()
+        conn = self.connection
+        # метод, выполнивший запрос: завершиться запрос может позже, при commit
+        statement.context = conn.context
+        conn._current = statement
+        started = time.perf_counter()
+        try:
+            return call(*args)
+        except sqlite3.Error as e:
+            statement.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            statement.seconds += time.perf_counter() - started
+            conn._current = None
+            if self.rowcount > 0:
+                statement.rows = self.rowcount  # INSERT/UPDATE/DELETE
+            self._statement = statement
+            conn._pending.add(statement)
+            if statement.error:
+                self._finish()
+
+    def execute(self, sql, parameters=()):
+        self._run(_Statement(sql, parameters), super().execute, sql, parameters)
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        seq_of_parameters = list(seq_of_parameters)
+        self._run(_Statement(sql, seq_of_parameters, many=True), super().executemany, sql, seq_of_parameters)
+        return self
+
+    def _fetch(self, call, *args):
+        statement = self._statement
+        if statement is None:
+            return call(*args)
+        conn = self.connection
+        conn._current = statement
+        started = time.perf_counter()
+        try:
+            return call(*args)
+        finally:
+            statement.seconds += time.perf_counter() - started
+            conn._current = None
+
+    def fetchone(self):
+        row = self._fetch(super().fetchone)
+        self._count(0 if row is None else 1, row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        rows = self._fetch(super().fetchmany, size)
+        self._count(len(rows), len(rows) < size)
+        return rows
+
+    def fetchall(self):
+        rows = self._fetch(super().fetchall)
+        self._count(len(rows), True)
+        return rows
+
+    def __next__(self):
+        try:
+            row = self._fetch(super().__next__)
+        except StopIteration:
+            self._count(0, True)
+            raise
+        self._count(1, False)
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def _count(self, rows, done):
+        if self._statement is not None:
+            self._statement.rows += rows
+            if done:
+                self._finish()
+
+    def _finish(self):
+        statement = self._statement
+        if statement is None:
+            return
+        self._statement = None
+        self.connection._finish_statement(statement)
+
+
+class TracingConnection(sqlite3.Connection):
+    """
+    Соединение, чьи запросы проверяются на порог slow_log_threshold.
+    Запрос считается завершённым, когда прочитаны все строки, курсор выполнил следующий запрос
+    или закрыт, либо при commit/rollback (DatabaseController.connection вызывает их всегда).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.slow_log = None
+        self.slow_log_threshold = 0.0
+        self.explain = False
+        self.context = None  # имя метода DatabaseController, который сейчас держит соединение
+        self._current = None
+        # учёт запросов, которые ещё не завершены: временный курсор conn.execute(...).fetchone()
+        # удаляется раньше, чем дочитан, и его запрос завершает commit/rollback, а не финализатор курсора
+        self._pending = set()
+        self.set_trace_callback(self._on_trace)
+        self.set_progress_handler(self._on_progress, PROGRESS_STEP)
+
+    def enable_slow_log(self, slow_log, threshold, explain=False):
+        self.slow_log = slow_log
+        self.slow_log_threshold = threshold
+        self.explain = explain
+
+    def cursor(self, factory=TracingCursor):
+        return super().cursor(factory)
+
+    # Connection.execute в C не вызывает Cursor.execute, поэтому переопределяются и они
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        self.flush()
+        super().commit()
+
+    def rollback(self):
+        self.flush()
+        super().rollback()
+
+    def flush(self):
+        """Завершает учёт запросов, строки которых так и не дочитали."""
+        for statement in list(self._pending):
+            self._finish_statement(statement)
+
+    def _finish_statement(self, statement):
+        # запрос завершается один раз: курсором (дочитан, закрыт, следующий execute) или flush()
+        if statement in self._pending:
+            self._pending.discard(statement)
+            self._statement_done(statement)
+
+    def _on_trace(self, sql):
+        # неявный BEGIN модуля sqlite3 тоже проходит через trace, но вложенным запросом не является
+        if self._current is not None and not sql.startswith("BEGIN"):
+            self._current.nested += 1
+
+    def _on_progress(self):
+        if self._current is not None:
+            self._current.steps += PROGRESS_STEP
+        return 0
+
+    def _statement_done(self, statement):
+        if self.slow_log is None or statement.seconds < self.slow_log_threshold:
+            return
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "method": statement.context,
+            "duration_ms": round(statement.seconds * 1000, 3),
+            "rows": statement.rows,
+            "sql": " ".join(statement.sql.split()),
+            "params": redact(statement.params[:20] if statement.many else statement.params),
+            "vm_steps": statement.steps,
+            "nested_statements": max(statement.nested, 0),
+        }
+        if statement.many:
+            entry["batch_size"] = len(statement.params)
+        if statement.error:
+            entry["error"] = statement.error
+        if self.explain and not statement.many:
+            plan = self._explain(statement)
+            if plan is not None:
+                entry["plan"] = plan
+        REGISTRY.inc("db_slow_queries_total", (("method", statement.context or "unknown"),))
+        self.slow_log.write(entry)
+
+    def _explain(self, statement):
+        head = statement.sql.lstrip().split(None, 1)[0].upper() if statement.sql.strip() else ""
+        if head not in _EXPLAINABLE:
+            return None
+        try:
+            # обычный курсор, чтобы EXPLAIN сам не попал в учёт
+            rows = sqlite3.Cursor(self).execute("EXPLAIN QUERY PLAN " + statement.sql, statement.params).fetchall()
+        except sqlite3.Error:
+            return None
+        return [row[3] for row in rows]
@@ -0,0 +1,76 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class UserCache:
+    """
+    Кэш записей пользователей по id в памяти процесса: не больше max_size записей (LRU),
+    каждая живёт не дольше ttl секунд.
+    Изменяющие пользователя методы DatabaseController вызывают invalidate() после фиксации транзакции.
+    Чтобы чтение, начатое до изменения, не вернуло в кэш старую запись, put() принимает
+    номер поколения, полученный до чтения из БД, и ничего не сохраняет, если с тех пор была инвалидация.
+    """
+
+    def __init__(self, max_size=1024, ttl=30.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # user_id -> (срок годности, запись)
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.max_size > 0 and self.ttl > 0
+
+    def get(self, user_id):
+        """Запись из кэша или None; второе значение - поколение для последующего put()."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(user_id)
+                    self.hits += 1
+                    return entry[1], self._generation
+                del self._entries[user_id]
+            self.misses += 1
+            return None, self._generation
+
+    def put(self, user_id, record, generation):
+        if not self.enabled:
+            return
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[user_id] = (time.monotonic() + self.ttl, record)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._generation += 1
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,150 @@
+"""
+Групповая фиксация записей (group commit).
+
+Методы записи DatabaseController не открывают свою транзакцию, а ставят операцию в очередь.
+Один поток-писатель забирает операции пачками - до max_batch штук или пока не пройдёт
+flush_interval секунд с первой операции пачки - и выполняет всю пачку одной транзакцией.
+Каждая операция идёт в своём SAVEPOINT: ошибка одной (например, нарушение UNIQUE) откатывает
+только её и возвращается её вызывающему, остальные фиксируются. Вызывающий поток ждёт,
+пока пачка с его операцией будет зафиксирована, поэтому ответ клиенту уходит после COMMIT.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from controllers.metrics import REGISTRY
+
+_STOP = object()
+
+
+class WriteQueueFullError(Exception):
+    """Очередь записи заполнена и не освободилась за отведённое время."""
+
+
+class WriteQueue:
+    """
+    Очередь операций записи с одним потоком-писателем.
+    pool - ConnectionPool, из которого писатель берёт соединение на каждую пачку;
+    операция - функция op(conn), её результат возвращает submit().
+    """
+
+    def __init__(self, pool, max_batch=64, flush_interval=0.005, max_depth=10000, put_timeout=5.0):
+        if max_batch < 1:
+            raise ValueError("max_batch должен быть >= 1")
+        self.pool = pool
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_depth = max_depth
+        self.put_timeout = put_timeout
+        self._queue = queue.Queue(maxsize=max_depth)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, op, method=None):
+        """Ставит op(conn) в очередь и ждёт фиксации его пачки; исключение op пробрасывается вызывающему."""
+        if self._closed:
+            raise RuntimeError("Очередь записи закрыта")
+        future = Future()
+        try:
+            self._queue.put((op, method, future), timeout=self.put_timeout)
+        except queue.Full:
+            raise WriteQueueFullError(f"Очередь записи заполнена ({self.max_depth} операций)")
+        return future.result()
+
+    def close(self, timeout=10.0):
+        """Дописывает уже поставленные операции и останавливает писателя."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        return {
+            "depth": self._queue.qsize(),
+            "max_depth": self.max_depth,
+            "max_batch": self.max_batch,
+            "flush_interval": self.flush_interval,
+        }
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            stop = False
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            self._commit(batch)
+            if stop:
+                return
+
+    def _commit(self, batch):
+        started = time.perf_counter()
+        outcomes = []
+        try:
+            with self.pool.connection() as conn:
+                # блокировка записи берётся сразу, а не на первом INSERT пачки
+                conn.execute("BEGIN IMMEDIATE")
+                for op, method, future in batch:
+                    outcomes.append((future, *self._apply(conn, op, method)))
+                conn.commit()
+        except Exception as e:
+            # пачка не зафиксирована (ошибка COMMIT или соединения) - ошибка достаётся всем её операциям
+            for _, _, future in batch:
+                future.set_exception(e)
+            REGISTRY.inc("db_write_batches_total", (("result", "error"),))
+            return
+        finally:
+            REGISTRY.observe("db_write_batch_duration_seconds", (), time.perf_counter() - started)
+        for future, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+        REGISTRY.inc("db_write_batches_total", (("result", "ok"),))
+        REGISTRY.inc("db_write_batch_operations_total", (), len(batch))
+
+    @staticmethod
+    def _apply(conn, op, method):
+        """Выполняет одну операцию в SAVEPOINT: (результат, None) или (None, исключение)."""
+        traced = hasattr(conn, "context")
+        if traced:
+            conn.context = method
+        conn.execute("SAVEPOINT write_op")
+        try:
+            result = op(conn)
+        except Exception as e:
+            conn.execute("ROLLBACK TO write_op")
+            conn.execute("RELEASE write_op")
+            return None, e
+        else:
+            conn.execute("RELEASE write_op")
+            return result, None
+        finally:
+            if traced:
+                conn.context = None
+
+
+REGISTRY.describe("db_write_queue_depth", "gauge", "Операций записи в очереди group commit")
+REGISTRY.describe("db_write_queue_max_depth", "gauge", "Ёмкость очереди записи (NOTES_DB_WRITE_QUEUE_DEPTH)")
+REGISTRY.describe("db_write_batch_max_operations", "gauge",
+                  "Наибольший размер пачки записи (NOTES_DB_WRITE_BATCH_SIZE)")
+REGISTRY.describe("db_write_batch_interval_seconds", "gauge",
+                  "Сколько писатель ждёт пополнения пачки (NOTES_DB_WRITE_BATCH_INTERVAL_MS)")
+REGISTRY.describe("db_write_batches_total", "counter", "Зафиксированные и неудавшиеся пачки записи")
+REGISTRY.describe("db_write_batch_operations_total", "counter",
+                  "Операций в зафиксированных пачках; делённое на число пачек - средний размер пачки")
+REGISTRY.describe("db_write_batch_duration_seconds", "histogram", "Время транзакции одной пачки записи")
@@ -0,0 +1,228 @@
+"""
+Служебные команды backend.
+Запуск из папки myserver:
+    python manage.py migrate
+    python manage.py rebuild-search
+    python manage.py rebuild-tags
+    python manage.py rebuild-counts
+    python manage.py check-counts
+    python manage.py import-notes notes.ndjson
+    python manage.py export-notes notes.ndjson
+    python manage.py rebalance-shards --shards 4
+    python manage.py restore-orphans --user-id 1
+"""
+import argparse
+import json
+import os
+
+from controllers import migrations, sharding
+from controllers.bulk import BulkImportError, NdjsonBatcher, Throughput, encode_ndjson
+from controllers.db_controller import DatabaseController
+
+
+def cmd_migrate(db: DatabaseController, args):
+    # миграции применяются при создании DatabaseController, здесь только показываем итог
+    with db.pool.connection() as conn:
+        version = migrations.schema_version(conn)
+    print(f"✔ Версия схемы: {version} (последняя: {migrations.LATEST_VERSION})")
+
+
+def cmd_rebuild_search(db: DatabaseController, args):
+    db.rebuild_search_index()
+
+
+def cmd_rebuild_tags(db: DatabaseController, args):
+    db.rebuild_tag_index()
+
+
+def cmd_rebuild_counts(db: DatabaseController, args):
+    db.rebuild_note_counts()
+
+
+def cmd_check_counts(db: DatabaseController, args):
+    """Проверка users.notes_count; при расхождениях код возврата 1 (исправить - rebuild-counts)."""
+    mismatches = db.check_note_counts()
+    if not mismatches:
+        print("✔ Счётчики заметок совпадают с таблицей notes")
+        return 0
+    for user_id, stored, actual in mismatches[:20]:
+        print(f"✘ пользователь {user_id}: notes_count={stored}, заметок={actual}")
+    print(f"✘ Расхождений: {len(mismatches)}. Исправить: python manage.py rebuild-counts")
+    return 1
+
+
+def cmd_import_notes(db: DatabaseController, args):
+    """
+    Импорт NDJSON пачками по --batch-size строк, каждая пачка - одна транзакция.
+    После каждой пачки номер обработанной строки пишется в файл контрольной точки;
+    при повторном запуске импорт продолжается с неё. После успешного импорта файл удаляется.
+    """
+    checkpoint_path = args.checkpoint or args.file + ".checkpoint"
+    skip = 0
+    if os.path.exists(checkpoint_path):
+        with open(checkpoint_path) as f:
+            skip = int(f.read().strip() or 0)
+        print(f"↻ Продолжаем импорт с контрольной точки: пропускаем {skip} строк")
+
+    batcher = NdjsonBatcher(args.batch_size, skip)
+    stats = Throughput()
+
+    def save(batch):
+        stats.add(db.import_notes_batch(batch))
+        with open(checkpoint_path, "w") as f:
+            f.write(str(batch[-1][0]))
+        print(f"  {stats.rows} заметок, {stats.rows_per_second} строк/с")
+
+    try:
+        with open(args.file, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                for batch in batcher.feed(chunk):
+                    save(batch)
+        batch = batcher.finish()
+        if batch:
+            save(batch)
+    except BulkImportError as e:
+        print(f"✘ {e}. Исправьте строку и запустите команду снова - импорт продолжится с контрольной точки")
+        return 1
+
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    print(f"✔ Импортировано {stats.rows} заметок за {stats.seconds:.1f} с ({stats.rows_per_second} строк/с)")
+    return 0
+
+
+def _last_exported_id(path):
+    """id из последней непустой строки уже выгруженного файла (файл читается с конца)."""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        tail = b""
+        while end > 0:
+            start = max(0, end - (1 << 16))
+            f.seek(start)
+            tail = f.read(end - start) + tail
+            end = start
+            lines = tail.rstrip(b"\n").split(b"\n")
+            if len(lines) > 1 or end == 0:
+                last = lines[-1].strip()
+                return json.loads(last)["id"] if last else 0
+    return 0
+
+
+def cmd_export_notes(db: DatabaseController, args):
+    """
+    Потоковая выгрузка заметок в NDJSON. С --resume дописывает в существующий файл,
+    продолжая после id последней выгруженной заметки.
+    """
+    after_id = args.after_id
+    mode = "w"
+    if args.resume and os.path.exists(args.file):
+        after_id = max(after_id, _last_exported_id(args.file))
+        mode = "a"
+        print(f"↻ Продолжаем выгрузку после id={after_id}")
+
+    stats = Throughput()
+    with open(args.file, mode, encoding="utf-8") as f:
+        for rows in db.export_notes(after_id, args.user_id, args.batch_size):
+            f.write(encode_ndjson(rows))
+            stats.add(len(rows))
+            if stats.rows % (args.batch_size * 50) < len(rows):
+                print(f"  {stats.rows} заметок, {stats.rows_per_second} строк/с")
+    print(f"✔ Выгружено {stats.rows} заметок за {stats.seconds:.1f} с ({stats.rows_per_second} строк/с)")
+    return 0
+
+
+def cmd_restore_orphans(db: DatabaseController, args):
+    """
+    Возвращает в notes заметки из orphaned_notes (их отложила миграция 5: владельца уже не было),
+    назначая им владельцем --user-id.
+    """
+    if getattr(db, "shards", None):
+        print("✘ В режиме шардов заметки хранятся в шардах: верните их до перехода (rebalance-shards --shards 0)")
+        return 1
+    with db.connection("restore_orphaned_notes", write=True) as conn:
+        cur = conn.cursor()
+        if not cur.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='orphaned_notes'").fetchone():
+            print("✔ Отложенных заметок нет")
+            return 0
+        if not cur.execute("SELECT 1 FROM users WHERE id=?", (args.user_id,)).fetchone():
+            print(f"✘ Пользователь {args.user_id} не найден")
+            return 1
+        rows = cur.execute(
+            "SELECT id, title, content, date_created, date_modified, tags FROM orphaned_notes ORDER BY id").fetchall()
+        cur.executemany(
+            "INSERT INTO notes (id, title, content, user_id, date_created, date_modified, tags) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(r[0], r[1] or "", r[2], args.user_id, r[3], r[4], r[5]) for r in rows]
+        )
+        for r in rows:
+            DatabaseController._sync_note_tags(cur, r[0], r[5])
+        cur.execute("DELETE FROM orphaned_notes")
+    print(f"✔ Возвращено {len(rows)} заметок пользователю {args.user_id}")
+    return 0
+
+
+def cmd_rebalance_shards(args):
+    """
+    Раскладывает заметки по --shards шардам (0 - собирает обратно в одну базу).
+    Запускать при остановленном сервере; после - перезапустить его с NOTES_DB_SHARDS, равным --shards.
+    """
+    sharding.rebalance(args.db, args.shards)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Служебные команды backend")
+    parser.add_argument("--db", default=None, help="путь к файлу базы (по умолчанию NOTES_DB_PATH или database.db)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("migrate", help="применить миграции схемы и показать её версию")
+    p.set_defaults(func=cmd_migrate)
+
+    p = sub.add_parser("rebuild-search", help="перестроить полнотекстовый индекс заметок")
+    p.set_defaults(func=cmd_rebuild_search)
+
+    p = sub.add_parser("rebuild-tags", help="перестроить таблицу тегов note_tags по notes.tags")
+    p.set_defaults(func=cmd_rebuild_tags)
+
+    p = sub.add_parser("rebuild-counts", help="пересчитать счётчики заметок users.notes_count")
+    p.set_defaults(func=cmd_rebuild_counts)
+
+    p = sub.add_parser("check-counts", help="сверить users.notes_count с таблицей notes")
+    p.set_defaults(func=cmd_check_counts)
+
+    p = sub.add_parser("import-notes", help="импортировать заметки из NDJSON-файла")
+    p.add_argument("file")
+    p.add_argument("--batch-size", type=int, default=5000, help="строк в одной транзакции")
+    p.add_argument("--checkpoint", default=None, help="файл контрольной точки (по умолчанию <file>.checkpoint)")
+    p.set_defaults(func=cmd_import_notes)
+
+    p = sub.add_parser("export-notes", help="выгрузить заметки в NDJSON-файл")
+    p.add_argument("file")
+    p.add_argument("--after-id", type=int, default=0, help="выгружать заметки с id больше этого")
+    p.add_argument("--user-id", type=int, default=None, help="только заметки этого пользователя")
+    p.add_argument("--batch-size", type=int, default=1000, help="строк, читаемых из курсора за раз")
+    p.add_argument("--resume", action="store_true", help="дописать в существующий файл после последнего id")
+    p.set_defaults(func=cmd_export_notes)
+
+    p = sub.add_parser("restore-orphans", help="вернуть заметки из orphaned_notes, назначив им владельца")
+    p.add_argument("--user-id", type=int, required=True, help="новый владелец заметок")
+    p.set_defaults(func=cmd_restore_orphans)
+
+    p = sub.add_parser("rebalance-shards", help="разложить заметки по шардам заново (сервер остановлен)")
+    p.add_argument("--shards", type=int, required=True, help="новое число шардов, 0 - одна база")
+    p.set_defaults(func=cmd_rebalance_shards, own_db=True)
+
+    args = parser.parse_args(argv)
+    if getattr(args, "own_db", False):
+        # команда сама открывает каталог и шарды: обычное открытие отказало бы при несовпадении их числа
+        return args.func(args)
+    db = sharding.open_database(args.db)
+    try:
+        return args.func(db, args)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
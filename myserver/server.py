@@ -1,22 +1,125 @@
-from fastapi import FastAPI, HTTPException, Header, Depends
+import dataclasses
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from fastapi import FastAPI, HTTPException, Header, Depends, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import Optional
+from typing import Literal, Optional
 import uvicorn
 from models.user import User, UserLogin
 from models.note import Note
 from models.admin_user import AdminUser
-from controllers.db_controller import DatabaseController
+from controllers.bulk import BulkImportError, NdjsonBatcher, Throughput, encode_ndjson
+from controllers.compression import CompressionMiddleware
+from controllers.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, REGISTRY, MetricsMiddleware
+from controllers.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, InvalidCursorError, encode_page_stream
+from controllers.sharding import open_database
+from settings import ServerSettings
 
 
-db_controller = DatabaseController()
+db_controller = open_database()
+server_settings = ServerSettings.from_env()
+if server_settings.sql_json and not db_controller.supports_json():
+    print("⚠ В сборке SQLite нет функций JSON, списки кодируются в Python")
+    server_settings = dataclasses.replace(server_settings, sql_json=False)
 
 def ensure_admin_exists():
     admin = AdminUser()
-    if not db_controller.user_exists_by_email(admin.email):
-        db_controller.admin_create_user(admin.username, admin.email, admin.password, 1)
+    db_controller.ensure_admin(admin.username, admin.email, admin.password)
 ensure_admin_exists()
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    # при остановке: дописать очередь записи и закрыть соединения пулов
+    db_controller.close()
+
+
+app = FastAPI(lifespan=lifespan)
+# add_middleware добавляет снаружи: метрики измеряют запрос вместе со сжатием ответа
+app.add_middleware(CompressionMiddleware, minimum_size=server_settings.compression_min_size,
+                   level=server_settings.compression_level)
+app.add_middleware(MetricsMiddleware)
+
+
+def controller_metrics(controller, labels=()):
+    """Пулы и очередь записи одного DatabaseController; labels добавляются к каждой метрике."""
+    samples = []
+    for name, pool in (("write", controller.pool), ("read", controller.read_pool)):
+        stats = pool.stats()
+        samples += [
+            ("db_pool_connections", (*labels, ("pool", name), ("state", "in_use")), stats["in_use"]),
+            ("db_pool_connections", (*labels, ("pool", name), ("state", "idle")), stats["idle"]),
+        ]
+    if controller.write_queue is not None:
+        queue = controller.write_queue.stats()
+        samples += [
+            ("db_write_queue_depth", labels, queue["depth"]),
+            ("db_write_queue_max_depth", labels, queue["max_depth"]),
+            ("db_write_batch_max_operations", labels, queue["max_batch"]),
+            ("db_write_batch_interval_seconds", labels, queue["flush_interval"]),
+        ]
+    return samples
+
+
+def collect_database_metrics():
+    samples = [("user_cache_entries", (), db_controller.user_cache.stats()["size"])]
+    samples += controller_metrics(db_controller)
+    # в режиме шардов основная база - только каталог, заметки пишутся и читаются в шардах
+    for index, shard in enumerate(getattr(db_controller, "shards", ())):
+        samples += controller_metrics(shard, (("shard", str(index)),))
+    return samples
+REGISTRY.add_collector(collect_database_metrics)
+
+
+@app.exception_handler(InvalidCursorError)
+def invalid_cursor_handler(request: Request, exc: InvalidCursorError):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+
+@app.exception_handler(sqlite3.IntegrityError)
+def integrity_error_handler(request: Request, exc: sqlite3.IntegrityError):
+    # нарушение UNIQUE/FOREIGN KEY: например, повторный email или заметка несуществующего пользователя
+    return JSONResponse(status_code=400, content={"detail": f"Нарушение ограничений БД: {exc}"})
+
+
+def page(items, next_cursor):
+    """Ответ постраничного списка: элементы и курсор следующей страницы (None - страниц больше нет)."""
+    return {"items": items, "next_cursor": next_cursor}
+
+
+def page_json(items_json, next_cursor):
+    """Текст ответа page(), где items - готовый JSON-массив из SQLite (методы *_json DatabaseController)."""
+    return '{"items":' + items_json + ',"next_cursor":' + json.dumps(next_cursor) + "}"
+
+
+def json_page(items_json, next_cursor):
+    """
+    Тот же ответ, что page(), но из готового JSON-массива.
+    Байты отдаются как есть, без jsonable_encoder и повторного json.dumps.
+    """
+    return Response(content=page_json(items_json, next_cursor).encode("utf-8"), media_type="application/json")
+
+
+def note_item(note):
+    """Строка (id, title, content, date_created, date_modified, tags) -> заметка в ответе API."""
+    return {
+        "id": note[0],
+        "title": note[1],
+        "content": note[2],
+        "date_created": note[3],
+        "date_modified": note[4],
+        "tags": note[5]
+    }
+
 
 def require_admin(x_user_id: Optional[str] = Header(default=None, alias="X-User-Id")):
     if not x_user_id:
@@ -116,24 +219,31 @@ def add_note_handler(note_data: Note):
 def get_users_summary_handler():
     return db_controller.get_users_summary()
 
+@app.get("/stats/user_cache")
+def user_cache_stats_handler():
+    # попадания и промахи кэша пользователей, через который проходят require_user/require_admin
+    return db_controller.user_cache.stats()
+
+@app.get("/metrics")
+def metrics_handler():
+    # текстовый формат Prometheus: запросы по маршрутам, время методов БД, состояние пула
+    return PlainTextResponse(REGISTRY.render(), media_type=METRICS_CONTENT_TYPE)
+
 @app.get("/get_all_notes/{user_id}")
-def get_notes_handler(user_id: int):
-    notes = db_controller.read_notes_by_user(user_id)
-    result = []
-    for note in notes:
-        result.append({
-            "id": note[0],
-            "title": note[1],
-            "content": note[2],
-            "date_created": note[3],
-            "date_modified": note[4],
-            "tags": note[5]
-        })
-    return result
+def get_notes_handler(user_id: int, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                      cursor: Optional[str] = None):
+    if server_settings.sql_json:
+        return json_page(*db_controller.read_notes_by_user_json(user_id, limit, cursor))
+    notes, next_cursor = db_controller.read_notes_by_user(user_id, limit, cursor)
+    return page([note_item(note) for note in notes], next_cursor)
 
 @app.get("/search_notes/{user_id}")
-def search_notes_handler(user_id: int, query: str = "", tag: str = ""):
-    notes = db_controller.search_notes(user_id, query, tag)
+def search_notes_handler(user_id: int, query: str = "", tag: str = "", tag_mode: Literal["all", "any"] = "all",
+                         limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                         cursor: Optional[str] = None):
+    if server_settings.sql_json:
+        return json_page(*db_controller.search_notes_json(user_id, query, tag, tag_mode, limit, cursor))
+    notes, next_cursor = db_controller.search_notes(user_id, query, tag, tag_mode, limit, cursor)
     result = []
     for note in notes:
         result.append({
@@ -142,23 +252,74 @@ def search_notes_handler(user_id: int, query: str = "", tag: str = ""):
             "content": note[2],
             "date_created": note[3],
             "date_modified": note[4],
-            "tags": note[5]
+            "tags": note[5],
+            "snippet": note[6]
         })
-    return result
+    return page(result, next_cursor)
+
+@app.get("/tags/{user_id}")
+def get_tags_handler(user_id: int):
+    return db_controller.get_tag_counts(user_id)
+
+def note_etag(note):
+    """
+    ETag заметки: id и хэш date_modified вместе с содержимым.
+    date_modified хранится с точностью до секунды, поэтому одного его мало - две правки
+    в одну секунду дали бы одинаковый ETag.
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    for value in (note[4], note[1], note[2], note[5]):
+        digest.update(str(value).encode("utf-8"))
+        digest.update(b"\0")
+    return f'"{note[0]}-{digest.hexdigest()}"'
+
+
+def http_date(timestamp):
+    """'2024-01-02 10:00:00' (UTC, как CURRENT_TIMESTAMP) -> дата для Last-Modified; None, если не разобрать."""
+    try:
+        moment = datetime.strptime(str(timestamp), "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
+    except ValueError:
+        return None
+    return format_datetime(moment, usegmt=True)
+
+
+def etag_matches(if_none_match, etag):
+    """Есть ли etag в заголовке If-None-Match (список через запятую, слабые W/ сравниваются без префикса)."""
+    if if_none_match is None:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or any(tag.removeprefix("W/") == etag for tag in tags)
+
 
 @app.get("/get_note/{note_id}")
-def get_note_handler(note_id: int):
+def get_note_handler(note_id: int, if_none_match: Optional[str] = Header(default=None)):
     note = db_controller.read_note_by_id(note_id)
     if not note:
         raise HTTPException(status_code=404, detail="Заметка не найдена")
-    return {
-        "id": note[0],
-        "title": note[1],
-        "content": note[2],
-        "date_created": note[3],
-        "date_modified": note[4],
-        "tags": note[5]
-    }
+    etag = note_etag(note)
+    # no-cache: клиент может хранить заметку, но перед использованием проверяет её через If-None-Match
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    last_modified = http_date(note[4] or note[3])
+    if last_modified:
+        headers["Last-Modified"] = last_modified
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(headers=headers, content=note_item(note))
+
+
+@app.get("/notes")
+def get_notes_by_ids_handler(ids: str = Query(..., description="id заметок через запятую")):
+    """
+    Несколько заметок за один запрос: /notes?ids=3,1,2. Порядок как в ids,
+    несуществующие заметки пропускаются.
+    """
+    try:
+        note_ids = [int(part) for part in ids.split(",") if part.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids - список целых чисел через запятую")
+    if len(note_ids) > MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"Не больше {MAX_PAGE_SIZE} id за запрос")
+    return {"items": [note_item(note) for note in db_controller.read_notes_by_ids(note_ids)]}
 
 @app.put("/update_note")
 def update_note_handler(note_data: Note):
@@ -175,9 +336,40 @@ def delete_note_handler(note_id: int):
         return {"status": "Заметка успешно удалена!"}
     raise HTTPException(status_code=400, detail="Ошибка удаления заметки")
 
+def stream_page(page_stream):
+    """
+    Отдаёт страницу потоком (chunked): строки читаются из курсора пачками и кодируются
+    по мере чтения, поэтому память не растёт с размером списка.
+    Курсор проверяется до начала ответа, чтобы ошибка пришла обычным 400.
+    """
+    return StreamingResponse(encode_page_stream(page_stream), media_type="application/json")
+
+
 @app.get("/admin/users")
-def admin_users_list(admin=Depends(require_admin)):
-    return db_controller.admin_list_users()
+def admin_users_list(limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None,
+                     admin=Depends(require_admin)):
+    # все пользователи целиком - GET /admin/users/export
+    if server_settings.sql_json:
+        return json_page(*db_controller.admin_list_users_json(limit, cursor))
+    return stream_page(db_controller.stream_admin_users(limit, cursor))
+
+
+@app.get("/admin/users/export")
+def admin_users_export(admin=Depends(require_admin)):
+    """Все пользователи (без паролей) потоком в NDJSON по возрастанию id."""
+    def lines():
+        for batch in db_controller.stream_admin_users():
+            yield "".join(json.dumps(user, ensure_ascii=False) + "\n" for user in batch)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@app.get("/admin/users/{user_id}")
+def admin_users_get(user_id: int, admin=Depends(require_admin)):
+    user = db_controller.admin_get_user(user_id)
+    if user is None:
+        raise HTTPException(status_code=404, detail="Пользователь не найден")
+    return user
 
 
 @app.post("/admin/users")
@@ -202,8 +394,72 @@ def admin_users_delete(user_id: int, admin=Depends(require_admin)):
 
 
 @app.get("/admin/notes")
-def admin_notes_list(admin=Depends(require_admin)):
-    return db_controller.admin_list_notes()
+def admin_notes_list(limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None,
+                     admin=Depends(require_admin)):
+    # все заметки целиком - GET /admin/notes/export
+    if server_settings.sql_json:
+        return json_page(*db_controller.admin_list_notes_json(limit, cursor))
+    return stream_page(db_controller.stream_admin_notes(limit, cursor))
+
+
+# === Страницы frontend: всё, что нужно одному представлению, за один запрос ===
+
+@app.get("/pages/admin/user_notes/{user_id}")
+def page_admin_user_notes(user_id: int, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                          cursor: Optional[str] = None, admin=Depends(require_admin)):
+    """Страница «заметки пользователя» в админке: {"user": {...}, "notes": {"items", "next_cursor"}}."""
+    user = db_controller.admin_get_user(user_id)
+    if user is None:
+        raise HTTPException(status_code=404, detail="Пользователь не найден")
+    if server_settings.sql_json:
+        notes = page_json(*db_controller.read_notes_by_user_json(user_id, limit, cursor))
+        body = '{"user":' + json.dumps(user, ensure_ascii=False) + ',"notes":' + notes + "}"
+        return Response(content=body.encode("utf-8"), media_type="application/json")
+    notes, next_cursor = db_controller.read_notes_by_user(user_id, limit, cursor)
+    return {"user": user, "notes": page([note_item(note) for note in notes], next_cursor)}
+
+
+@app.post("/admin/notes/import")
+async def admin_notes_import(request: Request, skip: int = Query(0, ge=0),
+                             batch_size: int = Query(5000, ge=1, le=50000), admin=Depends(require_admin)):
+    """
+    Массовый импорт заметок из тела запроса в формате NDJSON (см. controllers/bulk.py).
+    Тело читается потоком, каждая пачка из batch_size строк вставляется одной транзакцией.
+    В ответе checkpoint - сколько строк обработано; при ошибке повторите запрос с skip=checkpoint.
+    """
+    batcher = NdjsonBatcher(batch_size, skip)
+    stats = Throughput()
+    checkpoint = skip
+    try:
+        async for chunk in request.stream():
+            for batch in batcher.feed(chunk):
+                stats.add(await run_in_threadpool(db_controller.import_notes_batch, batch))
+                checkpoint = batch[-1][0]
+        batch = batcher.finish()
+        stats.add(await run_in_threadpool(db_controller.import_notes_batch, batch))
+        checkpoint = max(checkpoint, batcher.line_no)
+    except BulkImportError as e:
+        return JSONResponse(status_code=400, content={
+            "detail": str(e), "line": e.line_no, **stats.report(checkpoint=checkpoint)})
+    print(f"✔ Импортировано {stats.rows} заметок ({stats.rows_per_second} строк/с)")
+    return stats.report(checkpoint=checkpoint)
+
+
+@app.get("/admin/notes/export")
+def admin_notes_export(after_id: int = Query(0, ge=0), user_id: Optional[int] = None,
+                       admin=Depends(require_admin)):
+    """
+    Потоковая выгрузка заметок в NDJSON по возрастанию id.
+    Прерванную выгрузку можно продолжить с after_id = id последней полученной строки.
+    """
+    def lines():
+        stats = Throughput()
+        for rows in db_controller.export_notes(after_id, user_id):
+            stats.add(len(rows))
+            yield encode_ndjson(rows)
+        print(f"✔ Экспортировано {stats.rows} заметок ({stats.rows_per_second} строк/с)")
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
 
 
 @app.put("/admin/notes/{note_id}")
@@ -219,4 +475,18 @@ def admin_notes_delete(note_id: int, admin=Depends(require_admin)):
 
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
+    if server_settings.workers > 1:
+        # несколько процессов: uvicorn запускается заново как мастер, который сам не импортирует
+        # server, а каждый воркер импортирует его и создаёт свои пулы соединений
+        db_controller.close()
+        # кэш пользователей у каждого воркера свой, а invalidate() чистит только кэш воркера,
+        # который изменил пользователя: удалённый или лишённый прав пользователь оставался бы
+        # в кэше остальных воркеров до истечения TTL. Воркеры берут настройки из окружения
+        os.environ["NOTES_DB_USER_CACHE_SIZE"] = "0"
+        os.execv(sys.executable, [
+            sys.executable, "-m", "uvicorn", "server:app",
+            "--app-dir", os.path.dirname(os.path.abspath(__file__)),
+            "--host", server_settings.host, "--port", str(server_settings.port),
+            "--workers", str(server_settings.workers),
+        ])
+    uvicorn.run(app, host=server_settings.host, port=server_settings.port)
\ No newline at end of file
@@ -0,0 +1,95 @@
+import os
+from dataclasses import dataclass, fields
+
+
+def _env_value(name: str, default, cast):
+    raw = os.environ.get(name)
+    if raw is None or raw == "":
+        return default
+    try:
+        return cast(raw)
+    except ValueError:
+        print(f"⚠ Некорректное значение {name}={raw!r}, используется {default!r}")
+        return default
+
+
+def _to_bool(raw: str) -> bool:
+    value = raw.strip().lower()
+    if value in ("1", "true", "yes", "on"):
+        return True
+    if value in ("0", "false", "no", "off"):
+        return False
+    raise ValueError(raw)
+
+
+@dataclass(frozen=True)
+class DatabaseSettings:
+    """
+    Настройки работы с SQLite.
+    Каждое поле можно переопределить переменной окружения NOTES_DB_<ИМЯ_ПОЛЯ>,
+    например NOTES_DB_POOL_SIZE=16.
+    """
+    path: str = "database.db"
+    # пул соединений
+    pool_size: int = 8
+    pool_timeout: float = 5.0
+    max_connection_age: float = 600.0
+    health_check_interval: float = 30.0
+    # PRAGMA, применяемые к каждому соединению
+    journal_mode: str = "WAL"
+    synchronous: str = "NORMAL"
+    cache_size_kib: int = 16384
+    mmap_size: int = 256 * 1024 * 1024
+    busy_timeout_ms: int = 5000
+    # кэш пользователей для проверки X-User-Id; 0 - кэш выключен
+    user_cache_size: int = 1024
+    user_cache_ttl: float = 30.0
+    # журнал медленных запросов: порог в мс (0 - выключен), файл и его ротация
+    slow_query_ms: float = 0.0
+    slow_query_log: str = "slow_queries.log"
+    slow_query_log_max_bytes: int = 10 * 1024 * 1024
+    slow_query_log_backups: int = 5
+    # режим разработки: к медленным запросам добавляется EXPLAIN QUERY PLAN
+    dev_mode: bool = False
+    # group commit: записи идут через очередь, один поток фиксирует их пачками
+    # до write_batch_size операций или раз в write_batch_interval_ms
+    write_queue: bool = False
+    write_batch_size: int = 64
+    write_batch_interval_ms: float = 5.0
+    write_queue_depth: int = 10000
+    # шардирование заметок по пользователям: N файлов рядом с path (controllers/sharding.py); 0 - одна база
+    shards: int = 0
+
+    @classmethod
+    def from_env(cls, prefix: str = "NOTES_DB_") -> "DatabaseSettings":
+        values = {}
+        for f in fields(cls):
+            cast = _to_bool if isinstance(f.default, bool) else type(f.default)
+            values[f.name] = _env_value(prefix + f.name.upper(), f.default, cast)
+        return cls(**values)
+
+
+@dataclass(frozen=True)
+class ServerSettings:
+    """
+    Настройки HTTP-части backend.
+    Каждое поле можно переопределить переменной окружения NOTES_SERVER_<ИМЯ_ПОЛЯ>,
+    например NOTES_SERVER_COMPRESSION_LEVEL=1.
+    """
+    # адрес и число процессов uvicorn для python server.py
+    host: str = "0.0.0.0"
+    port: int = 8001
+    workers: int = 1
+    # сжатие ответов (gzip/deflate): ответы меньше порога не сжимаются; уровень 0 - сжатие выключено
+    compression_min_size: int = 1024
+    compression_level: int = 6
+    # списки заметок и пользователей собираются в JSON самой SQLite, без словарей Python на строку
+    sql_json: bool = True
+
+    @classmethod
+    def from_env(cls, prefix: str = "NOTES_SERVER_") -> "ServerSettings":
+        values = {}
+        for f in fields(cls):
+            cast = _to_bool if isinstance(f.default, bool) else type(f.default)
+            values[f.name] = _env_value(prefix + f.name.upper(), f.default, cast)
+        return cls(**values)
@@ -0,0 +1,61 @@
+"""
+Общие фикстуры тестов backend. Запуск из корня репозитория или из папки myserver:
+    python -m pytest -q myserver/tests
+"""
+import importlib
+import os
+import sys
+
+import pytest
+
+# модули backend импортируются без пакета (как в server.py, запущенном из myserver)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from controllers.db_controller import DatabaseController  # noqa: E402
+from settings import DatabaseSettings  # noqa: E402
+
+
+@pytest.fixture
+def settings(tmp_path):
+    """Настройки на временной базе; окружение NOTES_DB_* не учитывается."""
+    return DatabaseSettings(path=str(tmp_path / "test.db"), slow_query_log=str(tmp_path / "slow_queries.log"))
+
+
+@pytest.fixture
+def db(settings):
+    controller = DatabaseController(settings=settings)
+    yield controller
+    controller.close()
+
+
+def add_users(db, *names):
+    """Создаёт пользователей name@example.com и возвращает их id в том же порядке."""
+    return [db.admin_create_user(name, f"{name}@example.com", "secret") for name in names]
+
+
+@pytest.fixture(params=[True, False], ids=["sql_json", "python_json"])
+def client(request, tmp_path, monkeypatch):
+    """
+    TestClient приложения server.py на временной базе; параметр - NOTES_SERVER_SQL_JSON,
+    чтобы списки проверялись в обоих вариантах кодирования.
+    server.py открывает базу при импорте, поэтому модуль импортируется заново для каждого теста.
+    """
+    from fastapi.testclient import TestClient
+
+    for name in list(os.environ):
+        if name.startswith(("NOTES_DB_", "NOTES_SERVER_")):
+            monkeypatch.delenv(name)
+    monkeypatch.setenv("NOTES_DB_PATH", str(tmp_path / "server.db"))
+    monkeypatch.setenv("NOTES_SERVER_SQL_JSON", str(request.param).lower())
+    sys.modules.pop("server", None)
+    server = importlib.import_module("server")
+    with TestClient(server.app) as test_client:
+        test_client.server = server
+        yield test_client
+    sys.modules.pop("server", None)
+
+
+def admin_headers(client):
+    """Заголовок X-User-Id администратора, которого server.py создаёт при старте."""
+    admin = client.post("/login", json={"email": "admin@example.com", "password": "admin"}).json()["user"]
+    return {"X-User-Id": str(admin["id"])}
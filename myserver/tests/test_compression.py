@@ -0,0 +1,55 @@
+import pytest
+
+from controllers.compression import choose_encoding
+from .conftest import admin_headers
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("identity", None),
+    ("gzip, deflate", "gzip"),
+    ("gzip;q=0, deflate", "deflate"),
+    ("br, *;q=0.5", "gzip"),
+    ("*;q=0", None),
+    ("gzip;q=bad", None),
+])
+def test_choose_encoding(header, expected):
+    assert choose_encoding(header) == expected
+
+
+def test_large_lists_are_compressed_small_responses_are_not(client):
+    headers = admin_headers(client)
+    user_id = int(headers["X-User-Id"])
+    for i in range(30):
+        client.post("/add_note", json={"title": f"note {i}", "content": "text " * 20, "user_id": user_id})
+
+    plain = client.get(f"/get_all_notes/{user_id}", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+
+    packed = client.get(f"/get_all_notes/{user_id}", headers={"Accept-Encoding": "gzip"})
+    assert packed.headers["content-encoding"] == "gzip"
+    assert packed.headers["vary"] == "Accept-Encoding"
+    assert int(packed.headers["content-length"]) < len(plain.content)
+    assert packed.json() == plain.json()
+
+    # потоковый ответ сжимается по частям и остаётся корректным gzip-потоком
+    stream = client.get("/admin/notes/export", headers={**headers, "Accept-Encoding": "gzip"})
+    assert stream.headers["content-encoding"] == "gzip"
+    assert len(stream.text.splitlines()) == 30
+
+    small = client.get("/me", headers={**headers, "Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+
+
+def test_etag_becomes_weak_when_compressed_and_304_is_not_compressed(client):
+    user_id = int(admin_headers(client)["X-User-Id"])
+    client.post("/add_note", json={"title": "big", "content": "x" * 5000, "user_id": user_id})
+    note_id = client.get(f"/get_all_notes/{user_id}").json()["items"][0]["id"]
+
+    response = client.get(f"/get_note/{note_id}", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["ETag"].startswith('W/"')
+    revalidated = client.get(f"/get_note/{note_id}", headers={"Accept-Encoding": "gzip",
+                                                                "If-None-Match": response.headers["ETag"]})
+    assert revalidated.status_code == 304
+    assert "content-encoding" not in revalidated.headers
@@ -0,0 +1,43 @@
+from .conftest import admin_headers
+
+
+def add_note(client, user_id, title="title", content="text"):
+    client.post("/add_note", json={"title": title, "content": content, "user_id": user_id, "tags": "a"})
+    return client.get(f"/get_all_notes/{user_id}").json()["items"][0]["id"]
+
+
+def test_get_note_revalidation(client):
+    user_id = int(admin_headers(client)["X-User-Id"])
+    note_id = add_note(client, user_id)
+
+    response = client.get(f"/get_note/{note_id}")
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert response.headers["Cache-Control"] == "no-cache"
+    assert "GMT" in response.headers["Last-Modified"]
+
+    for header in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+        revalidated = client.get(f"/get_note/{note_id}", headers={"If-None-Match": header})
+        assert revalidated.status_code == 304, header
+        assert revalidated.content == b""
+        assert revalidated.headers["ETag"] == etag
+
+    assert client.get(f"/get_note/{note_id}", headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_etag_changes_on_update_within_same_second(client):
+    user_id = int(admin_headers(client)["X-User-Id"])
+    note_id = add_note(client, user_id)
+    etag = client.get(f"/get_note/{note_id}").headers["ETag"]
+
+    # date_modified хранится с точностью до секунды: ETag должен меняться и от содержимого
+    client.put("/update_note", json={"id": note_id, "title": "title", "content": "changed", "user_id": user_id,
+                                     "tags": "a"})
+    response = client.get(f"/get_note/{note_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["content"] == "changed"
+    assert response.headers["ETag"] != etag
+
+
+def test_missing_note_is_404(client):
+    assert client.get("/get_note/12345", headers={"If-None-Match": "*"}).status_code == 404
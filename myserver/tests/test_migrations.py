@@ -0,0 +1,64 @@
+import logging
+import os
+import sqlite3
+
+import manage
+from controllers import migrations
+from controllers.db_controller import DatabaseController
+
+
+def make_v4_database(path):
+    """База на схеме версии 4 (до внешних ключей): заметки удалённого пользователя 2 остались в notes."""
+    conn = sqlite3.connect(path)
+    cur = conn.cursor()
+    for _, _, apply in migrations.MIGRATIONS[:4]:
+        apply(cur)
+    cur.execute("INSERT INTO users (id, username, email, password, is_admin) VALUES (1, 'alice', 'a@x', 'p', 0)")
+    cur.executemany(
+        "INSERT INTO notes (id, title, content, user_id, tags) VALUES (?, ?, ?, ?, ?)",
+        [(1, "mine", "keep", 1, "work"), (2, "lost", "orphan one", 2, "old, work"), (3, "lost too", "", 2, "")],
+    )
+    migrations.fill_tag_index(cur)
+    cur.execute("PRAGMA user_version=4")
+    conn.commit()
+    conn.close()
+
+
+def test_migration_quarantines_orphaned_notes(settings, caplog):
+    make_v4_database(settings.path)
+    with caplog.at_level(logging.WARNING, logger=migrations.logger.name):
+        db = DatabaseController(settings=settings)
+    try:
+        with db.connection("test") as conn:
+            assert conn.execute("PRAGMA user_version").fetchone()[0] == migrations.LATEST_VERSION
+            assert [r[0] for r in conn.execute("SELECT id FROM notes")] == [1]
+            orphaned = conn.execute("SELECT id, user_id, content FROM orphaned_notes ORDER BY id").fetchall()
+            assert orphaned == [(2, 2, "orphan one"), (3, 2, "")]
+            # теги отложенных заметок не остаются висеть в note_tags
+            assert [r[0] for r in conn.execute("SELECT DISTINCT note_id FROM note_tags")] == [1]
+        assert "2 заметок удалённых пользователей (1)" in caplog.text
+    finally:
+        db.close()
+
+
+def test_restore_orphans_assigns_owner(settings, monkeypatch):
+    make_v4_database(settings.path)
+    DatabaseController(settings=settings).close()
+    # manage.py читает настройки из окружения
+    for name in list(os.environ):
+        if name.startswith("NOTES_DB_"):
+            monkeypatch.delenv(name)
+
+    assert manage.main(["--db", settings.path, "restore-orphans", "--user-id", "99"]) == 1
+    assert manage.main(["--db", settings.path, "restore-orphans", "--user-id", "1"]) == 0
+
+    db = DatabaseController(settings=settings)
+    try:
+        notes, _ = db.read_notes_by_user(1)
+        assert sorted(note[0] for note in notes) == [1, 2, 3]
+        assert db.get_tag_counts(1) == [{"tag": "old", "count": 1}, {"tag": "work", "count": 2}]
+        with db.connection("test") as conn:
+            assert conn.execute("SELECT COUNT(*) FROM orphaned_notes").fetchone()[0] == 0
+            assert conn.execute("SELECT notes_count FROM users WHERE id=1").fetchone()[0] == 3
+    finally:
+        db.close()
@@ -0,0 +1,33 @@
+from .conftest import admin_headers
+
+
+def test_notes_multi_get_keeps_requested_order(client):
+    user_id = int(admin_headers(client)["X-User-Id"])
+    for title in ("first", "second", "third"):
+        client.post("/add_note", json={"title": title, "content": "", "user_id": user_id})
+    ids = sorted(item["id"] for item in client.get(f"/get_all_notes/{user_id}").json()["items"])
+
+    response = client.get("/notes", params={"ids": f"{ids[2]},999,{ids[0]}"})
+    assert [note["title"] for note in response.json()["items"]] == ["third", "first"]
+    assert client.get("/notes", params={"ids": "1,x"}).status_code == 400
+    assert client.get("/notes", params={"ids": ",".join(["1"] * 501)}).status_code == 400
+
+
+def test_admin_user_notes_page(client):
+    headers = admin_headers(client)
+    user_id = client.post("/admin/users", json={"username": "bob", "email": "bob@example.com", "password": "p"},
+                          headers=headers).json()["id"]
+    for i in range(3):
+        client.post("/add_note", json={"title": f"note {i}", "content": "", "user_id": user_id})
+
+    body = client.get(f"/pages/admin/user_notes/{user_id}", params={"limit": 2}, headers=headers).json()
+    assert body["user"] == {"id": user_id, "username": "bob", "email": "bob@example.com", "is_admin": 0}
+    assert len(body["notes"]["items"]) == 2 and body["notes"]["next_cursor"]
+
+    rest = client.get(f"/pages/admin/user_notes/{user_id}", headers=headers,
+                      params={"limit": 2, "cursor": body["notes"]["next_cursor"]}).json()
+    assert len(rest["notes"]["items"]) == 1 and rest["notes"]["next_cursor"] is None
+
+    assert client.get("/admin/users/999", headers=headers).status_code == 404
+    assert client.get("/pages/admin/user_notes/999", headers=headers).status_code == 404
+    assert client.get(f"/admin/users/{user_id}", headers={"X-User-Id": str(user_id)}).status_code == 403
@@ -0,0 +1,100 @@
+import pytest
+
+from controllers.pagination import InvalidCursorError, decode_cursor, encode_cursor
+from models.note import Note
+from .conftest import add_users, admin_headers
+
+
+def add_notes(db, user_id, count):
+    # заметки вставляются в одну секунду: порядок страниц держится на id, а не только на date_modified
+    for i in range(count):
+        db.insert_note(Note(title=f"note {i}", content="text", user_id=user_id, tags="tag"))
+
+
+def read_all_pages(read_page, limit):
+    """Обходит список по next_cursor; возвращает все элементы и число страниц."""
+    items, pages, cursor = [], 0, None
+    while True:
+        page_items, cursor = read_page(limit, cursor)
+        items += page_items
+        pages += 1
+        if cursor is None:
+            return items, pages
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor("recent", "2024-01-02 10:00:00", 7)
+    assert decode_cursor(cursor, "recent", 2) == ["2024-01-02 10:00:00", 7]
+
+
+@pytest.mark.parametrize("cursor", [
+    "не base64",
+    "bm90IGpzb24",                             # base64, но не JSON
+    encode_cursor("id", 5),                    # курсор другого списка
+    encode_cursor("recent", "2024-01-02"),     # не хватает значения ключа
+    encode_cursor("id", [1]),                  # список вместо числа
+    encode_cursor("recent", {"a": 1}, 1),      # объект вместо даты
+])
+def test_invalid_cursor_rejected(cursor):
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(cursor, "recent", 2)
+
+
+def test_user_notes_pages_cover_all_notes(db):
+    user_id, other_id = add_users(db, "alice", "bob")
+    add_notes(db, user_id, 7)
+    add_notes(db, other_id, 2)
+
+    notes, pages = read_all_pages(lambda limit, cursor: db.read_notes_by_user(user_id, limit, cursor), 3)
+    assert pages == 3
+    ids = [note[0] for note in notes]
+    assert ids == sorted(ids, reverse=True) and len(set(ids)) == 7
+
+    items, _ = read_all_pages(lambda limit, cursor: db.admin_list_notes(limit, cursor), 4)
+    assert len({item["id"] for item in items}) == 9
+
+
+def test_page_limit_equal_to_size_has_no_next_cursor(db):
+    user_id, = add_users(db, "alice")
+    add_notes(db, user_id, 3)
+    notes, cursor = db.read_notes_by_user(user_id, 3)
+    assert len(notes) == 3 and cursor is None
+
+
+def test_invalid_cursor_is_400(client):
+    headers = admin_headers(client)
+    response = client.get(f"/get_all_notes/{headers['X-User-Id']}", params={"cursor": "garbage"})
+    assert response.status_code == 400
+
+    # курсор списка пользователей не подходит списку заметок
+    response = client.get("/admin/notes", params={"cursor": encode_cursor("id", 1)}, headers=headers)
+    assert response.status_code == 400
+    response = client.get("/admin/users", params={"cursor": encode_cursor("id", [1])}, headers=headers)
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("limit", [0, -1, 501])
+def test_admin_limit_out_of_range_is_422(client, limit):
+    response = client.get("/admin/users", params={"limit": limit}, headers=admin_headers(client))
+    assert response.status_code == 422
+
+
+def test_admin_users_pages_and_export(client):
+    headers = admin_headers(client)
+    for i in range(4):
+        client.post("/admin/users", json={"username": f"u{i}", "email": f"u{i}@example.com", "password": "p"},
+                    headers=headers)
+
+    ids, cursor = [], None
+    while True:
+        params = {"limit": 2} if cursor is None else {"limit": 2, "cursor": cursor}
+        body = client.get("/admin/users", params=params, headers=headers).json()
+        ids += [user["id"] for user in body["items"]]
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    assert ids == sorted(ids) and len(ids) == 5  # 4 пользователя и администратор
+
+    export = client.get("/admin/users/export", headers=headers)
+    assert export.headers["content-type"].startswith("application/x-ndjson")
+    assert len(export.text.splitlines()) == 5
@@ -0,0 +1,118 @@
+import dataclasses
+import sqlite3
+
+import pytest
+
+from controllers.bulk import BulkImportError
+from controllers.db_controller import DatabaseController
+from controllers.sharding import ShardingError, open_database, rebalance, shard_index
+from models.note import Note
+from .conftest import add_users
+
+SHARDS = 3
+
+
+@pytest.fixture
+def sharded(settings):
+    controller = open_database(settings=dataclasses.replace(settings, shards=SHARDS))
+    yield controller
+    controller.close()
+
+
+def users_on_two_shards(db):
+    """Создаёт пользователей, пока не найдутся двое в разных шардах."""
+    first, = add_users(db, "user0")
+    for i in range(1, 50):
+        other, = add_users(db, f"user{i}")
+        if shard_index(other, SHARDS) != shard_index(first, SHARDS):
+            return first, other
+    raise AssertionError("все пользователи попали в один шард")
+
+
+def location_count(db):
+    with db.connection("test") as conn:
+        return conn.execute("SELECT COUNT(*) FROM note_locations").fetchone()[0]
+
+
+def shard_note_count(db):
+    return sum(len(shard.read_notes_by_ids(range(1, 1000))) for shard in db.shards)
+
+
+def test_notes_go_to_user_shard_and_merge_in_order(sharded):
+    first, second = users_on_two_shards(sharded)
+    for i in range(4):
+        sharded.insert_note(Note(title=f"a{i}", content="x", user_id=first, tags="t"))
+        sharded.insert_note(Note(title=f"b{i}", content="x", user_id=second))
+
+    assert len(sharded.shard_for(first).read_notes_by_user(first)[0]) == 4
+    assert sharded.shard_for(second).read_notes_by_user(first)[0] == []
+
+    page, cursor = sharded.admin_list_notes(5)
+    rest, last_cursor = sharded.admin_list_notes(5, cursor)
+    ids = [item["id"] for item in page + rest]
+    assert ids == sorted(ids, reverse=True) and len(ids) == 8 and last_cursor is None
+    assert {item["username"] for item in page + rest} == {"user0", f"user{second - first}"}
+    assert [item["id"] for item in sharded.stream_admin_notes(5, cursor).items()] == ids[5:]
+
+    summary = {user["id"]: user["notes_count"] for user in sharded.get_users_summary()}
+    assert summary[first] == summary[second] == 4
+    assert sharded.get_tag_counts(first) == [{"tag": "t", "count": 4}]
+
+
+def test_import_with_unknown_user_reserves_nothing(sharded):
+    user, = add_users(sharded, "alice")
+    batch = [(1, ("ok", "x", user, None, None, None)), (2, ("bad", "x", 999, None, None, None))]
+
+    with pytest.raises(BulkImportError) as error:
+        sharded.import_notes_batch(batch)
+
+    assert error.value.line_no == 2
+    assert location_count(sharded) == 0
+    assert shard_note_count(sharded) == 0
+
+
+def test_failed_shard_import_rolls_back_whole_batch(sharded):
+    first, second = users_on_two_shards(sharded)
+    # title NOT NULL: строка второго пользователя падает уже в его шарде
+    batch = [(1, ("ok", "x", first, "a", None, None)), (2, (None, "x", second, None, None, None))]
+
+    with pytest.raises(sqlite3.IntegrityError):
+        sharded.import_notes_batch(batch)
+
+    assert location_count(sharded) == 0
+    assert shard_note_count(sharded) == 0
+    assert sharded.read_notes_by_ids([1, 2]) == []
+
+    assert sharded.import_notes_batch([(1, ("ok", "x", first, "a", None, None))]) == 1
+    assert [row[1] for row in sharded.read_notes_by_user(first)[0]] == ["ok"]
+
+
+def test_delete_user_removes_notes_from_shard_and_directory(sharded):
+    user, = add_users(sharded, "alice")
+    sharded.insert_note(Note(title="n", content="x", user_id=user))
+    sharded.delete_user_cascade(user)
+    assert location_count(sharded) == 0
+    assert shard_note_count(sharded) == 0
+
+
+def test_rebalance_round_trip_keeps_notes(settings):
+    db = DatabaseController(settings=settings)
+    users = add_users(db, *(f"user{i}" for i in range(6)))
+    for user in users:
+        for i in range(3):
+            db.insert_note(Note(title=f"{user}-{i}", content="x", user_id=user, tags="t1, t2"))
+    before = [row for rows in db.export_notes() for row in rows]
+    db.close()
+
+    with pytest.raises(ShardingError):
+        open_database(settings=dataclasses.replace(settings, shards=2)).close()
+
+    for shards in (2, 4, 0):
+        rebalance(settings.path, shards, settings)
+        db = open_database(settings=dataclasses.replace(settings, shards=shards))
+        try:
+            assert [row for rows in db.export_notes() for row in rows] == before
+            assert db.check_note_counts() == []
+            assert db.get_tag_counts(users[0]) == [{"tag": "t1", "count": 3}, {"tag": "t2", "count": 3}]
+        finally:
+            db.close()
@@ -0,0 +1,44 @@
+import dataclasses
+import json
+
+import pytest
+
+from controllers.db_controller import DatabaseController
+from controllers.sql_trace import TracingCursor
+from .conftest import add_users
+
+
+@pytest.fixture
+def traced(settings):
+    # порог почти ноль: в журнал попадает каждый запрос
+    controller = DatabaseController(settings=dataclasses.replace(settings, slow_query_ms=0.000001, dev_mode=True))
+    yield controller
+    controller.close()
+
+
+def log_entries(db):
+    db.slow_log._handler.flush()
+    with open(db.slow_log.path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_temporary_cursor_is_logged_on_commit_with_method_and_plan(traced):
+    user, = add_users(traced, "alice")
+    assert traced.get_user_by_id(user)["username"] == "alice"
+
+    entries = [e for e in log_entries(traced) if e["method"] == "get_user_by_id" and e["sql"].startswith("SELECT")]
+    assert len(entries) == 1
+    assert entries[0]["rows"] == 1
+    assert entries[0]["params"] == [user]
+    assert entries[0]["plan"]
+
+
+def test_statement_finishes_on_exhaustion_not_in_finalizer(traced):
+    assert "__del__" not in TracingCursor.__dict__
+    add_users(traced, "alice", "bob")
+    with traced.connection("listing") as conn:
+        cursor = conn.execute("SELECT id FROM users ORDER BY id")
+        assert len(cursor.fetchall()) == 2
+        # запрос записан сразу, как только строки дочитаны, - до commit
+        entries = [e for e in log_entries(traced) if e["method"] == "listing" and e["sql"].startswith("SELECT")]
+        assert [e["rows"] for e in entries] == [2]
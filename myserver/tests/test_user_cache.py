@@ -0,0 +1,49 @@
+import time
+
+from controllers.user_cache import UserCache
+from .conftest import add_users
+
+
+def test_lru_bound_and_ttl():
+    cache = UserCache(max_size=2, ttl=0.05)
+    for user_id in (1, 2):
+        cache.put(user_id, {"id": user_id}, cache.get(user_id)[1])
+    cache.get(1)  # 1 становится самым свежим, вытесняется 2
+    cache.put(3, {"id": 3}, cache.get(3)[1])
+    assert cache.get(2)[0] is None and cache.get(1)[0] == {"id": 1}
+
+    time.sleep(0.06)
+    assert cache.get(1)[0] is None
+    assert cache.stats()["size"] == 1  # устаревшая запись 1 удалена при чтении, 3 ещё не читали
+
+
+def test_put_after_invalidation_is_ignored():
+    cache = UserCache()
+    record, generation = cache.get(1)
+    assert record is None
+    # запись изменили, пока читали старую версию из БД: её нельзя класть в кэш
+    cache.invalidate(1)
+    cache.put(1, {"id": 1, "is_admin": 1}, generation)
+    assert cache.get(1)[0] is None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_disabled_cache_stores_nothing():
+    for cache in (UserCache(max_size=0), UserCache(ttl=0)):
+        cache.put(1, {"id": 1}, cache.get(1)[1])
+        assert cache.get(1)[0] is None
+
+
+def test_controller_caches_and_invalidates_on_update(db):
+    user_id, = add_users(db, "alice")
+    db.get_user_by_id(user_id)
+    user = db.get_user_by_id(user_id)
+    assert db.user_cache.stats()["hits"] == 1
+    # вызывающий получает копию: её изменение не портит кэш
+    user["is_admin"] = 1
+    assert db.get_user_by_id(user_id)["is_admin"] == 0
+
+    db.admin_update_user(user_id, "alice", "alice@example.com", "secret", 1)
+    assert db.get_user_by_id(user_id)["is_admin"] == 1
+    db.admin_delete_user(user_id)
+    assert db.get_user_by_id(user_id) is None
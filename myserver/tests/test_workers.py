@@ -0,0 +1,79 @@
+import dataclasses
+import os
+import runpy
+import time
+
+import pytest
+
+from controllers.db_controller import DatabaseController
+from .conftest import add_users
+
+
+@pytest.fixture
+def workers(settings):
+    """Два контроллера на одной базе - как два процесса uvicorn --workers 2; фабрика по настройкам кэша."""
+    opened = []
+
+    def open_workers(**cache):
+        worker_settings = dataclasses.replace(settings, **cache)
+        opened.extend(DatabaseController(settings=worker_settings) for _ in range(2))
+        return opened[-2:]
+
+    yield open_workers
+    for controller in opened:
+        controller.close()
+
+
+def demote(worker, user_id):
+    worker.admin_update_user(user_id, "alice", "alice@example.com", "secret", 0)
+
+
+def test_cache_of_other_worker_is_stale_until_ttl(workers):
+    first, second = workers(user_cache_ttl=0.2)
+    user_id, = add_users(first, "alice")
+    first.admin_update_user(user_id, "alice", "alice@example.com", "secret", 1)
+    assert second.get_user_by_id(user_id)["is_admin"] == 1
+
+    # invalidate() чистит только кэш процесса, который изменил пользователя
+    demote(first, user_id)
+    assert first.get_user_by_id(user_id)["is_admin"] == 0
+    assert second.get_user_by_id(user_id)["is_admin"] == 1
+    time.sleep(0.25)
+    assert second.get_user_by_id(user_id)["is_admin"] == 0
+
+
+def test_workers_without_cache_see_changes_immediately(workers):
+    first, second = workers(user_cache_size=0)
+    user_id, = add_users(first, "alice")
+    first.admin_update_user(user_id, "alice", "alice@example.com", "secret", 1)
+    assert second.get_user_by_id(user_id)["is_admin"] == 1
+
+    demote(first, user_id)
+    assert second.get_user_by_id(user_id)["is_admin"] == 0
+    first.admin_delete_user(user_id)
+    assert second.get_user_by_id(user_id) is None
+
+
+class Exec(Exception):
+    pass
+
+
+def test_multi_worker_start_disables_user_cache(tmp_path, monkeypatch):
+    for name in list(os.environ):
+        if name.startswith(("NOTES_DB_", "NOTES_SERVER_")):
+            monkeypatch.delenv(name)
+    monkeypatch.setenv("NOTES_DB_PATH", str(tmp_path / "server.db"))
+    monkeypatch.setenv("NOTES_SERVER_WORKERS", "2")
+    monkeypatch.setenv("NOTES_DB_USER_CACHE_SIZE", "1024")
+
+    def execv(path, args):
+        raise Exec(args)
+    monkeypatch.setattr(os, "execv", execv)
+
+    server_py = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "server.py")
+    with pytest.raises(Exec) as started:
+        runpy.run_path(server_py, run_name="__main__")
+    args = started.value.args[0]
+    assert args[args.index("--workers") + 1] == "2"
+    # воркеры uvicorn читают настройки из окружения, которое унаследуют от execv
+    assert os.environ["NOTES_DB_USER_CACHE_SIZE"] == "0"
@@ -0,0 +1,135 @@
+import dataclasses
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from controllers.db_controller import DatabaseController
+from controllers.write_queue import WriteQueue
+from .conftest import add_users
+
+
+class CountingPool:
+    """Пул записи, который считает выданные соединения: писатель берёт одно соединение на пачку."""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.batches = 0
+
+    def connection(self):
+        self.batches += 1
+        return self.pool.connection()
+
+
+@pytest.fixture
+def pool(db):
+    with db.connection("test", write=True) as conn:
+        conn.execute("CREATE TABLE items (name TEXT NOT NULL UNIQUE)")
+    return CountingPool(db.pool)
+
+
+def insert(name):
+    return lambda conn: conn.execute("INSERT INTO items (name) VALUES (?)", (name,)).lastrowid
+
+
+def block_writer(write_queue):
+    """Занимает писателя операцией, которая ждёт события; возвращает (событие, поток операции)."""
+    started, release = threading.Event(), threading.Event()
+
+    def op(conn):
+        started.set()
+        release.wait(5)
+
+    blocker = threading.Thread(target=write_queue.submit, args=(op,))
+    blocker.start()
+    assert started.wait(5)
+    return release, blocker
+
+
+def wait_depth(write_queue, depth):
+    deadline = time.monotonic() + 5
+    while write_queue.stats()["depth"] < depth and time.monotonic() < deadline:
+        time.sleep(0.001)
+
+
+def submit_while_blocked(write_queue, ops):
+    """
+    Ставит ops из отдельных потоков, пока писатель занят, и отпускает его, когда все они в очереди.
+    Возвращает {индекс op: результат или исключение}.
+    """
+    release, blocker = block_writer(write_queue)
+    outcomes = {}
+
+    def run(index, op):
+        try:
+            outcomes[index] = write_queue.submit(op)
+        except Exception as e:
+            outcomes[index] = e
+
+    threads = [threading.Thread(target=run, args=(i, op)) for i, op in enumerate(ops)]
+    for thread in threads:
+        thread.start()
+    wait_depth(write_queue, len(ops))
+    release.set()
+    for thread in threads + [blocker]:
+        thread.join(5)
+    return outcomes
+
+
+def item_names(db):
+    with db.connection("test") as conn:
+        return sorted(row[0] for row in conn.execute("SELECT name FROM items"))
+
+
+@pytest.mark.parametrize("max_batch, batches", [(64, 1), (2, 2)])
+def test_queued_writes_commit_in_batches(db, pool, max_batch, batches):
+    write_queue = WriteQueue(pool, max_batch=max_batch, flush_interval=0)
+    try:
+        outcomes = submit_while_blocked(write_queue, [insert("a"), insert("b"), insert("c")])
+    finally:
+        write_queue.close()
+    assert sorted(outcomes.values()) == [1, 2, 3]
+    # первая пачка - блокирующая операция, остальные три ждали её и ушли вместе (или по max_batch)
+    assert pool.batches == 1 + batches
+    assert item_names(db) == ["a", "b", "c"]
+
+
+def test_failed_operation_rolls_back_only_itself(db, pool):
+    write_queue = WriteQueue(pool, flush_interval=0)
+    try:
+        outcomes = submit_while_blocked(write_queue, [insert("a"), insert("a"), insert("b")])
+    finally:
+        write_queue.close()
+    errors = [value for value in outcomes.values() if isinstance(value, Exception)]
+    assert len(errors) == 1 and isinstance(errors[0], sqlite3.IntegrityError)
+    assert pool.batches == 2
+    assert item_names(db) == ["a", "b"]
+
+
+def test_close_drains_queue_and_rejects_new_writes(db, pool):
+    write_queue = WriteQueue(pool, flush_interval=0)
+    release, blocker = block_writer(write_queue)
+    late = threading.Thread(target=write_queue.submit, args=(insert("late"),))
+    late.start()
+    wait_depth(write_queue, 1)
+    # close() ставит стоп после "late" и ждёт писателя: операция из очереди должна быть зафиксирована
+    threading.Timer(0.05, release.set).start()
+    write_queue.close()
+    late.join(5)
+    blocker.join(5)
+    assert item_names(db) == ["late"]
+    with pytest.raises(RuntimeError):
+        write_queue.submit(insert("after close"))
+
+
+def test_controller_writes_through_queue(settings):
+    db = DatabaseController(settings=dataclasses.replace(settings, write_queue=True))
+    try:
+        alice, = add_users(db, "alice")
+        with pytest.raises(sqlite3.IntegrityError):
+            db.admin_create_user("alice again", "alice@example.com", "secret")
+        bob, = add_users(db, "bob")
+        assert [user["id"] for user in db.admin_list_users()[0]] == [alice, bob]
+    finally:
+        db.close()